@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+annotate_w_predictions.py
+
+Add the predictions of a classified tsv to an annotated tsv, keeping the rows
+of the annotated tsv in their order, see `ffperase.classify`. Used to annotate
+the gathered classified tsv of a scattered run at once.
+
+Example usage:
+    annotate_w_predictions.py --classified classified_df_snvs.tsv \\
+        --annotated-tsv variants.tsv --model-name ARTIFACT --outfile annotated.tsv
+"""
+from pathlib import Path
+import argparse
+
+from ffperase.classify import annotate_with_predictions, read_classified
+from ffperase.table import compress_variant_table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Add the predictions of a classified tsv to an annotated tsv."
+    )
+    parser.add_argument(
+        "--classified", required=True, help="Classified tsv with the model predictions."
+    )
+    parser.add_argument(
+        "--annotated-tsv", required=True, help="Tsv to add the predictions to."
+    )
+    parser.add_argument(
+        "--model-name", required=True, help="Name of the model used to label the predictions."
+    )
+    parser.add_argument(
+        "--outfile", required=True, help="Path to the annotated output."
+    )
+    parser.add_argument(
+        "--compress", action="store_true", help="Compress the annotated output with bgzip."
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="Number of compression threads."
+    )
+    args = parser.parse_args()
+
+    features_df = read_classified(args.classified)
+    Path(args.outfile).parent.mkdir(parents=True, exist_ok=True)
+    annotate_with_predictions(
+        args.annotated_tsv, features_df, args.model_name, args.outfile
+    )
+    print(f"Annotated TSV saved at: {args.outfile}")
+    if args.compress:
+        compress_variant_table(args.outfile, threads=args.threads)
+
+
+if __name__ == "__main__":
+    main()
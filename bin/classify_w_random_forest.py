@@ -1,87 +1,23 @@
 #!/usr/bin/env python3
-from pathlib import Path
-import joblib
-import pandas as pd
-
-pd.options.display.float_format = "{:.2f}".format
-
-
-def classify_with_random_forest(
-    features_path, model_path, model_name, mutation_type, annotated_tsv_path, outdir
-):
-    """
-    Classifies data using a Random Forest model.
-
-    Args:
-        features (str): Path to tsv with preprocessed features.
-        model (str): Path to the trained model (joblib file).
-        model_name (str): Name of the model for labeling outputs.
-        mutation_type (str): Type of mutation ("snvs" or "indels").
-        annotated_tsv (str, optional): Path to tsv file to add annotation.
-        outdir (str, optional): Directory to save the output files.
-
-    Returns:
-        None
-    """
-    # Ensure output directory exists
-    classify_dir = Path(outdir) / "classify"
-    classify_dir.mkdir(parents=True, exist_ok=True)
-
-    # Path for output
-    out_classified_tsv = classify_dir / f"classified_df_{mutation_type}.tsv"
+"""
+classify_w_random_forest.py
 
-    # Load and validate model
-    with open(model_path, "rb") as model_file:
-        model = joblib.load(model_file)
+Classify the features of one or several samples with a trained Random Forest
+model, see `ffperase.classify`.
 
-    if not hasattr(model, "predict") or not hasattr(model, "predict_proba"):
-        raise Exception("Invalid joblib file model: Missing necessary methods.")
-    
-    # Load input dataframe
-    features_df = pd.read_csv(features_path, sep="\t", low_memory=False)
-    features_df["CHR"] = features_df["CHR"].astype(str)
-
-    # Prepare features
-    cols_to_drop = ["CHR", "START", "END"]
-    for col in features_df.columns:
-        if col == "ARTIFACT" or "predicts" in col:
-            cols_to_drop.append(col)
-
-    features = features_df.drop(cols_to_drop, axis=1)
-    if mutation_type == "indels":
-        features = features.drop(["REF", "ALT", "CHANGE"], axis=1)
-
-    # Perform classification
-    predicts = model.predict(features)
-    raw_scores = model.predict_proba(features)[:, 1]
-
-    # Add predictions to dataframe
-    features_df[f"{model_name}_raw_predicts"] = raw_scores
-    features_df[f"{model_name}_predicts"] = predicts.astype(bool)
-    features_df.to_csv(out_classified_tsv, sep="\t", index=False)
-
-    print(f"Classified TSV saved at: {out_classified_tsv}")
+Example usage:
+    classify_w_random_forest.py --features features.tsv --model model.joblib \\
+        --model-name ARTIFACT --mutation-type snvs --outdir .
+"""
+from pathlib import Path
 
-    # Annotate if annotated_tsv_path is provided
-    if annotated_tsv_path:
-        out_annotated_tsv = classify_dir / "annotated.tsv"
-        annotated_tsv = pd.read_csv(
-            annotated_tsv_path, sep="\t", comment="#", low_memory=False
-        )
-        annotated_tsv["CHR"] = annotated_tsv["CHR"].astype(str)
-        cols = [
-            "CHR",
-            "START",
-            "REF",
-            "ALT",
-            f"{model_name}_raw_predicts",
-            f"{model_name}_predicts",
-        ]
-        annotated_tsv = annotated_tsv.merge(
-            features_df[cols], how="inner", on=["CHR", "START", "REF", "ALT"]
-        )
-        annotated_tsv.to_csv(out_annotated_tsv, sep="\t", index=False)
-        print(f"Annotated TSV saved at: {out_annotated_tsv}")
+from ffperase.classify import (
+    classify_samples_with_random_forest,
+    classify_with_random_forest,
+    get_samples,
+)
+from ffperase.stage_profiler import profiler
+from ffperase.table import compress_variant_table
 
 
 if __name__ == "__main__":
@@ -92,8 +28,20 @@ if __name__ == "__main__":
     )
     parser.add_argument(
         "--features",
-        required=True,
-        help="Path to tsv with preprocessed features.",
+        nargs="+",
+        help="Path to tsv with preprocessed features. Several paths or globs "
+        "classify each one as a sample, loading the model only once.",
+    )
+    parser.add_argument(
+        "--manifest",
+        default=None,
+        help="Tsv with `sample` and `features` columns to classify several samples.",
+    )
+    parser.add_argument(
+        "--batch-rows",
+        type=int,
+        default=None,
+        help="Classify small samples together until they add up to this many variants.",
     )
     parser.add_argument(
         "--model", required=True, help="Path to the trained model (joblib file)."
@@ -114,14 +62,130 @@ if __name__ == "__main__":
         default=".",
         help="Directory to save the output files.",
     )
+    parser.add_argument(
+        "--server",
+        default=None,
+        help=(
+            "Unix socket path or localhost port of a serve_random_forest.py "
+            "server. Falls back to in-process classification if not running."
+        ),
+    )
+    parser.add_argument(
+        "--region",
+        default=None,
+        help=(
+            "Only classify the variants within a CHR, CHR:POS or CHR:START-END "
+            "region, using the features.tsv.idx index when there is one."
+        ),
+    )
+    parser.add_argument(
+        "--cascade",
+        action="store_true",
+        help=(
+            "Evaluate the trees in blocks, and stop scoring a variant once the "
+            "remaining trees can not change its label. Raw scores of those variants "
+            "are the mean of the trees evaluated."
+        ),
+    )
+    parser.add_argument(
+        "--cascade-block",
+        type=int,
+        default=10,
+        help="Number of trees evaluated between early exit checks.",
+    )
+    parser.add_argument(
+        "--cascade-band",
+        type=float,
+        default=None,
+        help=(
+            "Also stop once the running probability is further than this from 0.5. "
+            "Faster, but labels may differ from the full forest."
+        ),
+    )
+    parser.add_argument(
+        "--cascade-min-trees",
+        type=int,
+        default=None,
+        help="Trees evaluated before exiting by --cascade-band. [default: --cascade-block]",
+    )
+    parser.add_argument(
+        "--cascade-audit",
+        type=float,
+        default=0.01,
+        help="Fraction of variants compared to the full forest with --cascade-band.",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help=(
+            "Compress the classified (and annotated) tsvs with bgzip, and index "
+            "them with tabix when sorted."
+        ),
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="Number of compression threads."
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write a stage profile next to the outputs (or set FFPERASE_PROFILE).",
+    )
 
     args = parser.parse_args()
+    profiler.enable(args.profile)
+
+    cascade = None
+    if args.cascade:
+        cascade = dict(
+            block_size=args.cascade_block,
+            band=args.cascade_band,
+            min_trees=args.cascade_min_trees,
+            audit=args.cascade_audit,
+        )
 
-    classify_with_random_forest(
-        features_path=args.features,
-        model_path=args.model,
-        model_name=args.model_name,
-        annotated_tsv_path=args.annotated_tsv,
-        mutation_type=args.mutation_type,
-        outdir=args.outdir,
-    )
+    if not args.features and not args.manifest:
+        parser.error("one of --features or --manifest is required")
+
+    samples = get_samples(args.features, args.manifest)
+    classify_dir = Path(args.outdir) / "classify"
+    if args.manifest or len(samples) > 1:
+        if args.annotated_tsv:
+            parser.error("--annotated-tsv is only supported for a single sample")
+        if args.region:
+            parser.error("--region is only supported for a single sample")
+        if args.server:
+            parser.error("--server is only supported for a single sample")
+        classify_samples_with_random_forest(
+            samples=samples,
+            model_path=args.model,
+            model_name=args.model_name,
+            mutation_type=args.mutation_type,
+            outdir=args.outdir,
+            batch_rows=args.batch_rows,
+            cascade=cascade,
+        )
+        classified_paths = [
+            classify_dir / f"classified_df_{sample}_{args.mutation_type}.tsv"
+            for sample, _ in samples
+        ]
+    else:
+        classify_with_random_forest(
+            features_path=samples[0][1],
+            model_path=args.model,
+            model_name=args.model_name,
+            annotated_tsv_path=args.annotated_tsv,
+            mutation_type=args.mutation_type,
+            outdir=args.outdir,
+            server=args.server,
+            cascade=cascade,
+            region=args.region,
+        )
+        classified_paths = [classify_dir / f"classified_df_{args.mutation_type}.tsv"]
+        if args.annotated_tsv:
+            classified_paths.append(classify_dir / "annotated.tsv")
+
+    if args.compress:
+        with profiler.stage("compress"):
+            for classified_path in classified_paths:
+                compress_variant_table(classified_path, threads=args.threads)
+    profiler.write(classify_dir)
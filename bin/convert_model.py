@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+convert_model.py
+
+Convert a trained model between the gzip compressed joblib format, used by
+default and by the models downloaded from Hugging Face, and an uncompressed
+joblib file that classification loads with `mmap_mode="r"`, faster and
+without inflating it on every task.
+
+Example usage:
+    convert_model.py --model model.snvs.joblib --output model.snvs.mmap.joblib
+"""
+import argparse
+
+from ffperase.classify import is_compressed_model, load_model
+from ffperase.train import save_model
+
+
+def convert_model(model_path, output_path, compress=False):
+    """
+    Convert a trained model to an uncompressed or compressed joblib file.
+
+    Arguments:
+        model_path (str): Path to the trained model (joblib file).
+        output_path (str): Path to the converted model.
+        compress (bool): Gzip the output instead of leaving it uncompressed.
+    """
+    if is_compressed_model(model_path) == compress:
+        print(f"[WARNING] {model_path} is already in the requested format.")
+    save_model(load_model(model_path), output_path, compress=compress)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert trained models to an uncompressed, memory-mappable joblib file."
+    )
+    parser.add_argument(
+        "--model", required=True, help="Path to the trained model (joblib file)."
+    )
+    parser.add_argument(
+        "--output", required=True, help="Path to the converted model."
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Convert back to a gzip compressed model.",
+    )
+    args = parser.parse_args()
+
+    print(f"[INFO] Converting {args.model}...")
+    convert_model(args.model, args.output, compress=args.compress)
+    print(f"[INFO] Done! Converted model written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
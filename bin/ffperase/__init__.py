@@ -0,0 +1,27 @@
+"""
+ffperase
+
+In-process API of the FFPErase pipeline stages, on in-memory tables:
+
+- `ffperase.picard`: Picard detail metrics -> merged artifact metrics.
+- `ffperase.annotate`: variants pileup -> classifier features.
+- `ffperase.classify`: classifier features -> predictions.
+- `ffperase.train`: labelled features -> trained model.
+
+The `bin/` scripts are thin command line wrappers around these modules. The
+stage modules are not imported here, so that importing one of them does not
+load the dependencies of the others.
+
+Example usage:
+    from ffperase.annotate import annotate_pileup
+    from ffperase.classify import load_model, predict_features
+
+    features_df = annotate_pileup(
+        pileup_df, "reference.fasta", coverage=100, mutation_type="snvs",
+        pre_adapter_df=pre_adapter_df, bait_bias_df=bait_bias_df,
+    )
+    classified_df = predict_features(
+        load_model("model.joblib"), features_df, "ARTIFACT", "snvs"
+    )
+"""
+__version__ = "0.1.0"
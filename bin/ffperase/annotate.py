@@ -0,0 +1,481 @@
+"""
+annotate.py
+
+Annotate the pileups of the variants with the classifier features:
+
+1) Strand bias, depth and insert size ratios of each variant.
+2) Reference bases around it, and for indels their length, type, change,
+   microhomology and repeat classification.
+3) For SNVs, the Picard pre-adapter and bait bias error rates of its base
+   change and tri-nucleotide context.
+
+With a checkpoint directory, the sorted pileup is annotated in blocks, and
+each annotated block is saved there before the next one starts, so a retried
+task resumes from the last completed block.
+"""
+from os.path import join, realpath
+from pathlib import Path
+import hashlib
+import json
+import math
+import os
+import shutil
+
+import pandas as pd
+
+from . import __version__
+from .stage_profiler import profiler
+from .table import index_variant_table, sort_variants, write_variant_table
+from .twobit import open_reference
+
+# pysam, scipy.stats and microrep are imported on the code paths that use
+# them, so small or empty shards do not pay for them at start-up.
+
+SNV_CLASSIFIER_COLUMNS = [
+    "CHR", "START", "END", "REF", "ALT", "5_BASE", "3_BASE", "VAF", "STRAND_BIAS",
+    "AVG_BQ", "AVG_ALT_BQ", "AVG_MQ", "AVG_ALT_MQ", "AVG_ALT_MATE_MQ", "LOG_IS_RATIO",
+    "LOG_ALT_IS_RATIO", "AVG_EDIT_DIST", "AVG_READ_BAL", "DEPTH", "LOG_DEPTH_RATIO",
+    "VARIANT_READS", "VARIANT_ALLELES", "PA_BASE_CHANGE_ERROR", "PA_TRINUCLEO_ERROR",
+    "BB_BASE_CHANGE_ERROR", "BB_TRINUCLEO_ERROR",
+]
+
+INDEL_CLASSIFIER_COLUMNS = [
+    "CHR", "START", "END", "REF", "ALT", "CHANGE", "5_BASE", "3_BASE", "VAF",
+    "STRAND_BIAS", "AVG_BQ", "AVG_ALT_BQ", "AVG_MQ", "AVG_ALT_MQ", "AVG_ALT_MATE_MQ",
+    "LOG_IS_RATIO", "LOG_ALT_IS_RATIO", "AVG_EDIT_DIST", "AVG_READ_BAL", "DEPTH",
+    "LOG_DEPTH_RATIO", "VARIANT_READS", "INDEL_LENGTH", "INDEL_TYPE", "MHCOUNT",
+    "REPCOUNT", "CLASSIFICATION", "INDEL_COUNT",
+]
+
+CHECKPOINT_BLOCK_ROWS = 5000
+
+
+def calculate_strand_bias_score(mutation):
+    """
+    Calculate fisher score p-value based on strand information and converts to phred.
+
+    Arguments:
+        mutation (object): pileup structure with strand information.
+
+    Returns:
+        float: fisher exact score in phred scale
+    """
+    from scipy import stats
+
+    _, pvalue = stats.fisher_exact(
+        [[mutation["FR"], mutation["RR"]], [mutation["FA"], mutation["RA"]]]
+    )
+    fs = -10 * math.log10(pvalue)
+    return abs(fs)
+
+
+def get_indel_changes(df):
+    """
+    Get the changed bases of the indels, the REF or ALT that sorts last
+    without its first base.
+
+    Arguments:
+        df (pd.DataFrame): Indels with REF and ALT columns.
+
+    Returns:
+        pd.Series: CHANGE of each indel.
+    """
+    ref, alt = df["REF"], df["ALT"]
+    # Same as max(REF, ALT), which keeps REF when both are equal
+    return ref.where(~(alt > ref), alt).str[1:]
+
+
+def get_indel_lengths_types(df):
+    """
+    Get the length and type of the indels: D for deletions (REF longer than 1
+    and ALT of 1 base), I for insertions (REF of 1 base and ALT longer than 1),
+    or DI otherwise.
+
+    Arguments:
+        df (pd.DataFrame): Indels with REF and ALT columns.
+
+    Returns:
+        tuple: INDEL_LENGTH and INDEL_TYPE series.
+    """
+    import numpy as np
+
+    ref_length = df["REF"].astype(str).str.len()
+    alt_length = df["ALT"].astype(str).str.len()
+
+    indel_length = (alt_length - ref_length).abs()
+    indel_type = np.select(
+        [(ref_length > 1) & (alt_length == 1), (ref_length == 1) & (alt_length > 1)],
+        ["D", "I"],
+        default="DI",
+    )
+    return indel_length, pd.Series(indel_type, index=df.index)
+
+
+def get_indel_contexts(row, fasta):
+    """Get the 5' and 3' contexts of an indel with its CHANGE."""
+    bases_offset = 25 + len(row["CHANGE"])
+
+    context_5_start = row["START"] - bases_offset
+    context_5_end = row["START"]
+    context_3_start = row["START"] + len(row["REF"])
+    context_3_end = row["START"] + len(row["REF"]) + bases_offset
+
+    # Validate context indexes are in the valid range
+    chrom_lengths = dict(zip(fasta.references, fasta.lengths))
+    max_chrom_length = chrom_lengths[str(row["CHR"])]
+
+    context_5_start = max(context_5_start, 0)
+    context_5_end = max(context_5_end, 0)
+    context_3_start = min(context_3_start, max_chrom_length)
+    context_3_end = min(context_3_end, max_chrom_length)
+
+    # Fetch the contexts
+    context_5 = fasta.fetch(
+        reference=str(row["CHR"]), start=context_5_start, end=context_5_end
+    )
+    context_3 = fasta.fetch(
+        reference=str(row["CHR"]), start=context_3_start, end=context_3_end
+    )
+    return [context_5, context_3]
+
+
+def annotate_pileup(
+    pileup_df,
+    reference,
+    coverage,
+    median_insert=300,
+    mutation_type="snvs",
+    pre_adapter_df=None,
+    bait_bias_df=None,
+):
+    """
+    Annotate the pileup of the variants with the classifier features.
+
+    Arguments:
+        pileup_df (pd.DataFrame): Variants pileup, as written by annotate_w_pileup.
+        reference (str or FastaFile): Path to the reference fasta or .2bit, or
+            an open pysam FastaFile or TwoBitFile to reuse across calls.
+        coverage (int): Global coverage used for LOG_DEPTH_RATIO.
+        median_insert (int): Global median insert size used for insert ratios.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        pre_adapter_df (pd.DataFrame, optional): Picard pre-adapter metrics,
+            required for snvs.
+        bait_bias_df (pd.DataFrame, optional): Picard bait bias metrics,
+            required for snvs.
+
+    Returns:
+        pd.DataFrame: classifier features, one row per unique variant.
+    """
+    if mutation_type != "indels" and (pre_adapter_df is None or bait_bias_df is None):
+        raise ValueError("Picard pre-adapter and bait bias metrics are required for snvs.")
+
+    # Do not modify the pileup of the caller
+    df = pileup_df.drop_duplicates(subset=["CHR", "START", "REF", "ALT"]).copy()
+
+    # Calculate strand bias
+    with profiler.stage("strand_bias", rows=len(df)):
+        df["STRAND_BIAS"] = df.apply(calculate_strand_bias_score, axis=1)
+
+    # Calculate Log Depth ration with coverage
+    with profiler.stage("depth_insert_ratios", rows=len(df)):
+        coverage = int(coverage)
+        df["LOG_DEPTH_RATIO"] = df.apply(
+            lambda x: math.log(float(x["DEPTH"]) / coverage, coverage)
+            if x["DEPTH"] != 0
+            else 0,
+            axis=1,
+        )
+
+        # Add insert size metrics to mutations using median insert size
+        global_insert_size = int(median_insert)
+        df["LOG_IS_RATIO"] = df.apply(
+            lambda x: math.log(x["AVG_IS"] / global_insert_size, global_insert_size)
+            if round(x["AVG_IS"], 300) > 0
+            else 0,
+            axis=1,
+        )
+        df["LOG_ALT_IS_RATIO"] = df.apply(
+            lambda x: math.log(x["AVG_ALT_IS"] / global_insert_size, global_insert_size)
+            if round(x["AVG_ALT_IS"], 300) > 0
+            else 0,
+            axis=1,
+        )
+
+    # Open reference FASTA
+    with profiler.stage("fasta_fetch", rows=len(df)):
+        ref_fasta = open_reference(reference)
+
+        df["5_BASE"] = df.apply(
+            lambda x: ref_fasta.fetch(
+                str(x["CHR"]), start=x["START"] - 2, end=x["START"] - 1
+            ),
+            axis=1,
+        )
+        df["3_BASE"] = df.apply(
+            lambda x: ref_fasta.fetch(str(x["CHR"]), start=x["END"], end=x["END"] + 1),
+            axis=1
+        )
+
+    if mutation_type == "indels":
+        from .microrep import mhcaller, repcaller, finalcaller
+
+        # Indel-specific columns
+        with profiler.stage("indel_length_type", rows=len(df)):
+            df["INDEL_LENGTH"], df["INDEL_TYPE"] = get_indel_lengths_types(df)
+            df["CHANGE"] = get_indel_changes(df)
+
+        with profiler.stage("indel_contexts", rows=len(df)):
+            df[["CONTEXT_5", "CONTEXT_3"]] = df.apply(
+                lambda row: get_indel_contexts(row, ref_fasta),
+                axis=1,
+                result_type="expand",
+            )
+
+        with profiler.stage("microhomology_repeats", rows=len(df)):
+            df[["MHCOUNT", "MH"]] = df.apply(
+                lambda row: list(mhcaller(row["CHANGE"], row["CONTEXT_3"])),
+                axis=1,
+                result_type="expand"
+            )
+
+            df[["REPCOUNT", "REPEAT"]] = df.apply(
+                lambda row: list(
+                    repcaller(
+                        row["CHANGE"],
+                        row["CONTEXT_3"],
+                        row["CONTEXT_5"],
+                        row["INDEL_LENGTH"]
+                    )
+                ),
+                axis=1,
+                result_type="expand"
+            )
+
+            df["CLASSIFICATION"] = df.apply(
+                lambda row: finalcaller(
+                    row["MHCOUNT"], row["REPCOUNT"] * len(row["REPEAT"]), row["REPEAT"]
+                ),
+                axis=1
+            )
+
+        # Keep only Indel-based columns
+        return df[INDEL_CLASSIFIER_COLUMNS]
+
+    with profiler.stage("picard_lookup", rows=len(df)):
+        # Picard pre-adapter base-change error
+        pa_cxt = pre_adapter_df.set_index(["REF_BASE", "ALT_BASE"])
+        df["PA_BASE_CHANGE_ERROR"] = df.apply(
+            lambda x: pa_cxt.loc[x["REF"], x["ALT"]].ERROR_RATE.sum(), axis=1
+        )
+
+        # tri-nucleotide context error
+        pa_tri = pre_adapter_df.set_index("CONTEXT")
+        df["PA_TRINUCLEO_ERROR"] = df.apply(
+            lambda x: pa_tri.loc[x["5_BASE"] + x["REF"] + x["3_BASE"]].ERROR_RATE.sum(),
+            axis=1
+        )
+
+        # Picard bait-bias base-change error
+        bb_cxt = bait_bias_df.set_index(["REF_BASE", "ALT_BASE"])
+        df["BB_BASE_CHANGE_ERROR"] = df.apply(
+            lambda x: bb_cxt.loc[x["REF"], x["ALT"]].ERROR_RATE.sum(), axis=1
+        )
+
+        # tri-nucleotide context error
+        bb_cxt = bait_bias_df.set_index("CONTEXT")
+        df["BB_TRINUCLEO_ERROR"] = df.apply(
+            lambda x: bb_cxt.loc[x["5_BASE"] + x["REF"] + x["3_BASE"]].ERROR_RATE.sum(),
+            axis=1
+        )
+
+    # Keep only SNV-based columns
+    return df[SNV_CLASSIFIER_COLUMNS]
+
+
+def get_checkpoint_key(input_paths, reference, **options):
+    """
+    Hash the inputs of an annotation, so its checkpoints are only reused by
+    tasks annotating the same inputs with the same options.
+
+    Arguments:
+        input_paths (list): Pileup and Picard metrics files, hashed by content.
+        reference (str): Reference fasta, hashed by path, size and mtime.
+        **options: Annotation options.
+
+    Returns:
+        str: checkpoint key.
+    """
+    digest = hashlib.sha256()
+    for path in input_paths:
+        with open(path, "rb") as input_file:
+            for chunk in iter(lambda: input_file.read(1 << 20), b""):
+                digest.update(chunk)
+    stat = os.stat(reference)
+    options.update(
+        reference=[realpath(reference), stat.st_size, stat.st_mtime_ns],
+        version=__version__,
+    )
+    digest.update(json.dumps(options, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:32]
+
+
+def write_checkpoint(path, text):
+    """Write a checkpoint atomically, and flush it to disk before returning."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as checkpoint:
+        checkpoint.write(text)
+        checkpoint.flush()
+        os.fsync(checkpoint.fileno())
+    os.replace(tmp_path, path)
+
+
+def annotate_in_blocks(
+    pileup_df,
+    reference,
+    coverage,
+    output_path,
+    checkpoint_dir,
+    block_rows=CHECKPOINT_BLOCK_ROWS,
+    **annotate_kwargs,
+):
+    """
+    Annotate a pileup in blocks of sorted variants, resuming from checkpoints.
+
+    Each annotated block is saved to `checkpoint_dir` before the next one is
+    started, and blocks already there are not annotated again. Once all the
+    blocks are done, they are concatenated into the sorted and indexed
+    features, and the checkpoints are removed.
+
+    Arguments:
+        pileup_df (pd.DataFrame): Variants pileup.
+        reference (str): Path to the reference fasta or .2bit.
+        coverage (int): Global coverage used for LOG_DEPTH_RATIO.
+        output_path (str): Path to the features tsv.
+        checkpoint_dir (str): Durable directory for the annotated blocks,
+            specific to the inputs of the annotation.
+        block_rows (int): Number of variants annotated per block.
+        **annotate_kwargs: Options for `annotate_pileup`.
+
+    Returns:
+        str: path to the features tsv.
+    """
+    checkpoint_dir = Path(checkpoint_dir)
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+
+    # Deduplicate and sort first, so blocks are the same on every attempt
+    pileup_df = sort_variants(pileup_df.drop_duplicates(subset=["CHR", "START", "REF", "ALT"]))
+    n_blocks = max(1, math.ceil(len(pileup_df) / block_rows))
+    block_paths = [checkpoint_dir / f"block_{ix:05d}.tsv" for ix in range(n_blocks)]
+
+    done = sum(path.exists() for path in block_paths)
+    if done:
+        print(f"[INFO] Resuming annotation from {done} of {n_blocks} checkpointed blocks.")
+
+    ref_fasta = None
+    for ix, block_path in enumerate(block_paths):
+        if block_path.exists():
+            continue
+        if ref_fasta is None:
+            ref_fasta = open_reference(reference)
+        block_df = annotate_pileup(
+            pileup_df.iloc[ix * block_rows : (ix + 1) * block_rows],
+            ref_fasta,
+            coverage,
+            **annotate_kwargs,
+        )
+        with profiler.stage("write_checkpoint", rows=len(block_df)):
+            write_checkpoint(block_path, block_df.to_csv(sep="\t", index=False))
+
+    with profiler.stage("write_features", rows=len(pileup_df)):
+        with open(output_path, "w", encoding="utf-8") as features:
+            for ix, block_path in enumerate(block_paths):
+                with open(block_path, "r", encoding="utf-8") as block:
+                    header = block.readline()
+                    if ix == 0:
+                        features.write(header)
+                    shutil.copyfileobj(block, features)
+        index_variant_table(output_path)
+
+    shutil.rmtree(checkpoint_dir, ignore_errors=True)
+    return output_path
+
+
+def annotate_variants(
+    pileup,
+    picard_preadapter,
+    picard_baitbias,
+    reference,
+    coverage,
+    outdir,
+    median_insert=300,
+    mutation_type="snvs",
+    checkpoint_dir=None,
+    block_rows=CHECKPOINT_BLOCK_ROWS,
+):
+    """
+    Annotate a pileup tsv and write the classifier features to `features.tsv`,
+    sorted by coordinates with its `features.tsv.idx` block index.
+
+    Arguments:
+        pileup (str): Variants pileups file.
+        picard_preadapter (str): Picard's pre-adapter metrics file.
+        picard_baitbias (str): Picard's bait bias metrics file.
+        reference (str): Path to reference FASTA, or its .2bit.
+        coverage (int): Global coverage used for LOG_DEPTH_RATIO.
+        outdir (str): Output directory for results.
+        median_insert (int): Global median insert size used for insert ratios.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        checkpoint_dir (str, optional): Durable directory shared by the
+            attempts of a task, to checkpoint the annotation in blocks and
+            resume it. Checkpoints are kept in a subdirectory per inputs.
+        block_rows (int): Number of variants annotated per checkpoint.
+
+    Returns:
+        str: path to the features tsv.
+    """
+    with profiler.stage("read_pileup") as stage:
+        pileup_df = pd.read_csv(pileup, sep="\t")
+        stage.rows = len(pileup_df)
+
+    pre_adapter_df, bait_bias_df = None, None
+    if mutation_type != "indels":
+        with profiler.stage("read_picard"):
+            pre_adapter_df = pd.read_csv(picard_preadapter, sep="\t")
+            bait_bias_df = pd.read_csv(picard_baitbias, sep="\t")
+
+    output_path = join(outdir, "features.tsv")
+    annotate_kwargs = dict(
+        median_insert=median_insert,
+        mutation_type=mutation_type,
+        pre_adapter_df=pre_adapter_df,
+        bait_bias_df=bait_bias_df,
+    )
+
+    if checkpoint_dir:
+        input_paths = [pileup]
+        if mutation_type != "indels":
+            input_paths += [picard_preadapter, picard_baitbias]
+        key = get_checkpoint_key(
+            input_paths,
+            reference,
+            coverage=int(coverage),
+            median_insert=int(median_insert),
+            mutation_type=mutation_type,
+            block_rows=block_rows,
+        )
+        return annotate_in_blocks(
+            pileup_df,
+            reference,
+            coverage,
+            output_path,
+            join(checkpoint_dir, key),
+            block_rows=block_rows,
+            **annotate_kwargs,
+        )
+
+    df = annotate_pileup(pileup_df, reference, coverage, **annotate_kwargs)
+
+    # Write out annotated file, sorted and indexed by coordinates
+    with profiler.stage("write_features", rows=len(df)):
+        write_variant_table(df, output_path)
+    return output_path
@@ -0,0 +1,712 @@
+"""
+classify.py
+
+Classify FFPE artifacts with a trained Random Forest model:
+
+1) Load the model, without gzip inflation when it was saved uncompressed.
+2) Compile its preprocessing to fill the model input matrix straight from
+   the features columns.
+3) Predict the features in memory (`predict_features`, `predict_batch`), or
+   classify features tsvs, locally or with a model server, and annotate a tsv
+   with the predictions. Classified outputs of sorted features are indexed,
+   and a region of indexed features is classified without reading the rest.
+"""
+from glob import glob
+from io import BytesIO
+from functools import lru_cache
+from pathlib import Path
+
+from .scatter import open_table
+from .stage_profiler import profiler
+from .table import read_region, try_index_variant_table
+
+# numpy, pandas, joblib and sklearn are imported by the functions that use
+# them, so that tasks classified by a model server never load them.
+
+
+def is_compressed_model(model_path):
+    """Check if a joblib file was dumped with compression."""
+    with open(model_path, "rb") as model_file:
+        # Uncompressed joblib files start with the pickle protocol opcode
+        return model_file.read(1) != b"\x80"
+
+
+def load_model(model_path):
+    """
+    Loads and validates a trained Random Forest pipeline.
+
+    Uncompressed models are loaded with `mmap_mode="r"`, which skips the gzip
+    inflation and loads faster. The tree arrays are still copied into each
+    process when sklearn unpickles the trees.
+
+    Args:
+        model_path (str): Path to the trained model (joblib file).
+
+    Returns:
+        Pipeline: the trained model.
+    """
+    import joblib
+
+    if is_compressed_model(model_path):
+        with open(model_path, "rb") as model_file:
+            model = joblib.load(model_file)
+    else:
+        model = joblib.load(model_path, mmap_mode="r")
+
+    if not hasattr(model, "predict") or not hasattr(model, "predict_proba"):
+        raise Exception("Invalid joblib file model: Missing necessary methods.")
+    return model
+
+
+def get_model_inputs(features_df, mutation_type):
+    """
+    Selects the model inputs from a dataframe of preprocessed features.
+
+    Args:
+        features_df (pd.DataFrame): Preprocessed features.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+
+    Returns:
+        pd.DataFrame: features to pass to the model.
+    """
+    cols_to_drop = ["CHR", "START", "END"]
+    for col in features_df.columns:
+        if col == "ARTIFACT" or "predicts" in col:
+            cols_to_drop.append(col)
+
+    features = features_df.drop(cols_to_drop, axis=1)
+    if mutation_type == "indels":
+        features = features.drop(["REF", "ALT", "CHANGE"], axis=1)
+    return features
+
+
+class CompiledPreprocessing:
+    """
+    Fitted model preprocessing, compiled to numpy operations.
+
+    Holds the OneHotEncoder categories and SimpleImputer statistics of the
+    model ColumnTransformer, and fills the model input matrix straight from
+    the features columns, without the per-column pandas and sparse matrix
+    work of the ColumnTransformer.
+
+    Args:
+        categorical (list): (column, output offset, categories) tuples.
+        numerical (list): (column, output offset, imputed value) tuples.
+        n_outputs (int): Number of model input columns.
+    """
+
+    def __init__(self, categorical, numerical, n_outputs):
+        import numpy as np
+        import pandas as pd
+
+        self.categorical = []
+        for col, offset, categories in categorical:
+            missing = [ix for ix, cat in enumerate(categories) if pd.isna(cat)]
+            known = [ix for ix, cat in enumerate(categories) if not pd.isna(cat)]
+            self.categorical.append(
+                (
+                    col,
+                    offset,
+                    pd.Index([categories[ix] for ix in known]),
+                    np.array(known, dtype=int),
+                    missing[0] if missing else None,
+                )
+            )
+        self.numerical = numerical
+        self.n_outputs = n_outputs
+
+    def transform(self, features_df, out=None):
+        """
+        Transforms features into a float32 model input matrix.
+
+        Args:
+            features_df (pd.DataFrame): Preprocessed features.
+            out (np.ndarray, optional): Zeroed C-contiguous float32 matrix of
+                `len(features_df)` rows to fill in place.
+
+        Returns:
+            np.ndarray: model input matrix.
+        """
+        import numpy as np
+
+        if out is None:
+            out = np.zeros((len(features_df), self.n_outputs), dtype=np.float32)
+
+        for col, offset, index, positions, missing in self.categorical:
+            values = features_df[col]
+            codes = index.get_indexer(values)
+            rows = np.flatnonzero(codes >= 0)
+            out[rows, offset + positions[codes[rows]]] = 1
+            if missing is not None:
+                out[np.flatnonzero(values.isna().to_numpy()), offset + missing] = 1
+
+        for col, offset, statistic in self.numerical:
+            values = features_df[col].to_numpy(dtype=np.float64)
+            out[:, offset] = np.where(np.isnan(values), statistic, values)
+        return out
+
+
+@lru_cache(maxsize=None)
+def compile_preprocessing(model):
+    """
+    Compiles the preprocessing of a trained model, once per model.
+
+    Args:
+        model (Pipeline): Trained model.
+
+    Returns:
+        CompiledPreprocessing: the compiled preprocessing, or None if the
+            preprocessing is not a ColumnTransformer of OneHotEncoders and
+            SimpleImputers that can be compiled.
+    """
+    import pandas as pd
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    categorical, numerical, offset = [], [], 0
+    for _, transformer, columns in model.named_steps["preprocess"].transformers_:
+        if isinstance(transformer, str):
+            if transformer == "drop":
+                continue
+            return None
+        if not all(isinstance(col, str) for col in columns):
+            return None
+        if isinstance(transformer, Pipeline):
+            if len(transformer.steps) != 1:
+                return None
+            transformer = transformer.steps[0][1]
+
+        if isinstance(transformer, OneHotEncoder):
+            if transformer.drop is not None or transformer.handle_unknown != "ignore":
+                return None
+            for col, categories in zip(columns, transformer.categories_):
+                categorical.append((col, offset, list(categories)))
+                offset += len(categories)
+        elif isinstance(transformer, SimpleImputer):
+            if transformer.add_indicator or not pd.isna(transformer.missing_values):
+                return None
+            for col, statistic in zip(columns, transformer.statistics_):
+                # Columns without any value at fit time are dropped by the imputer
+                if not pd.isna(statistic):
+                    numerical.append((col, offset, float(statistic)))
+                    offset += 1
+        else:
+            return None
+    return CompiledPreprocessing(categorical, numerical, offset)
+
+
+def get_model_matrix(model, features_dfs, mutation_type):
+    """
+    Transforms several features dataframes into one model input matrix.
+
+    Args:
+        model (Pipeline): Trained model.
+        features_dfs (list): Preprocessed features dataframes.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+
+    Returns:
+        np.ndarray or sparse matrix: model input matrix.
+    """
+    import numpy as np
+    import pandas as pd
+
+    compiled = compile_preprocessing(model)
+    if compiled is None:
+        features = pd.concat(
+            [get_model_inputs(df, mutation_type) for df in features_dfs],
+            ignore_index=True,
+        )
+        return model.named_steps["preprocess"].transform(features)
+
+    X = np.zeros((sum(len(df) for df in features_dfs), compiled.n_outputs), np.float32)
+    start = 0
+    for features_df in features_dfs:
+        compiled.transform(features_df, out=X[start : start + len(features_df)])
+        start += len(features_df)
+    return X
+
+
+def predict_cascade(classifier, X, block_size=10, band=None, min_trees=None, audit=0.01):
+    """
+    Classifies features evaluating the forest trees in blocks, with early exit.
+
+    After each block of trees, a variant stops being scored once the trees
+    left can no longer move its probability across 0.5, so its label is the
+    one of the full forest. With `band`, it also stops once its running
+    probability is further than `band` from 0.5, which may change its label:
+    a random `audit` fraction of the variants is then scored with the full
+    forest to report how often labels differ. The raw score of a variant that
+    exited early is the mean probability of the trees evaluated.
+
+    Args:
+        classifier (BalancedRandomForestClassifier): Trained forest.
+        X (np.ndarray or sparse matrix): Model input matrix.
+        block_size (int): Number of trees evaluated between exit checks.
+        band (float, optional): Exit once the running probability is outside
+            0.5 +/- band.
+        min_trees (int, optional): Trees evaluated before exiting by band,
+            defaults to `block_size`.
+        audit (float): Fraction of variants to compare with the full forest
+            when exiting by band.
+
+    Returns:
+        tuple: predicted labels and raw scores.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    if sparse.issparse(X):
+        X = X.tocsr().astype(np.float32)
+    else:
+        X = np.ascontiguousarray(X, dtype=np.float32)
+
+    trees = classifier.estimators_
+    n_trees, n_rows = len(trees), X.shape[0]
+    half, eps = n_trees / 2, 1e-9 * n_trees
+    min_trees = min_trees or block_size
+
+    totals = np.zeros(n_rows)
+    n_evaluated = np.full(n_rows, n_trees)
+    active = np.arange(n_rows)
+    for start in range(0, n_trees, block_size):
+        X_active = X[active]
+        for tree in trees[start : start + block_size]:
+            totals[active] += tree.predict_proba(X_active)[:, 1]
+        done = min(start + block_size, n_trees)
+        if done == n_trees:
+            break
+
+        sums = totals[active]
+        exits = (sums > half + eps) | (sums + n_trees - done < half - eps)
+        if band is not None and done >= min_trees:
+            exits |= np.abs(sums / done - 0.5) > band
+        n_evaluated[active[exits]] = done
+        active = active[~exits]
+        if not len(active):
+            break
+
+    raw_scores = totals / n_evaluated
+    predicts = classifier.classes_.take((raw_scores > 0.5).astype(int))
+
+    message = (
+        f"[INFO] Cascade evaluated {n_evaluated.mean():.1f} of {n_trees} trees "
+        f"per variant, {(n_evaluated < n_trees).mean():.1%} exited early."
+    )
+    if band is None:
+        message += " Labels match the full forest."
+    elif audit and n_rows:
+        sample = np.random.RandomState(0).choice(
+            n_rows, size=max(1, int(audit * n_rows)), replace=False
+        )
+        differ = (classifier.predict(X[sample]) != predicts[sample]).sum()
+        message += (
+            f" Audit: {differ} of {len(sample)} labels differ from the full forest "
+            f"({differ / len(sample):.2%})."
+        )
+    print(message)
+    return predicts, raw_scores
+
+
+def get_predictions(model, features_dfs, mutation_type, cascade=None):
+    """
+    Gets the predicted labels and raw scores of several features dataframes.
+
+    Args:
+        model (Pipeline): Trained model.
+        features_dfs (list): Preprocessed features dataframes.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        cascade (dict, optional): Options for `predict_cascade`, to classify
+            with early exit instead of the full forest.
+
+    Returns:
+        tuple: predicted labels and raw scores.
+    """
+    import numpy as np
+    import pandas as pd
+
+    steps = getattr(model, "named_steps", {})
+    if set(steps) != {"preprocess", "classifier"}:
+        features = pd.concat(
+            [get_model_inputs(df, mutation_type) for df in features_dfs],
+            ignore_index=True,
+        )
+        with profiler.stage("predict", rows=len(features)):
+            return model.predict(features), model.predict_proba(features)[:, 1]
+
+    n_rows = sum(len(df) for df in features_dfs)
+    with profiler.stage("preprocess", rows=n_rows):
+        X = get_model_matrix(model, features_dfs, mutation_type)
+    classifier = steps["classifier"]
+    with profiler.stage("predict", rows=n_rows):
+        if cascade is not None:
+            return predict_cascade(classifier, X, **cascade)
+        proba = classifier.predict_proba(X)
+        return classifier.classes_.take(np.argmax(proba, axis=1)), proba[:, 1]
+
+
+def predict_features(model, features_df, model_name, mutation_type, cascade=None):
+    """
+    Adds the model predictions to a dataframe of preprocessed features.
+
+    Args:
+        model (Pipeline): Trained model.
+        features_df (pd.DataFrame): Preprocessed features.
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        cascade (dict, optional): Options to classify with early exit.
+
+    Returns:
+        pd.DataFrame: features with `<model_name>_raw_predicts` and
+            `<model_name>_predicts` columns.
+    """
+    features_df["CHR"] = features_df["CHR"].astype(str)
+
+    # Perform classification
+    predicts, raw_scores = get_predictions(model, [features_df], mutation_type, cascade)
+
+    # Add predictions to dataframe
+    features_df[f"{model_name}_raw_predicts"] = raw_scores
+    features_df[f"{model_name}_predicts"] = predicts.astype(bool)
+    return features_df
+
+
+def predict_batch(model, features_dfs, model_name, mutation_type, cascade=None):
+    """
+    Adds the model predictions to several dataframes with one predict call.
+
+    Args:
+        model (Pipeline): Trained model.
+        features_dfs (list): Preprocessed features dataframes.
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        cascade (dict, optional): Options to classify with early exit.
+
+    Returns:
+        list: features dataframes with predictions.
+    """
+    if len(features_dfs) == 1:
+        return [
+            predict_features(model, features_dfs[0], model_name, mutation_type, cascade)
+        ]
+
+    predicts, raw_scores = get_predictions(model, features_dfs, mutation_type, cascade)
+
+    start = 0
+    for features_df in features_dfs:
+        end = start + len(features_df)
+        features_df["CHR"] = features_df["CHR"].astype(str)
+        features_df[f"{model_name}_raw_predicts"] = raw_scores[start:end]
+        features_df[f"{model_name}_predicts"] = predicts[start:end].astype(bool)
+        start = end
+    return features_dfs
+
+
+def get_samples(features_paths=None, manifest_path=None):
+    """
+    Gets the sample names and features paths to classify.
+
+    Features paths can be globs. Sample names are taken from the manifest, or
+    from the shortest path suffix that tells the features files apart, without
+    their extensions, e.g. `sample1/preprocess/features.tsv.gz` ->
+    `sample1_preprocess_features`.
+
+    Args:
+        features_paths (list, optional): Paths or globs to features tsvs.
+        manifest_path (str, optional): Tsv with `sample` and `features` columns.
+
+    Returns:
+        list: (sample, features path) tuples.
+    """
+    if manifest_path:
+        import pandas as pd
+
+        manifest = pd.read_csv(manifest_path, sep="\t", dtype=str)
+        missing = {"sample", "features"} - set(manifest.columns)
+        if missing:
+            raise ValueError(f"Manifest {manifest_path} is missing columns: {missing}")
+        if manifest["sample"].duplicated().any():
+            raise ValueError(f"Manifest {manifest_path} has duplicated samples.")
+        return list(zip(manifest["sample"], manifest["features"]))
+
+    paths = []
+    for features_path in features_paths:
+        if not any(char in features_path for char in "*?["):
+            paths.append(features_path)
+            continue
+        matches = sorted(glob(features_path))
+        if not matches:
+            raise FileNotFoundError(f"No features files found for {features_path}")
+        paths += matches
+
+    # All suffixes are stripped, e.g. of `features.tsv.gz`
+    parts = [Path(path).parent.parts + (Path(path).name.split(".")[0],) for path in paths]
+    for depth in range(1, max(len(p) for p in parts) + 1):
+        samples = ["_".join(p[-depth:]) for p in parts]
+        if len(set(samples)) == len(samples):
+            break
+    else:
+        raise ValueError("Features files are repeated, use a manifest instead.")
+    return list(zip(samples, paths))
+
+
+def classify_samples_with_random_forest(
+    samples, model_path, model_name, mutation_type, outdir, batch_rows=None, cascade=None
+):
+    """
+    Classifies several samples loading the model only once.
+
+    Args:
+        samples (list): (sample, features path) tuples.
+        model_path (str): Path to the trained model (joblib file).
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        outdir (str): Directory to save the output files.
+        batch_rows (int, optional): Classify consecutive samples together
+            until they add up to this many variants.
+        cascade (dict, optional): Options to classify with early exit.
+
+    Returns:
+        None
+    """
+    import pandas as pd
+
+    classify_dir = Path(outdir) / "classify"
+    classify_dir.mkdir(parents=True, exist_ok=True)
+
+    with profiler.stage("load_model"):
+        model = load_model(model_path)
+
+    def write_batch(batch):
+        features_dfs = predict_batch(
+            model, [df for _, df in batch], model_name, mutation_type, cascade
+        )
+        for (sample, _), features_df in zip(batch, features_dfs):
+            out_classified_tsv = classify_dir / f"classified_df_{sample}_{mutation_type}.tsv"
+            with profiler.stage("write_classified", rows=len(features_df)):
+                features_df.to_csv(out_classified_tsv, sep="\t", index=False)
+                try_index_variant_table(out_classified_tsv)
+            print(f"Classified TSV saved at: {out_classified_tsv}")
+
+    batch, batch_size = [], 0
+    for sample, features_path in samples:
+        with profiler.stage("read_features") as stage:
+            features_df = pd.read_csv(features_path, sep="\t", low_memory=False)
+            stage.rows = len(features_df)
+        batch.append((sample, features_df))
+        batch_size += len(features_df)
+        if not batch_rows or batch_size >= batch_rows:
+            write_batch(batch)
+            batch, batch_size = [], 0
+    if batch:
+        write_batch(batch)
+
+
+def annotate_with_predictions(
+    annotated_tsv_path, features_df, model_name, out_annotated_tsv, chunksize=100000
+):
+    """
+    Adds the predictions to an annotated tsv, streaming it in chunks.
+
+    The predictions are indexed once by (CHR, START, REF, ALT), and each chunk
+    of the annotated tsv is joined against that index and appended to the
+    output, so the annotated tsv is never fully loaded. Its values are written
+    as they are read.
+
+    Args:
+        annotated_tsv_path (str): Path to tsv file to add annotation.
+        features_df (pd.DataFrame): Features with the model predictions.
+        model_name (str): Name of the model for labeling outputs.
+        out_annotated_tsv (str): Path to the annotated output.
+        chunksize (int): Number of annotated rows to join at a time.
+
+    Returns:
+        None
+    """
+    import pandas as pd
+
+    keys = ["CHR", "START", "REF", "ALT"]
+    predict_cols = [f"{model_name}_raw_predicts", f"{model_name}_predicts"]
+    predictions = features_df[keys + predict_cols].copy()
+    predictions[keys] = predictions[keys].astype(str)
+    index = pd.MultiIndex.from_frame(predictions[keys])
+
+    read_options = dict(sep="\t", comment="#", dtype=str, keep_default_na=False)
+    columns = pd.read_csv(annotated_tsv_path, nrows=0, **read_options).columns
+    use_index = index.is_unique and not columns.isin(predict_cols).any()
+
+    with open(out_annotated_tsv, "w") as out_file:
+        header = True
+        for chunk in pd.read_csv(annotated_tsv_path, chunksize=chunksize, **read_options):
+            if use_index:
+                rows = index.get_indexer(pd.MultiIndex.from_frame(chunk[keys]))
+                chunk = chunk[rows >= 0].copy()
+                for col in predict_cols:
+                    chunk[col] = predictions[col].to_numpy()[rows[rows >= 0]]
+            else:
+                # Duplicated keys, keep the annotated rows order
+                chunk = (
+                    chunk.assign(_row=range(len(chunk)))
+                    .merge(predictions, how="inner", on=keys)
+                    .sort_values("_row", kind="mergesort")
+                    .drop(columns="_row")
+                )
+            chunk.to_csv(out_file, sep="\t", index=False, header=header)
+            header = False
+
+        if header:
+            empty = pd.DataFrame(columns=columns).merge(predictions, how="inner", on=keys)
+            empty.to_csv(out_file, sep="\t", index=False)
+
+
+def read_classified(classified):
+    """
+    Reads a classified tsv, with the raw predictions exactly as written.
+
+    Args:
+        classified (str or file): Path or buffer of the classified tsv.
+
+    Returns:
+        pd.DataFrame: the features with the model predictions.
+    """
+    import pandas as pd
+
+    features_df = pd.read_csv(
+        classified, sep="\t", low_memory=False, float_precision="round_trip"
+    )
+    features_df["CHR"] = features_df["CHR"].astype(str)
+    return features_df
+
+
+def classify_with_server(
+    server, features_path, model_path, model_name, mutation_type, cascade=None, payload=None
+):
+    """
+    Classifies features with a running model server.
+
+    Args:
+        server (str): Unix socket path or localhost port of the server.
+        features_path (str): Path to tsv with preprocessed features.
+        model_path (str): Path to the trained model (joblib file).
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        cascade (dict, optional): Options to classify with early exit.
+        payload (bytes, optional): Features tsv content to send instead of
+            the content of `features_path`.
+
+    Returns:
+        bytes: classified tsv content, or None if the server is not available
+            or could not classify the features.
+    """
+    from .serve import request_classification, ServerUnavailable
+
+    try:
+        if payload is None:
+            with open_table(features_path, "rb") as features_file:
+                payload = features_file.read()
+        return request_classification(
+            server,
+            model_path=model_path,
+            model_name=model_name,
+            mutation_type=mutation_type,
+            payload=payload,
+            cascade=cascade,
+        )
+    except ServerUnavailable as error:
+        print(f"[WARNING] {error}. Falling back to in-process classification.")
+        return None
+
+
+def classify_with_random_forest(
+    features_path,
+    model_path,
+    model_name,
+    mutation_type,
+    annotated_tsv_path,
+    outdir,
+    server=None,
+    cascade=None,
+    region=None,
+):
+    """
+    Classifies data using a Random Forest model.
+
+    Args:
+        features (str): Path to tsv with preprocessed features.
+        model (str): Path to the trained model (joblib file).
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        annotated_tsv (str, optional): Path to tsv file to add annotation.
+        outdir (str, optional): Directory to save the output files.
+        server (str, optional): Model server to use when one is running.
+        cascade (dict, optional): Options to classify with early exit.
+        region (str, optional): Only classify the variants with START within
+            a `CHR`, `CHR:POS` or `CHR:START-END` region, read with the block
+            index of the features when there is one.
+
+    Returns:
+        None
+    """
+    # Ensure output directory exists
+    classify_dir = Path(outdir) / "classify"
+    classify_dir.mkdir(parents=True, exist_ok=True)
+
+    # Path for output
+    out_classified_tsv = classify_dir / f"classified_df_{mutation_type}.tsv"
+
+    payload = None
+    if region:
+        with profiler.stage("read_region") as stage:
+            payload = read_region(features_path, region).encode("utf-8")
+            stage.rows = payload.count(b"\n") - 1
+
+    classified = None
+    if server:
+        with profiler.stage("server"):
+            classified = classify_with_server(
+                server,
+                features_path,
+                model_path,
+                model_name,
+                mutation_type,
+                cascade,
+                payload=payload,
+            )
+
+    if classified is None:
+        import pandas as pd
+
+        # Load and validate model
+        with profiler.stage("load_model"):
+            model = load_model(model_path)
+
+        # Load input dataframe
+        with profiler.stage("read_features") as stage:
+            features_df = pd.read_csv(
+                features_path if payload is None else BytesIO(payload),
+                sep="\t",
+                low_memory=False,
+            )
+            stage.rows = len(features_df)
+        features_df = predict_features(
+            model, features_df, model_name, mutation_type, cascade
+        )
+        with profiler.stage("write_classified", rows=len(features_df)):
+            features_df.to_csv(out_classified_tsv, sep="\t", index=False)
+    else:
+        # Keep the server output as is, parse it only if needed to annotate
+        out_classified_tsv.write_bytes(classified)
+        if annotated_tsv_path:
+            features_df = read_classified(BytesIO(classified))
+
+    try_index_variant_table(out_classified_tsv)
+    print(f"Classified TSV saved at: {out_classified_tsv}")
+
+    # Annotate if annotated_tsv_path is provided
+    if annotated_tsv_path:
+        out_annotated_tsv = classify_dir / "annotated.tsv"
+        with profiler.stage("annotate", rows=len(features_df)):
+            annotate_with_predictions(
+                annotated_tsv_path, features_df, model_name, out_annotated_tsv
+            )
+        print(f"Annotated TSV saved at: {out_annotated_tsv}")
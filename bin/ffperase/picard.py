@@ -0,0 +1,180 @@
+"""
+picard.py
+
+Merge multiple Picard artifact metrics (pre-adapter and bait-bias) by:
+1) Summing relevant columns across the partial detail metrics of each interval.
+2) Computing ERROR_RATE, QSCORE, etc.
+
+`get_picard_metrics` does it for the partial files of a run in
+`picard_dir/tmpPicard`, or copies already merged metrics.
+"""
+from os.path import join, isdir, exists
+from glob import glob
+
+import math
+import shutil
+import pandas as pd
+
+from .stage_profiler import profiler
+
+
+PICARD_CONTEXT_COLS = ["SAMPLE_ALIAS", "LIBRARY", "REF_BASE", "ALT_BASE", "CONTEXT"]
+
+PICARD_PRE_ADAPTER_COLS = [
+    "PRO_REF_BASES",
+    "PRO_ALT_BASES",
+    "CON_REF_BASES",
+    "CON_ALT_BASES",
+]
+
+PICARD_BAIT_BIAS_COLS = [
+    "FWD_CXT_REF_BASES",
+    "FWD_CXT_ALT_BASES",
+    "REV_CXT_REF_BASES",
+    "REV_CXT_ALT_BASES",
+]
+
+
+def read_detail_metrics(path):
+    """Read a Picard detail metrics file, skipping its header."""
+    return pd.read_csv(path, sep="\t", skiprows=6)
+
+
+def merge_pre_adapter_metrics(detail_dfs):
+    """
+    Merge the pre-adapter detail metrics of several intervals.
+
+    Arguments:
+        detail_dfs (list): Picard pre-adapter detail metrics dataframes.
+
+    Returns:
+        pd.DataFrame: summed counts with their ERROR_RATE and QSCORE.
+    """
+    # Use the first metrics as a baseline
+    df0 = detail_dfs[0]
+    base_counts = df0[PICARD_PRE_ADAPTER_COLS].copy()
+    metrics = df0[PICARD_CONTEXT_COLS].copy()
+
+    # Sum up additional metrics
+    for dfi in detail_dfs[1:]:
+        base_counts = base_counts.add(dfi[PICARD_PRE_ADAPTER_COLS])
+
+    # Join contextual columns with the summed columns
+    metrics = metrics.join(base_counts)
+
+    # Compute ERROR_RATE and QSCORE
+    def compute_pre_error_rate(row):
+        numerator = float(row["PRO_ALT_BASES"] - row["CON_ALT_BASES"])
+        denominator = float(
+            row["PRO_ALT_BASES"]
+            + row["PRO_REF_BASES"]
+            + row["CON_ALT_BASES"]
+            + row["CON_REF_BASES"]
+        )
+        return round(max(1e-10, numerator / denominator), 6)
+
+    metrics["ERROR_RATE"] = metrics.apply(compute_pre_error_rate, axis=1)
+    metrics["QSCORE"] = metrics.apply(
+        lambda x: int(-10 * math.log10(x["ERROR_RATE"])) if x["ERROR_RATE"] > 0 else 100,
+        axis=1,
+    )
+    return metrics
+
+
+def merge_bait_bias_metrics(detail_dfs):
+    """
+    Merge the bait bias detail metrics of several intervals.
+
+    Arguments:
+        detail_dfs (list): Picard bait bias detail metrics dataframes.
+
+    Returns:
+        pd.DataFrame: summed counts with their error rates and QSCORE.
+    """
+    # Use the first metrics as a baseline
+    df0 = detail_dfs[0]
+    base_counts = df0[PICARD_BAIT_BIAS_COLS].copy()
+    metrics = df0[PICARD_CONTEXT_COLS].copy()
+
+    for dfi in detail_dfs[1:]:
+        base_counts = base_counts.add(dfi[PICARD_BAIT_BIAS_COLS], fill_value=0)
+
+    metrics = metrics.join(base_counts)
+
+    # Compute columns
+    def safe_rate(alt, ref):
+        return max(1e-10, float(alt) / float(alt + ref))
+
+    metrics["FWD_ERROR_RATE"] = metrics.apply(
+        lambda x: round(safe_rate(x["FWD_CXT_ALT_BASES"], x["FWD_CXT_REF_BASES"]), 6),
+        axis=1,
+    )
+    metrics["REV_ERROR_RATE"] = metrics.apply(
+        lambda x: round(safe_rate(x["REV_CXT_ALT_BASES"], x["REV_CXT_REF_BASES"]), 6),
+        axis=1,
+    )
+    metrics["ERROR_RATE"] = metrics.apply(
+        lambda x: round(max(1e-10, x["FWD_ERROR_RATE"] - x["REV_ERROR_RATE"]), 6),
+        axis=1
+    )
+    metrics["QSCORE"] = metrics.apply(
+        lambda x: int(-10 * math.log10(x["ERROR_RATE"])) if x["ERROR_RATE"] > 0 else 100,
+        axis=1,
+    )
+    return metrics
+
+
+def get_picard_metrics(picard_dir, outdir="."):
+    """
+    Merges Picard metrics for each interval:
+      - Sums up partial pre_adapter files from tmpPicard.
+      - Sums up partial bait_bias files from tmpPicard.
+      - Computes ERROR_RATE, QSCORE, etc.
+      - Writes final merged files to outdir
+      - Removes picard_dir/tmpPicard
+
+    Output:
+      - outdir/pre_adapter_metrics.tsv
+      - outdir/bait_bias_metrics.tsv
+
+    Returns:
+        tuple: pre-adapter and bait bias metrics dataframes.
+    """
+    aggregate = True
+    artifacts = join(picard_dir, "tmpPicard")
+    if not isdir(artifacts):
+        aggregate = False
+        artifacts = picard_dir
+
+    merged = []
+    for name, pattern, merge_metrics in [
+        ("pre_adapter", "*pre_adapter_detail_metrics*", merge_pre_adapter_metrics),
+        ("bait_bias", "*bait_bias_detail_metrics*", merge_bait_bias_metrics),
+    ]:
+        with profiler.stage(f"{name}_metrics") as stage:
+            if not aggregate:
+                # Do not compute metrics if these are provided
+                metrics_file = join(artifacts, f"{name}_metrics.tsv")
+                if not exists(metrics_file):
+                    raise FileNotFoundError(f"No {name}_metrics.tsv found in {artifacts}")
+                metrics = pd.read_csv(metrics_file, sep="\t")
+            else:
+                detail_files = glob(join(artifacts, pattern))
+                if not detail_files:
+                    raise FileNotFoundError(f"No {pattern[:-1]} files found in {artifacts}")
+                metrics = merge_metrics([read_detail_metrics(f) for f in detail_files])
+
+            # Save metrics output
+            metrics.to_csv(
+                join(outdir, f"{name}_metrics.tsv"),
+                float_format="%.6f",
+                sep="\t",
+                index=False,
+            )
+            stage.rows = len(metrics)
+        merged.append(metrics)
+
+    # If tmp picard files were used, clean tmp dir.
+    if aggregate:
+        shutil.rmtree(artifacts, ignore_errors=True)
+    return tuple(merged)
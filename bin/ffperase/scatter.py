@@ -0,0 +1,183 @@
+"""
+scatter.py
+
+Scatter a variants table (pileup, features or classified tsv) into partitions
+that can be annotated and classified as independent tasks, and gather their
+outputs back:
+
+1) Sort the variants in coordinate order, chromosomes as 1..22, X, Y, M and
+   then the other contigs by name.
+2) Split them by chromosome, or in balanced chunks of variants. Variants at
+   the same position always fall in the same partition, so duplicated pileup
+   rows are still dropped by the annotation.
+3) Gather partitions by concatenating them in the order of their first
+   variant, as each one is a contiguous coordinate range.
+
+Rows are copied as read, so the scattered values are not reformatted. Tables
+compressed with bgzip (`.gz`) are read as they are.
+"""
+from itertools import groupby
+from pathlib import Path
+import gzip
+import shutil
+
+NAMED_CHROMOSOMES = ["X", "Y", "M", "MT"]
+
+
+def get_chrom_key(chrom):
+    """Get the sort key of a chromosome: 1..22, X, Y, M and then by name."""
+    name = chrom[3:] if chrom.lower().startswith("chr") else chrom
+    if name.isdigit():
+        return (0, int(name), "")
+    if name.upper() in NAMED_CHROMOSOMES:
+        return (1, NAMED_CHROMOSOMES.index(name.upper()), "")
+    return (2, 0, chrom)
+
+
+def open_table(table_path, mode="r"):
+    """Open a variants tsv, or its bgzip or gzip compressed `.gz`, as text or bytes."""
+    binary = "b" in mode
+    encoding = None if binary else "utf-8"
+    if str(table_path).endswith(".gz"):
+        return gzip.open(table_path, mode if binary else f"{mode}t", encoding=encoding)
+    return open(table_path, mode, encoding=encoding)
+
+
+def get_key_columns(header):
+    """Get the index of the CHR and START columns of a tsv header."""
+    columns = header.rstrip("\n").split("\t")
+    missing = {"CHR", "START"} - set(columns)
+    if missing:
+        raise ValueError(f"Variants table is missing columns: {missing}")
+    return columns.index("CHR"), columns.index("START")
+
+
+def read_variants(table_path):
+    """
+    Read the rows of a variants tsv with their coordinates.
+
+    Arguments:
+        table_path (str): Tsv with CHR and START columns.
+
+    Returns:
+        tuple: header line, and list of (chrom key, start, line) rows.
+    """
+    chrom_keys = {}
+    rows = []
+    with open_table(table_path) as table:
+        header = table.readline()
+        chrom_ix, start_ix = get_key_columns(header)
+        for line in table:
+            if not line.strip():
+                continue
+            if not line.endswith("\n"):
+                line += "\n"
+            fields = line.split("\t", max(chrom_ix, start_ix) + 1)
+            chrom = fields[chrom_ix]
+            if chrom not in chrom_keys:
+                chrom_keys[chrom] = get_chrom_key(chrom)
+            rows.append((chrom_keys[chrom], int(fields[start_ix]), line))
+    return header, rows
+
+
+def get_partitions(rows, by="chromosome", chunks=1):
+    """
+    Split variants rows in coordinate order into partitions.
+
+    Arguments:
+        rows (list): (chrom key, start, line) rows.
+        by (str): "chromosome" for a partition per chromosome, or "chunks"
+            for `chunks` partitions with about the same number of variants.
+        chunks (int): Number of partitions when splitting by chunks.
+
+    Returns:
+        list: lists of lines, in coordinate order.
+    """
+    if by not in ("chromosome", "chunks"):
+        raise ValueError(f"Invalid scatter mode: {by}, use 'chromosome' or 'chunks'.")
+
+    # Sorting is stable, so rows at the same position keep their order
+    rows = sorted(rows, key=lambda row: (row[0], row[1]))
+    if by == "chromosome":
+        return [[row[2] for row in group] for _, group in groupby(rows, key=lambda row: row[0])]
+
+    partitions, position, first = [], None, 0
+    for ix, (chrom_key, start, line) in enumerate(rows):
+        # Only start a new partition where the position changes
+        if (chrom_key, start) != position:
+            position, first = (chrom_key, start), ix
+        partition = first * max(chunks, 1) // len(rows)
+        if partition >= len(partitions):
+            partitions.append([])
+        partitions[-1].append(line)
+    return partitions
+
+
+def scatter_variants(table_path, outdir, by="chromosome", chunks=1):
+    """
+    Scatter a variants tsv into `<outdir>/partition_<index>.tsv` files.
+
+    Arguments:
+        table_path (str): Tsv with CHR and START columns.
+        outdir (str): Directory for the partitions.
+        by (str): "chromosome" or "chunks".
+        chunks (int): Number of partitions when splitting by chunks.
+
+    Returns:
+        list: paths to the partitions, in coordinate order. An empty table
+            gives a single partition with its header.
+    """
+    header, rows = read_variants(table_path)
+    partitions = get_partitions(rows, by=by, chunks=chunks) or [[]]
+
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    paths = []
+    for ix, lines in enumerate(partitions):
+        path = Path(outdir) / f"partition_{ix:05d}.tsv"
+        with open(path, "w", encoding="utf-8") as partition:
+            partition.write(header)
+            partition.writelines(lines)
+        paths.append(path)
+    return paths
+
+
+def gather_variants(table_paths, outfile):
+    """
+    Gather the partitions of a scattered tsv in coordinate order.
+
+    Partitions are contiguous coordinate ranges, so they are ordered by their
+    first variant and concatenated without parsing the rest of their rows.
+    Partitions without variants only contribute their header.
+
+    Arguments:
+        table_paths (list): Tsvs of each partition, in any order.
+        outfile (str): Path to the gathered tsv.
+
+    Returns:
+        int: number of partitions with variants.
+    """
+    tables = []
+    for table_path in table_paths:
+        with open_table(table_path) as table:
+            header = table.readline()
+            first = table.readline()
+        if tables and header != tables[0][2]:
+            raise ValueError(f"Header of {table_path} differs from the other partitions.")
+        key = None
+        if first.strip():
+            chrom_ix, start_ix = get_key_columns(header)
+            fields = first.split("\t", max(chrom_ix, start_ix) + 1)
+            key = (get_chrom_key(fields[chrom_ix]), int(fields[start_ix]))
+        tables.append((key, table_path, header))
+    if not tables:
+        raise ValueError("No partitions to gather.")
+
+    tables = sorted((table for table in tables if table[0] is not None), key=lambda t: t[0])
+    Path(outfile).parent.mkdir(parents=True, exist_ok=True)
+    with open(outfile, "w", encoding="utf-8") as gathered:
+        gathered.write(header)
+        for _, table_path, _ in tables:
+            with open_table(table_path) as table:
+                table.readline()
+                shutil.copyfileobj(table, gathered)
+    return len(tables)
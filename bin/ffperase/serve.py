@@ -0,0 +1,235 @@
+"""
+serve.py
+
+Local inference server that keeps trained Random Forest models resident, so
+high-volume classification does not pay for Python start-up, the sklearn
+import and model deserialization on every task.
+
+The server listens on a Unix-domain socket, only accessible by its owner, or
+a localhost port. Each request is a single JSON line followed by a features
+TSV payload:
+
+    {"model_digest": ..., "model_name": ..., "mutation_type": ...,
+     "cascade": ..., "payload_bytes": N}  + N bytes of TSV
+
+Only the models preloaded with `--model` are served, keyed by the sha256
+digest of their file, so a client never gets predictions from a different
+model than the one it asked for, and never makes the server load a file or
+write one. The response is a JSON line, followed by the classified TSV.
+
+Example usage:
+    serve_random_forest.py --server /tmp/ffperase.sock \\
+        --model model.snvs.joblib --model model.indels.joblib
+    classify_w_random_forest.py --server /tmp/ffperase.sock ...
+"""
+from functools import lru_cache
+from io import StringIO
+from os.path import abspath, exists
+import hashlib
+import json
+import os
+import socket
+import socketserver
+import threading
+
+
+class ServerUnavailable(Exception):
+    """Raised when a model server can not be reached or can not classify."""
+
+
+def parse_address(server):
+    """
+    Get the socket family and address of a server.
+
+    Arguments:
+        server (str): Unix socket path, `port` or `localhost:port`.
+
+    Returns:
+        tuple: socket family and address.
+    """
+    port = server.rsplit(":", 1)[-1]
+    if port.isdigit() and (":" in server or server == port):
+        return socket.AF_INET, ("127.0.0.1", int(port))
+    return socket.AF_UNIX, server
+
+
+def get_model_digest(model_path):
+    """Get the sha256 digest of a model file."""
+    digest = hashlib.sha256()
+    with open(model_path, "rb") as model_file:
+        for chunk in iter(lambda: model_file.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@lru_cache(maxsize=None)
+def _get_cached_model_digest(model_path, size, mtime_ns):
+    return get_model_digest(model_path)
+
+
+def get_cached_model_digest(model_path):
+    """
+    Get the sha256 digest of a model file, hashing it only once per process
+    while the file is unchanged.
+    """
+    stat = os.stat(model_path)
+    return _get_cached_model_digest(abspath(model_path), stat.st_size, stat.st_mtime_ns)
+
+
+def read_message(stream):
+    """Read a JSON line and its payload from a binary stream."""
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed before a message was received.")
+    message = json.loads(line.decode("utf-8"))
+    payload = stream.read(message.get("payload_bytes", 0))
+    return message, payload
+
+
+def write_message(stream, message, payload=b""):
+    """Write a JSON line and its payload to a binary stream."""
+    message = dict(message, payload_bytes=len(payload))
+    stream.write(json.dumps(message).encode("utf-8") + b"\n")
+    stream.write(payload)
+    stream.flush()
+
+
+def request_classification(
+    server, model_path, model_name, mutation_type, payload, timeout=3600, cascade=None
+):
+    """
+    Send a features TSV to a model server and get it back classified.
+
+    Arguments:
+        server (str): Unix socket path or localhost port of the server.
+        model_path (str): Path to the trained model (joblib file), which must
+            be preloaded in the server.
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        payload (bytes): Features TSV content.
+        timeout (int): Seconds to wait for the classification.
+        cascade (dict, optional): Options to classify with early exit.
+
+    Returns:
+        bytes: classified TSV content.
+    """
+    family, address = parse_address(server)
+    request = {
+        "model_digest": get_cached_model_digest(model_path),
+        "model_name": model_name,
+        "mutation_type": mutation_type,
+        "cascade": cascade,
+    }
+    try:
+        with socket.socket(family, socket.SOCK_STREAM) as conn:
+            conn.settimeout(timeout)
+            conn.connect(address)
+            with conn.makefile("rwb") as stream:
+                write_message(stream, request, payload)
+                response, payload = read_message(stream)
+    except (OSError, ConnectionError, ValueError) as error:
+        raise ServerUnavailable(f"Model server {server} unavailable: {error}")
+
+    if response["status"] != "ok":
+        raise ServerUnavailable(f"Model server {server} failed: {response['message']}")
+    return payload
+
+
+class ModelCache:
+    """Trained models kept in memory, keyed by the digest of their file."""
+
+    def __init__(self):
+        self.models = {}
+        self.lock = threading.Lock()
+
+    def add(self, model_path):
+        """Load a model and keep it resident."""
+        from .classify import load_model
+
+        digest = get_model_digest(model_path)
+        with self.lock:
+            if digest not in self.models:
+                self.models[digest] = load_model(model_path)
+                print(f"[INFO] Loaded model {model_path} ({digest[:12]})")
+        return digest
+
+    def get(self, digest):
+        """Get a preloaded model by its digest."""
+        if digest not in self.models:
+            raise KeyError(f"Model {digest} is not loaded in this server")
+        return self.models[digest]
+
+
+class ClassifyHandler(socketserver.StreamRequestHandler):
+    """Classify one features table per connection."""
+
+    def handle(self):
+        import pandas as pd
+        from .classify import predict_features
+
+        try:
+            request, payload = read_message(self.rfile)
+            model = self.server.models.get(request["model_digest"])
+            features_df = pd.read_csv(
+                StringIO(payload.decode("utf-8")), sep="\t", low_memory=False
+            )
+            features_df = predict_features(
+                model,
+                features_df,
+                request["model_name"],
+                request["mutation_type"],
+                request.get("cascade"),
+            )
+            payload = features_df.to_csv(sep="\t", index=False).encode("utf-8")
+            response = {"status": "ok", "rows": len(features_df)}
+        except Exception as error:
+            response, payload = {"status": "error", "message": repr(error)}, b""
+        write_message(self.wfile, response, payload)
+
+
+class UnixModelServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class TCPModelServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def serve_random_forest(server, model_paths):
+    """
+    Serve Random Forest classifications until interrupted.
+
+    Arguments:
+        server (str): Unix socket path or localhost port to listen on.
+        model_paths (list): Models to serve, loaded at start-up.
+    """
+    if not model_paths:
+        raise ValueError("At least one model is needed to serve.")
+    family, address = parse_address(server)
+    server_class = TCPModelServer if family == socket.AF_INET else UnixModelServer
+    if family == socket.AF_UNIX and exists(address):
+        os.remove(address)
+
+    models = ModelCache()
+    for model_path in model_paths:
+        models.add(model_path)
+
+    # The Unix socket is created only accessible by its owner
+    umask = os.umask(0o177) if family == socket.AF_UNIX else None
+    try:
+        model_server = server_class(address, ClassifyHandler)
+    finally:
+        if umask is not None:
+            os.umask(umask)
+
+    with model_server:
+        model_server.models = models
+        print(f"[INFO] Serving {len(models.models)} model(s) at {server}")
+        try:
+            model_server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if family == socket.AF_UNIX and exists(address):
+                os.remove(address)
@@ -0,0 +1,153 @@
+"""
+stage_profiler.py
+
+Record the wall time, CPU time, peak RSS and row count of the named stages of
+a script (e.g. read_csv, strand bias, predict, to_csv), and save them as a
+`profile_<script>.json` sidecar next to its outputs.
+
+Profiling is off unless the FFPERASE_PROFILE environment variable is set to
+anything but one of `PROFILE_OFF` (case insensitive), or a script enables it
+(e.g. with `--profile`). When off, `stage` returns a
+shared no-op context, so instrumented code only pays one call per stage.
+Stages should not be nested, so that their times add up to the script time.
+
+Example usage:
+    from ffperase.stage_profiler import profiler
+
+    with profiler.stage("read_csv") as stage:
+        df = pd.read_csv(path, sep="\\t")
+        stage.rows = len(df)
+    profiler.write(outdir)
+"""
+from pathlib import Path
+import json
+import os
+import resource
+import sys
+import time
+
+PROFILE_ENV = "FFPERASE_PROFILE"
+
+# FFPERASE_PROFILE values that keep profiling off, once lower-cased
+PROFILE_OFF = ("", "0", "false", "no", "off")
+
+
+def get_peak_rss_mb():
+    """Get the peak resident memory of the process so far, in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return peak / 1024 ** 2 if sys.platform == "darwin" else peak / 1024
+
+
+class Stage:
+    """Timed stage of a script, recorded when its context exits."""
+
+    def __init__(self, name, rows, stages, origin):
+        self.name = name
+        self.rows = rows
+        self._stages = stages
+        self._origin = origin
+
+    def __enter__(self):
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter()
+        self._stages.append(
+            {
+                "stage": self.name,
+                "start": round(self._wall - self._origin, 6),
+                "wall": round(wall - self._wall, 6),
+                "cpu": round(time.process_time() - self._cpu, 6),
+                "peak_rss_mb": round(get_peak_rss_mb(), 1),
+                "rows": None if self.rows is None else int(self.rows),
+            }
+        )
+        return False
+
+
+class NullStage:
+    """Stage used while profiling is off, it records nothing."""
+
+    rows = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class StageProfiler:
+    """Collects the stages of a script and writes them as a sidecar json."""
+
+    def __init__(self, enabled=None):
+        if enabled is None:
+            enabled = os.environ.get(PROFILE_ENV, "").strip().lower() not in PROFILE_OFF
+        self.enabled = enabled
+        self.stages = []
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+
+    def enable(self, enabled=True):
+        """Turn profiling on, e.g. from a `--profile` flag."""
+        self.enabled = self.enabled or enabled
+
+    def stage(self, name, rows=None):
+        """
+        Time a stage of the script.
+
+        Arguments:
+            name (str): Name of the stage.
+            rows (int, optional): Rows processed, can also be set on the
+                returned stage once known.
+
+        Returns:
+            Stage: context manager recording the stage on exit.
+        """
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(name, rows, self.stages, self._wall)
+
+    def write(self, outdir=".", script=None):
+        """
+        Write the recorded stages to `<outdir>/profile_<script>.json`.
+
+        Arguments:
+            outdir (str): Directory of the script outputs.
+            script (str, optional): Script name, defaults to the running one.
+
+        Returns:
+            Path: path to the sidecar json, or None if profiling is off.
+        """
+        if not self.enabled:
+            return None
+        import socket
+
+        script = script or Path(sys.argv[0]).stem
+        profile = {
+            "script": script,
+            "argv": sys.argv[1:],
+            "host": socket.gethostname(),
+            "pid": os.getpid(),
+            "wall": round(time.perf_counter() - self._wall, 6),
+            "cpu": round(time.process_time() - self._cpu, 6),
+            "peak_rss_mb": round(get_peak_rss_mb(), 1),
+            "stages": self.stages,
+        }
+        outpath = Path(outdir) / f"profile_{script}.json"
+        with open(outpath, "w", encoding="utf-8") as profile_file:
+            json.dump(profile, profile_file, indent=2)
+        print(f"[INFO] Stage profile written to {outpath}")
+        return outpath
+
+
+profiler = StageProfiler()
@@ -0,0 +1,501 @@
+"""
+table.py
+
+Coordinate-sorted variant tables with a block index, shared by the pileup,
+features and classified outputs:
+
+1) The table is a plain tsv sorted by (CHR, START, REF, ALT), chromosomes as
+   1..22, X, Y, M and then the other contigs by name, so every tool that reads
+   a tsv still reads it.
+2) Next to it, `<table>.idx` records for blocks of up to `BLOCK_ROWS` variants
+   of the same chromosome their first and last START, byte offset, size and
+   number of rows.
+3) `VariantTable` finds the blocks of a region or variant with a binary
+   search over the index, and only reads those bytes of the table.
+4) `compress_variant_table` compresses a table with multithreaded bgzip, and
+   indexes it with tabix instead, which `read_region` uses for `.gz` tables.
+
+Rows are indexed and fetched as they were written, so values are not
+reformatted by the index.
+"""
+from bisect import bisect_left
+from collections import namedtuple
+from io import StringIO
+from os.path import exists, getmtime, realpath
+import os
+
+from .scatter import get_chrom_key, get_key_columns, open_table
+
+BLOCK_ROWS = 1000
+
+INDEX_COLUMNS = ["CHR", "FIRST_START", "LAST_START", "OFFSET", "SIZE", "ROWS"]
+
+Block = namedtuple("Block", ["chrom", "first_start", "last_start", "offset", "size", "rows"])
+
+
+def get_index_path(table_path):
+    """Get the path of the block index of a variant table."""
+    return f"{table_path}.idx"
+
+
+def find_index(table_path):
+    """
+    Find an up-to-date block index for a variant table.
+
+    The index is looked up next to the table, and next to the file it links
+    to, so indexes published with a table are found from staged symlinks.
+
+    Returns:
+        str: path to the index, or None if there is none newer than the table.
+    """
+    for path in dict.fromkeys([str(table_path), realpath(str(table_path))]):
+        index_path = get_index_path(path)
+        if exists(index_path) and getmtime(index_path) >= getmtime(path):
+            return index_path
+    return None
+
+
+def find_tabix_index(table_path):
+    """
+    Find the tabix index of a compressed variant table, next to the table or
+    next to the file it links to.
+
+    Returns:
+        str: path to the `.tbi` index, or None if there is none.
+    """
+    for path in dict.fromkeys([str(table_path), realpath(str(table_path))]):
+        if path.endswith(".gz") and exists(f"{path}.tbi"):
+            return f"{path}.tbi"
+    return None
+
+
+def parse_region(region):
+    """
+    Parse a `CHR`, `CHR:POS` or `CHR:START-END` region, 1-based and inclusive.
+
+    Returns:
+        tuple: chromosome, start and end, which are None when not given.
+    """
+    chrom, _, span = region.rpartition(":")
+    if not chrom or not span.replace(",", "").replace("-", "").isdigit():
+        return region, None, None
+    start, _, end = span.replace(",", "").partition("-")
+    start = int(start)
+    end = int(end) if end else start
+    if end < start:
+        raise ValueError(f"Invalid region {region}: end is before start.")
+    return chrom, start, end
+
+
+def get_variant_key(line, key_columns):
+    """Get the sort key of a raw tsv line."""
+    chrom_ix, start_ix, ref_ix, alt_ix = key_columns
+    fields = line.rstrip("\n").split("\t")
+    chrom = fields[chrom_ix]
+    return (get_chrom_key(chrom), int(fields[start_ix]), fields[ref_ix], fields[alt_ix]), chrom
+
+
+def get_sort_columns(header):
+    """Get the index of the CHR, START, REF and ALT columns of a tsv header."""
+    columns = header.rstrip("\n").split("\t")
+    missing = {"REF", "ALT"} - set(columns)
+    if missing:
+        raise ValueError(f"Variants table is missing columns: {missing}")
+    return get_key_columns(header) + (columns.index("REF"), columns.index("ALT"))
+
+
+def index_variant_table(table_path, block_rows=BLOCK_ROWS):
+    """
+    Write the block index of a sorted variant table to `<table>.idx`.
+
+    Arguments:
+        table_path (str): Tsv sorted by (CHR, START, REF, ALT).
+        block_rows (int): Maximum number of variants per block.
+
+    Returns:
+        str: path to the index.
+
+    Raises:
+        ValueError: if the table is not sorted.
+    """
+    blocks = []
+    with open(table_path, "rb") as table:
+        header = table.readline().decode("utf-8")
+        key_columns = get_sort_columns(header)
+        offset = table.tell()
+        previous, block = None, None
+        for ix, raw in enumerate(table, start=2):
+            if not raw.strip():
+                offset += len(raw)
+                continue
+            key, chrom = get_variant_key(raw.decode("utf-8"), key_columns)
+            if previous is not None and key < previous:
+                raise ValueError(f"{table_path} is not sorted at line {ix}.")
+            if block is None or block[0] != chrom or block[5] >= block_rows:
+                block = [chrom, key[1], key[1], offset, 0, 0]
+                blocks.append(block)
+            block[2] = key[1]
+            block[4] += len(raw)
+            block[5] += 1
+            offset += len(raw)
+            previous = key
+
+    index_path = get_index_path(table_path)
+    with open(index_path, "w", encoding="utf-8") as index:
+        index.write("\t".join(INDEX_COLUMNS) + "\n")
+        for block in blocks:
+            index.write("\t".join(str(value) for value in block) + "\n")
+    return index_path
+
+
+def try_index_variant_table(table_path, block_rows=BLOCK_ROWS):
+    """
+    Index a variant table only if it is sorted, e.g. outputs of older inputs.
+
+    Returns:
+        str: path to the index, or None if the table could not be indexed.
+    """
+    try:
+        return index_variant_table(table_path, block_rows=block_rows)
+    except ValueError as error:
+        print(f"[INFO] Not indexing {table_path}: {error}")
+        return None
+
+
+def sort_variant_table(table_path, outfile=None, block_rows=BLOCK_ROWS):
+    """
+    Sort the rows of a variant tsv as they are and index it.
+
+    Arguments:
+        table_path (str): Tsv with CHR, START, REF and ALT columns.
+        outfile (str, optional): Path to the sorted tsv, defaults to sorting
+            the table in place.
+        block_rows (int): Maximum number of variants per block.
+
+    Returns:
+        str: path to the index.
+    """
+    with open(table_path, "r", encoding="utf-8") as table:
+        header = table.readline()
+        key_columns = get_sort_columns(header)
+        rows = []
+        for line in table:
+            if not line.strip():
+                continue
+            if not line.endswith("\n"):
+                line += "\n"
+            rows.append((get_variant_key(line, key_columns)[0], line))
+
+    # Sorting is stable, so duplicated variants keep their order
+    rows.sort(key=lambda row: row[0])
+    outfile = outfile or table_path
+    with open(outfile, "w", encoding="utf-8") as table:
+        table.write(header)
+        table.writelines(line for _, line in rows)
+    return index_variant_table(outfile, block_rows=block_rows)
+
+
+def sort_variants(df):
+    """
+    Sort a dataframe of variants by (CHR, START, REF, ALT), keeping the order
+    of duplicated variants.
+
+    Arguments:
+        df (pd.DataFrame): Variants with CHR, START, REF and ALT columns.
+
+    Returns:
+        pd.DataFrame: the sorted variants.
+    """
+    import numpy as np
+    import pandas as pd
+
+    chroms = df["CHR"].astype(str)
+    chrom_order = {
+        chrom: rank
+        for rank, chrom in enumerate(sorted(chroms.unique(), key=get_chrom_key))
+    }
+    # lexsort is stable and sorts by the last key first
+    order = np.lexsort(
+        (
+            pd.factorize(df["ALT"].astype(str), sort=True)[0],
+            pd.factorize(df["REF"].astype(str), sort=True)[0],
+            df["START"].to_numpy(),
+            chroms.map(chrom_order).to_numpy(),
+        )
+    )
+    return df.iloc[order]
+
+
+def write_variant_table(df, table_path, block_rows=BLOCK_ROWS, **to_csv_kwargs):
+    """
+    Write a dataframe of variants as a sorted and indexed tsv.
+
+    Arguments:
+        df (pd.DataFrame): Variants with CHR, START, REF and ALT columns.
+        table_path (str): Path to the tsv.
+        block_rows (int): Maximum number of variants per block.
+        **to_csv_kwargs: Options for `pd.DataFrame.to_csv`.
+
+    Returns:
+        pd.DataFrame: the variants in the order they were written.
+    """
+    df = sort_variants(df)
+    df.to_csv(table_path, sep="\t", index=False, **to_csv_kwargs)
+    index_variant_table(table_path, block_rows=block_rows)
+    return df
+
+
+def compress_variant_table(table_path, threads=1, strict=False):
+    """
+    Compress a variant table with bgzip and index it with tabix, replacing the
+    table and its block index.
+
+    The table is compressed with `bgzip --threads` when it is installed, and
+    otherwise with pysam in a single thread. Tables that are not sorted are
+    compressed but not indexed, unless `strict`.
+
+    Arguments:
+        table_path (str): Variant tsv.
+        threads (int): Number of bgzip compression threads.
+        strict (bool): Raise if the compressed table can not be indexed, for
+            tables that are always sorted.
+
+    Returns:
+        str: path to the compressed table.
+
+    Raises:
+        OSError: if `strict` and tabix fails to index the table.
+    """
+    import shutil
+    import subprocess
+
+    import pysam
+
+    table_path = str(table_path)
+    with open(table_path, "r", encoding="utf-8") as table:
+        chrom_ix, start_ix = get_key_columns(table.readline())
+
+    compressed_path = f"{table_path}.gz"
+    if shutil.which("bgzip"):
+        subprocess.run(
+            ["bgzip", "--force", "--threads", str(threads), table_path], check=True
+        )
+    else:
+        pysam.tabix_compress(table_path, compressed_path, force=True)
+        os.remove(table_path)
+    if exists(get_index_path(table_path)):
+        os.remove(get_index_path(table_path))
+
+    try:
+        pysam.tabix_index(
+            compressed_path,
+            seq_col=chrom_ix,
+            start_col=start_ix,
+            end_col=start_ix,
+            line_skip=1,
+            force=True,
+        )
+    except OSError as error:
+        if strict:
+            raise
+        print(f"[INFO] Not indexing {compressed_path}: {error}")
+    return compressed_path
+
+
+class VariantTable:
+    """
+    Sorted variant tsv with a block index, for region and variant lookups.
+
+    Args:
+        table_path (str): Sorted variant tsv.
+        index_path (str, optional): Block index, defaults to `find_index`.
+    """
+
+    def __init__(self, table_path, index_path=None):
+        self.path = str(table_path)
+        self.index_path = index_path or find_index(self.path)
+        if self.index_path is None:
+            raise FileNotFoundError(f"No up-to-date index found for {self.path}")
+
+        with open(self.path, "r", encoding="utf-8") as table:
+            self.header = table.readline()
+        self.columns = self.header.rstrip("\n").split("\t")
+
+        self.blocks = []
+        with open(self.index_path, "r", encoding="utf-8") as index:
+            if index.readline().rstrip("\n").split("\t") != INDEX_COLUMNS:
+                raise ValueError(f"Invalid variant table index: {self.index_path}")
+            for line in index:
+                chrom, *values = line.rstrip("\n").split("\t")
+                self.blocks.append(Block(chrom, *map(int, values)))
+
+        # Blocks of each chromosome are contiguous, search them by LAST_START
+        self._chroms = {}
+        for ix, block in enumerate(self.blocks):
+            first, _ = self._chroms.get(block.chrom, (ix, ix))
+            self._chroms[block.chrom] = (first, ix + 1)
+        self._last_starts = [block.last_start for block in self.blocks]
+
+    def __len__(self):
+        return sum(block.rows for block in self.blocks)
+
+    @property
+    def chromosomes(self):
+        """Chromosomes of the table, in their sorted order."""
+        return list(self._chroms)
+
+    def get_blocks(self, chrom=None, start=None, end=None):
+        """
+        Get the blocks that may have variants with START within a region.
+
+        Arguments:
+            chrom (str, optional): Chromosome, all blocks if not given.
+            start (int, optional): First position, 1-based.
+            end (int, optional): Last position, inclusive.
+
+        Returns:
+            list: index blocks, in table order.
+        """
+        if chrom is None:
+            return list(self.blocks)
+        first, last = self._chroms.get(str(chrom), (0, 0))
+        if start is not None:
+            first = bisect_left(self._last_starts, start, first, last)
+        blocks = []
+        for block in self.blocks[first:last]:
+            if end is not None and block.first_start > end:
+                break
+            blocks.append(block)
+        return blocks
+
+    def _read_block(self, table, block, start=None, end=None):
+        """Read the raw lines of a block with START within [start, end]."""
+        start_ix = self.columns.index("START")
+        table.seek(block.offset)
+        lines = []
+        for line in table.read(block.size).decode("utf-8").splitlines(True):
+            if not line.strip():
+                continue
+            if start is not None or end is not None:
+                position = int(line.split("\t", start_ix + 1)[start_ix])
+                if (start is not None and position < start) or (
+                    end is not None and position > end
+                ):
+                    continue
+            lines.append(line)
+        return lines
+
+    def _parse_lines(self, lines, **read_csv_kwargs):
+        """Parse raw lines of the table into a dataframe."""
+        import pandas as pd
+
+        read_csv_kwargs.setdefault("low_memory", False)
+        text = self.header + "".join(lines)
+        return pd.read_csv(StringIO(text), sep="\t", **read_csv_kwargs)
+
+    def iter_lines(self, chrom=None, start=None, end=None):
+        """
+        Iterate over the raw lines of the variants with START within a region.
+
+        Arguments:
+            chrom (str, optional): Chromosome, all variants if not given.
+            start (int, optional): First position, 1-based.
+            end (int, optional): Last position, inclusive.
+
+        Yields:
+            str: tsv lines, in table order.
+        """
+        with open(self.path, "rb") as table:
+            for block in self.get_blocks(chrom, start, end):
+                for line in self._read_block(table, block, start, end):
+                    yield line
+
+    def iter_blocks(self, chrom=None, start=None, end=None, **read_csv_kwargs):
+        """
+        Iterate over the variants with START within a region, block by block.
+
+        Yields:
+            pd.DataFrame: variants of each block with any in the region.
+        """
+        with open(self.path, "rb") as table:
+            for block in self.get_blocks(chrom, start, end):
+                lines = self._read_block(table, block, start, end)
+                if lines:
+                    yield self._parse_lines(lines, **read_csv_kwargs)
+
+    def fetch(self, chrom=None, start=None, end=None, **read_csv_kwargs):
+        """
+        Read the variants with START within a region.
+
+        Arguments:
+            chrom (str, optional): Chromosome or region string, e.g.
+                `9:10000-20000`. All variants if not given.
+            start (int, optional): First position, 1-based.
+            end (int, optional): Last position, inclusive.
+            **read_csv_kwargs: Options for `pd.read_csv`.
+
+        Returns:
+            pd.DataFrame: variants of the region, in table order.
+        """
+        if chrom is not None and start is None and end is None:
+            chrom, start, end = parse_region(str(chrom))
+        lines = list(self.iter_lines(chrom, start, end))
+        return self._parse_lines(lines, **read_csv_kwargs)
+
+    def get(self, chrom, start, ref, alt, **read_csv_kwargs):
+        """
+        Read a variant by its (CHR, START, REF, ALT) key.
+
+        Returns:
+            pd.Series: first row of the variant, or None if it is not found.
+        """
+        chrom_ix, start_ix, ref_ix, alt_ix = get_sort_columns(self.header)
+        key = (str(chrom), str(start), str(ref), str(alt))
+        for line in self.iter_lines(str(chrom), int(start), int(start)):
+            fields = line.rstrip("\n").split("\t")
+            if (fields[chrom_ix], fields[start_ix], fields[ref_ix], fields[alt_ix]) == key:
+                return self._parse_lines([line], **read_csv_kwargs).iloc[0]
+        return None
+
+
+def read_region(table_path, region):
+    """
+    Read the header and raw lines of the variants within a region.
+
+    Uses the block index of the table when there is an up-to-date one, or the
+    tabix index of a compressed table, and otherwise scans the table.
+
+    Arguments:
+        table_path (str): Variant tsv, optionally compressed.
+        region (str): `CHR`, `CHR:POS` or `CHR:START-END` region.
+
+    Returns:
+        str: tsv content of the region.
+    """
+    chrom, start, end = parse_region(region)
+    if find_index(table_path):
+        table = VariantTable(table_path)
+        return table.header + "".join(table.iter_lines(chrom, start, end))
+
+    with open_table(table_path) as table:
+        header = table.readline()
+        tabix_index = find_tabix_index(table_path)
+        if tabix_index:
+            import pysam
+
+            with pysam.TabixFile(str(table_path), index=tabix_index) as tabix:
+                if chrom not in tabix.contigs:
+                    return header
+                start = None if start is None else start - 1
+                return header + "".join(f"{line}\n" for line in tabix.fetch(chrom, start, end))
+
+        chrom_ix, start_ix = get_key_columns(header)
+        lines = [header]
+        for line in table:
+            fields = line.split("\t", max(chrom_ix, start_ix) + 1)
+            if not line.strip() or fields[chrom_ix] != chrom:
+                continue
+            position = int(fields[start_ix])
+            if (start is None or position >= start) and (end is None or position <= end):
+                lines.append(line if line.endswith("\n") else line + "\n")
+    return "".join(lines)
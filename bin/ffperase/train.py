@@ -0,0 +1,518 @@
+"""
+train.py
+
+Train the FFPE artifact Random Forest models:
+
+1) Fit a balanced Random Forest on labelled features, in memory
+   (`fit_random_forest`), streamed into an on-disk design matrix
+   (`fit_out_of_core`), or on top of a pretrained model whose
+   preprocessing is kept frozen.
+2) Save the model, gzipped or uncompressed to be memory-mapped.
+3) Check the categories of new batches and prune the oldest trees of
+   incrementally trained models.
+4) Cross-validate a grid of parameters (`search_random_forest`).
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import product
+from pathlib import Path
+import pickle
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from .stage_profiler import profiler
+
+# joblib, scipy, sklearn and imblearn are imported by the functions that use
+# them, so that scripts importing the feature columns or save_model start fast.
+
+NUMERICAL_COL = [
+    "VAF",
+    "DEPTH",
+    "LOG_DEPTH_RATIO",
+    "AVG_MQ",
+    "AVG_ALT_MQ",
+    "AVG_ALT_MATE_MQ",
+    "LOG_IS_RATIO",
+    "LOG_ALT_IS_RATIO",
+    "AVG_EDIT_DIST",
+    "AVG_READ_BAL",
+    "VARIANT_READS",
+    "STRAND_BIAS",
+]
+SNV_NUMERICAL_COL = [
+    "VARIANT_ALLELES",
+    "PA_BASE_CHANGE_ERROR",
+    "PA_TRINUCLEO_ERROR",
+    "BB_BASE_CHANGE_ERROR",
+    "BB_TRINUCLEO_ERROR",
+]
+INDEL_NUMERICAL_COL = [
+    "INDEL_LENGTH",
+    "MHCOUNT",
+    "REPCOUNT",
+    "INDEL_COUNT",
+]
+CATEGORICAL_COL = [
+    "5_BASE",
+    "3_BASE",
+]
+SNV_CATEGORICAL_COL = [
+    "REF",
+    "ALT",
+]
+INDEL_CATEGORICAL_COL = [
+    "INDEL_TYPE",
+    "CLASSIFICATION",
+]
+SEARCH_GRID = {
+    "n_estimators": [50, 100, 200],
+    "max_depth": [None, 10, 20],
+    "max_features": ["sqrt", 0.5],
+    "sampling_strategy": ["all", "majority"],
+}
+
+
+def get_feature_columns(mutation_type):
+    """Get the categorical and numerical model inputs for a mutation type."""
+    if mutation_type == "snvs":
+        categorical_columns = CATEGORICAL_COL + SNV_CATEGORICAL_COL
+        numerical_columns = NUMERICAL_COL + SNV_NUMERICAL_COL
+    else:
+        categorical_columns = CATEGORICAL_COL + INDEL_CATEGORICAL_COL
+        numerical_columns = NUMERICAL_COL + INDEL_NUMERICAL_COL
+    return categorical_columns, numerical_columns
+
+
+def get_preprocessing(categorical_columns, numerical_columns, categories="auto"):
+    from sklearn.compose import ColumnTransformer
+    from sklearn.impute import SimpleImputer
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    categorical_encoder = OneHotEncoder(handle_unknown="ignore", categories=categories)
+    numerical_pipe = Pipeline([
+        ("imputer", SimpleImputer(strategy="mean"))
+    ])
+    
+    preprocessing = ColumnTransformer(
+        [("cat", categorical_encoder, categorical_columns),
+         ("num", numerical_pipe, numerical_columns)])
+
+    return preprocessing
+
+
+def get_brfc(categorical_columns, numerical_columns, n_jobs=None):
+    from imblearn.ensemble import BalancedRandomForestClassifier
+    from sklearn.pipeline import Pipeline
+
+    preprocessing = get_preprocessing(categorical_columns, numerical_columns)
+    
+    brfc = Pipeline([
+        ("preprocess", preprocessing),
+        ("classifier", BalancedRandomForestClassifier(
+            random_state=42, n_estimators=100, n_jobs=n_jobs
+        ))
+    ])
+    
+    return brfc
+
+
+def save_model(model, outpath, compress=True):
+    """
+    Saves a trained model.
+
+    Args:
+        model (Pipeline): Trained model.
+        outpath (str): Path to the output joblib file.
+        compress (bool): Gzip the model. Uncompressed models are larger, but
+            can be memory-mapped when loaded for classification.
+
+    Returns:
+        None
+    """
+    import joblib
+
+    if compress:
+        joblib.dump(model, open(outpath, "wb"), compress=("gzip", 3))
+    else:
+        joblib.dump(model, str(outpath))
+
+
+def read_features(features_paths, columns=None):
+    """Read and concatenate one or more tsvs with preprocessed features."""
+    return pd.concat(
+        [
+            pd.read_csv(features_path, sep="\t", low_memory=False, usecols=columns)
+            for features_path in features_paths
+        ],
+        ignore_index=True,
+    )
+
+
+def fit_out_of_core(
+    brfc, features_paths, label_col, categorical_columns, numerical_columns,
+    workdir, chunksize=100000,
+):
+    """
+    Fits a model streaming the features into an on-disk design matrix.
+
+    A first pass over the features collects the categories and the column
+    means needed by the preprocessing. A second pass transforms each chunk
+    into a float32 memmap, so only one chunk of features is in memory at a
+    time. If the preprocessing of `brfc` is already fitted, as for pretrained
+    models, it is kept frozen and the first pass is skipped.
+
+    Args:
+        brfc (Pipeline): Model to fit.
+        features_paths (list): Paths to tsvs with preprocessed features.
+        label_col (str): Name of column with artifact labels.
+        categorical_columns (list): Categorical model inputs.
+        numerical_columns (list): Numerical model inputs.
+        workdir (str): Directory for the design matrix memmap.
+        chunksize (int): Number of features rows to read at a time.
+
+    Returns:
+        tuple: fitted model, design matrix and targets.
+    """
+    from scipy import sparse
+    from sklearn.pipeline import Pipeline
+
+    columns = categorical_columns + numerical_columns + [label_col]
+
+    def read_chunks():
+        for features_path in features_paths:
+            yield from pd.read_csv(
+                features_path,
+                sep="\t",
+                usecols=columns,
+                chunksize=chunksize,
+                low_memory=False,
+            )
+
+    preprocessing = brfc.named_steps["preprocess"]
+    if hasattr(preprocessing, "transformers_"):
+        n_rows = sum(len(chunk) for chunk in read_chunks())
+    else:
+        # 1) Collect categories and column means
+        n_rows = 0
+        categories = {col: set() for col in categorical_columns}
+        sums = pd.Series(0.0, index=numerical_columns)
+        counts = pd.Series(0, index=numerical_columns)
+        for chunk in read_chunks():
+            n_rows += len(chunk)
+            for col in categorical_columns:
+                categories[col].update(chunk[col].unique())
+            sums += chunk[numerical_columns].sum()
+            counts += chunk[numerical_columns].count()
+
+        # Sort as OneHotEncoder does, with missing values last
+        categories = [
+            sorted(v for v in categories[col] if not pd.isnull(v))
+            + [np.nan] * any(pd.isnull(v) for v in categories[col])
+            for col in categorical_columns
+        ]
+
+        # Fitting on a single row of the means gives the full data imputation
+        preprocessing = get_preprocessing(
+            categorical_columns, numerical_columns, categories=categories
+        )
+        summary = pd.DataFrame([sums / counts.replace(0, np.nan)])
+        for col, col_categories in zip(categorical_columns, categories):
+            summary[col] = col_categories[0] if col_categories else np.nan
+        preprocessing.fit(summary)
+
+    # 2) Stream the transformed features into an on-disk design matrix
+    n_cols = preprocessing.transform(next(read_chunks())[:1]).shape[1]
+    design = np.lib.format.open_memmap(
+        Path(workdir) / "design_matrix.npy",
+        mode="w+",
+        dtype=np.float32,
+        shape=(n_rows, n_cols),
+    )
+    targets = np.empty(n_rows, dtype=np.int8)
+    start = 0
+    for chunk in read_chunks():
+        end = start + len(chunk)
+        transformed = preprocessing.transform(chunk)
+        if sparse.issparse(transformed):
+            transformed = transformed.toarray()
+        design[start:end] = transformed
+        targets[start:end] = chunk[label_col].astype(int)
+        start = end
+    design.flush()
+
+    classifier = brfc.named_steps["classifier"]
+    classifier.fit(design, targets)
+    brfc = Pipeline([("preprocess", preprocessing), ("classifier", classifier)])
+    return brfc, design, targets
+
+
+def fit_random_forest(features, label_col, mutation_type, brfc=None, threads=1):
+    """
+    Fits a model on a dataframe of labelled features.
+
+    Args:
+        features (pd.DataFrame): Preprocessed features with artifact labels.
+        label_col (str): Name of column with artifact labels.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        brfc (Pipeline, optional): Model to fit, e.g. a pretrained model set
+            to warm start, defaults to a new one. A fitted preprocessing is
+            kept frozen, as the pretrained trees were fitted on its outputs.
+        threads (int): Number of trees to train in parallel.
+
+    Returns:
+        tuple: fitted model and train accuracy.
+    """
+    categorical_columns, numerical_columns = get_feature_columns(mutation_type)
+    if brfc is None:
+        brfc = get_brfc(categorical_columns, numerical_columns)
+    brfc.named_steps["classifier"].set_params(n_jobs=threads)
+
+    inputs = features[numerical_columns + categorical_columns]
+    targets = features[label_col].astype(int)
+    preprocessing = brfc.named_steps["preprocess"]
+    with profiler.stage("fit", rows=len(features)):
+        if hasattr(preprocessing, "transformers_"):
+            brfc.named_steps["classifier"].fit(preprocessing.transform(inputs), targets)
+        else:
+            brfc.fit(inputs, targets)
+    with profiler.stage("score", rows=len(features)):
+        accuracy = brfc.score(inputs, targets)
+    return brfc, accuracy
+
+
+def check_categories(model, features, categorical_columns):
+    """
+    Check a batch has no categories unseen by the frozen OneHotEncoder.
+
+    Arguments:
+        model (Pipeline): Trained model.
+        features (pd.DataFrame): Batch of preprocessed features.
+        categorical_columns (list): Categorical model inputs.
+    """
+    encoder = model.named_steps["preprocess"].named_transformers_["cat"]
+    unseen = {}
+    for col, categories in zip(categorical_columns, encoder.categories_):
+        values = set(features[col].dropna().unique()) - set(categories)
+        if values:
+            unseen[col] = sorted(values)
+    if unseen:
+        raise ValueError(f"Batch has categories unseen by the model: {unseen}")
+
+
+def prune_oldest_trees(classifier, n_trees):
+    """Remove the oldest `n_trees` trees from a fitted forest."""
+    for attr in ["estimators_", "samplers_", "pipelines_"]:
+        if hasattr(classifier, attr):
+            setattr(classifier, attr, getattr(classifier, attr)[n_trees:])
+    classifier.set_params(n_estimators=len(classifier.estimators_))
+
+
+def train_random_forest(
+    features_path,
+    label_col,
+    model_name,
+    pretrained_model,
+    mutation_type,
+    outdir,
+    compress=True,
+    threads=1,
+    out_of_core=False,
+    chunksize=100000,
+):
+    """
+    Trains a Random Forest model.
+
+    Args:
+        features_path (str or list): Path(s) to tsv with preprocessed features.
+        label_col (str): Name of column with artifact labels.
+        model_name (str): Name of the model for labeling outputs.
+        model_path (str): Path to the trained model (joblib file).
+        outdir (str): Directory to save the output files.
+        compress (bool): Gzip the model, set False to allow memory-mapping it.
+        threads (int): Number of trees to train in parallel.
+        out_of_core (bool): Stream features into an on-disk design matrix.
+        chunksize (int): Number of features rows to read at a time when
+            training out of core.
+
+    Returns:
+        None
+    """
+    # Ensure output directory exists
+    train_dir = Path(outdir) / "train"
+    train_dir.mkdir(parents=True, exist_ok=True)
+
+    features_paths = [features_path] if isinstance(features_path, str) else features_path
+    categorical_columns, numerical_columns = get_feature_columns(mutation_type)
+    
+    brfc = None
+    if pretrained_model:
+        import joblib
+
+        # load pretrained model and train with double the estimators
+        brfc = joblib.load(open(pretrained_model, 'rb'))
+        n_estimators = brfc.named_steps['classifier'].n_estimators
+        brfc.named_steps['classifier'].set_params(warm_start=True, n_estimators=n_estimators*2)
+    else:
+        brfc = get_brfc(categorical_columns, numerical_columns)
+    brfc.named_steps["classifier"].set_params(n_jobs=threads)
+
+    if out_of_core:
+        with profiler.stage("fit_out_of_core") as stage:
+            brfc, design, targets = fit_out_of_core(
+                brfc,
+                features_paths,
+                label_col,
+                categorical_columns,
+                numerical_columns,
+                workdir=train_dir,
+                chunksize=chunksize,
+            )
+            stage.rows = len(targets)
+        with profiler.stage("score", rows=len(targets)):
+            accuracy = brfc.named_steps["classifier"].score(design, targets)
+        del design
+        (train_dir / "design_matrix.npy").unlink()
+    else:
+        with profiler.stage("read_features") as stage:
+            features = read_features(features_paths)
+            stage.rows = len(features)
+        brfc, accuracy = fit_random_forest(
+            features, label_col, mutation_type, brfc=brfc, threads=threads
+        )
+    
+    print("Train accuracy: %0.3f" % accuracy)
+    print("n_estimators: %i" % brfc.named_steps["classifier"].n_estimators)
+
+    outpath = Path(train_dir) / f"model_{model_name}.joblib"
+    with profiler.stage("save_model"):
+        save_model(brfc, outpath, compress=compress)
+
+
+def evaluate_candidate(cache_dir, fold, params):
+    """
+    Fits and evaluates one grid candidate on a cached cross-validation fold.
+
+    Args:
+        cache_dir (str): Directory with the transformed fold matrices.
+        fold (int): Index of the fold to evaluate.
+        params (dict): BalancedRandomForestClassifier parameters.
+
+    Returns:
+        dict: AUC, fit time, predict latency and model size of the candidate.
+    """
+    from imblearn.ensemble import BalancedRandomForestClassifier
+    from sklearn.metrics import roc_auc_score
+
+    def load(name):
+        return np.load(Path(cache_dir) / f"fold{fold}_{name}.npy", mmap_mode="r")
+
+    classifier = BalancedRandomForestClassifier(random_state=42, n_jobs=1, **params)
+
+    start = time.perf_counter()
+    classifier.fit(load("X_train"), load("y_train"))
+    fit_time = time.perf_counter() - start
+
+    x_test = load("X_test")
+    start = time.perf_counter()
+    raw_scores = classifier.predict_proba(x_test)[:, 1]
+    predict_time = time.perf_counter() - start
+
+    return {
+        "fold": fold,
+        "auc": roc_auc_score(load("y_test"), raw_scores),
+        "fit_seconds": fit_time,
+        "predict_us_per_variant": 1e6 * predict_time / len(x_test),
+        "model_mb": len(pickle.dumps(classifier)) / 1e6,
+    }
+
+
+def search_random_forest(
+    features_path, label_col, model_name, mutation_type, outdir,
+    grid=None, folds=5, threads=1,
+):
+    """
+    Cross-validates a grid of Random Forest parameters.
+
+    The preprocessing is fitted once per stratified fold and the transformed
+    matrices are cached on disk, so every candidate only fits the classifier.
+    Folds and candidates are evaluated in a process pool.
+
+    Args:
+        features_path (str or list): Path(s) to tsv with preprocessed features.
+        label_col (str): Name of column with artifact labels.
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        outdir (str): Directory to save the output files.
+        grid (dict, optional): Lists of parameters to search, defaults to
+            SEARCH_GRID.
+        folds (int): Number of cross-validation folds.
+        threads (int): Number of fits to run in parallel.
+
+    Returns:
+        pd.DataFrame: cross-validation summary per candidate.
+    """
+    from scipy import sparse
+    from sklearn.model_selection import StratifiedKFold
+
+    train_dir = Path(outdir) / "train"
+    cache_dir = train_dir / f"search_{model_name}_cache"
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    features_paths = [features_path] if isinstance(features_path, str) else features_path
+    categorical_columns, numerical_columns = get_feature_columns(mutation_type)
+    features = read_features(features_paths)
+    targets = features[label_col].astype(int).to_numpy()
+    features = features[numerical_columns + categorical_columns]
+
+    # Cache the transformed design matrix of each fold
+    splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+    for fold, (train_ix, test_ix) in enumerate(splitter.split(features, targets)):
+        preprocessing = get_preprocessing(categorical_columns, numerical_columns)
+        x_train = preprocessing.fit_transform(features.iloc[train_ix])
+        x_test = preprocessing.transform(features.iloc[test_ix])
+        for name, array in [
+            ("X_train", x_train), ("X_test", x_test),
+            ("y_train", targets[train_ix]), ("y_test", targets[test_ix]),
+        ]:
+            if sparse.issparse(array):
+                array = array.toarray()
+            dtype = np.float32 if name.startswith("X") else np.int8
+            np.save(cache_dir / f"fold{fold}_{name}.npy", np.asarray(array, dtype=dtype))
+
+    grid = grid or SEARCH_GRID
+    candidates = [dict(zip(grid, values)) for values in product(*grid.values())]
+    with ProcessPoolExecutor(max_workers=threads) as executor:
+        futures = {
+            executor.submit(evaluate_candidate, cache_dir, fold, params): ix
+            for ix, params in enumerate(candidates)
+            for fold in range(folds)
+        }
+        results = [
+            dict(candidates[futures[future]], candidate=futures[future], **future.result())
+            for future in as_completed(futures)
+        ]
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    results = pd.DataFrame(results)
+    summary = (
+        results.groupby("candidate")
+        .agg(
+            auc=("auc", "mean"),
+            auc_std=("auc", "std"),
+            fit_seconds=("fit_seconds", "mean"),
+            predict_us_per_variant=("predict_us_per_variant", "mean"),
+            model_mb=("model_mb", "mean"),
+        )
+        .join(pd.DataFrame([{k: str(v) for k, v in c.items()} for c in candidates]))
+        .sort_values("auc", ascending=False)
+    )
+    summary = summary[list(grid) + [c for c in summary.columns if c not in grid]]
+
+    outpath = train_dir / f"search_{model_name}.tsv"
+    summary.to_csv(outpath, sep="\t", index=False, float_format="%.6f")
+    print(summary.head(10).to_string(index=False, float_format="{:.2f}".format))
+    print(f"Search results saved at: {outpath}")
+    return summary
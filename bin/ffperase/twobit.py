@@ -0,0 +1,313 @@
+"""
+twobit.py
+
+Pack a reference fasta once into the UCSC .2bit format, and fetch from it
+memory-mapped, so the tasks of a host share it through the page cache:
+
+1) `write_twobit` packs each contig at 4 bases per byte (T, C, A, G), with the
+   runs of Ns and of soft-masked (lowercase) bases as blocks. Other IUPAC
+   codes are stored as N, as UCSC faToTwoBit does.
+2) `TwoBitFile` maps the file and slices the packed bases straight from
+   memory, without a read per lookup. It has the `references`, `lengths`
+   and `fetch` of a pysam FastaFile, so it can be used in its place.
+
+The files can also be read by UCSC twoBitToFa and other .2bit readers.
+"""
+from array import array
+from bisect import bisect_right
+import gzip
+import mmap
+import struct
+import sys
+
+TWOBIT_SIGNATURE = 0x1A412743
+
+# Bases of each packed byte, the first base in the most significant bits
+BYTE_BASES = [
+    "".join("TCAG"[(byte >> shift) & 3] for shift in (6, 4, 2, 0)) for byte in range(256)
+]
+
+
+def read_fasta(fasta_path):
+    """
+    Read the contigs of a fasta, optionally gzipped, one at a time.
+
+    Yields:
+        tuple: contig name and sequence bytes.
+    """
+    opener = gzip.open if str(fasta_path).endswith(".gz") else open
+    name, lines = None, []
+    with opener(fasta_path, "rb") as fasta:
+        for line in fasta:
+            if line.startswith(b">"):
+                if name is not None:
+                    yield name, b"".join(lines)
+                name, lines = line[1:].split()[0].decode("utf-8"), []
+            else:
+                lines.append(line.strip())
+    if name is not None:
+        yield name, b"".join(lines)
+
+
+def get_runs(mask):
+    """Get the starts and sizes of the runs of True in a boolean array."""
+    import numpy as np
+
+    edges = np.diff(np.concatenate([[0], mask.view(np.int8), [0]]))
+    starts = np.flatnonzero(edges == 1)
+    return starts, np.flatnonzero(edges == -1) - starts
+
+
+def pack_sequence(sequence):
+    """
+    Pack a contig sequence into a .2bit record.
+
+    Arguments:
+        sequence (bytes): Contig bases.
+
+    Returns:
+        tuple: record bytes, and number of IUPAC bases stored as N.
+    """
+    import numpy as np
+
+    bases = np.frombuffer(sequence, dtype=np.uint8)
+    upper = bases & 0xDF
+
+    codes = np.zeros(256, dtype=np.uint8)
+    for code, base in enumerate(b"TCAG"):
+        codes[base] = code
+    is_acgt = np.zeros(256, dtype=bool)
+    is_acgt[list(b"TCAG")] = True
+
+    n_mask = ~is_acgt[upper]
+    n_starts, n_sizes = get_runs(n_mask)
+    mask_starts, mask_sizes = get_runs(bases >= ord("a"))
+    n_iupac = int(np.count_nonzero(n_mask & (upper != ord("N"))))
+
+    packed = codes[upper]
+    packed[n_mask] = 0
+    packed = np.concatenate([packed, np.zeros(-len(packed) % 4, dtype=np.uint8)])
+    packed = packed.reshape(-1, 4)
+    packed = (packed[:, 0] << 6) | (packed[:, 1] << 4) | (packed[:, 2] << 2) | packed[:, 3]
+
+    record = b"".join(
+        [
+            struct.pack("<II", len(bases), len(n_starts)),
+            n_starts.astype("<u4").tobytes(),
+            n_sizes.astype("<u4").tobytes(),
+            struct.pack("<I", len(mask_starts)),
+            mask_starts.astype("<u4").tobytes(),
+            mask_sizes.astype("<u4").tobytes(),
+            struct.pack("<I", 0),
+            packed.astype(np.uint8).tobytes(),
+        ]
+    )
+    return record, n_iupac
+
+
+def write_twobit(fasta_path, twobit_path):
+    """
+    Pack a reference fasta into a .2bit file.
+
+    Records are packed one contig at a time into a temporary file, and then
+    written after the index, which needs their sizes.
+
+    Arguments:
+        fasta_path (str): Reference fasta, optionally gzipped.
+        twobit_path (str): Path to the .2bit file.
+
+    Returns:
+        dict: length of each contig, in the fasta order.
+    """
+    from os.path import abspath, dirname
+    import shutil
+    import tempfile
+
+    lengths, record_sizes, n_iupac = {}, [], 0
+    with tempfile.TemporaryFile(dir=dirname(abspath(twobit_path))) as records:
+        for name, sequence in read_fasta(fasta_path):
+            if name in lengths:
+                raise ValueError(f"Contig {name} is repeated in {fasta_path}")
+            if len(name.encode("utf-8")) > 255:
+                raise ValueError(f"Contig name {name} is longer than 255 bytes.")
+            record, n_contig_iupac = pack_sequence(sequence)
+            records.write(record)
+            lengths[name] = len(sequence)
+            record_sizes.append(len(record))
+            n_iupac += n_contig_iupac
+
+        names = [name.encode("utf-8") for name in lengths]
+        index_size = sum(1 + len(name) for name in names)
+        # Version 1 has 64-bit offsets, for files over 4 GB
+        version = 0 if 16 + index_size + 4 * len(names) + sum(record_sizes) < 2 ** 32 else 1
+        offset_format = "<I" if version == 0 else "<Q"
+        offset = 16 + index_size + struct.calcsize(offset_format) * len(names)
+
+        with open(twobit_path, "wb") as twobit:
+            twobit.write(struct.pack("<IIII", TWOBIT_SIGNATURE, version, len(names), 0))
+            for name, record_size in zip(names, record_sizes):
+                twobit.write(struct.pack("<B", len(name)) + name)
+                twobit.write(struct.pack(offset_format, offset))
+                offset += record_size
+            records.seek(0)
+            shutil.copyfileobj(records, twobit)
+
+    if n_iupac:
+        print(f"[WARNING] {n_iupac} IUPAC bases other than N were stored as N.")
+    return lengths
+
+
+class TwoBitFile:
+    """
+    Memory-mapped .2bit reference, with the fetch API of a pysam FastaFile.
+
+    Args:
+        filename (str): Path to the .2bit file.
+    """
+
+    def __init__(self, filename):
+        self.filename = str(filename)
+        with open(self.filename, "rb") as twobit:
+            self._mmap = mmap.mmap(twobit.fileno(), 0, access=mmap.ACCESS_READ)
+
+        signature = struct.unpack_from("<I", self._mmap)[0]
+        if signature == TWOBIT_SIGNATURE:
+            self._order = "<"
+        elif signature == struct.unpack("<I", struct.pack(">I", TWOBIT_SIGNATURE))[0]:
+            self._order = ">"
+        else:
+            raise ValueError(f"{self.filename} is not a .2bit file.")
+        version, n_contigs = struct.unpack_from(f"{self._order}II", self._mmap, 4)
+        offset_format = f"{self._order}I" if version == 0 else f"{self._order}Q"
+
+        names, self._offsets, position = [], {}, 16
+        for _ in range(n_contigs):
+            name_size = self._mmap[position]
+            name = self._mmap[position + 1 : position + 1 + name_size].decode("utf-8")
+            position += 1 + name_size
+            self._offsets[name] = struct.unpack_from(offset_format, self._mmap, position)[0]
+            position += struct.calcsize(offset_format)
+            names.append(name)
+
+        self.references = tuple(names)
+        self.lengths = tuple(
+            struct.unpack_from(f"{self._order}I", self._mmap, self._offsets[name])[0]
+            for name in names
+        )
+        self._lengths = dict(zip(self.references, self.lengths))
+        self._records = {}
+
+    @property
+    def nreferences(self):
+        return len(self.references)
+
+    def __contains__(self, reference):
+        return reference in self._lengths
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def get_reference_length(self, reference):
+        if reference not in self._lengths:
+            raise KeyError(f"sequence '{reference}' not present")
+        return self._lengths[reference]
+
+    def _read_blocks(self, position):
+        """Read a list of block starts and sizes of a record."""
+        (n_blocks,) = struct.unpack_from(f"{self._order}I", self._mmap, position)
+        position += 4
+        starts, sizes = array("I"), array("I")
+        starts.frombytes(self._mmap[position : position + 4 * n_blocks])
+        sizes.frombytes(self._mmap[position + 4 * n_blocks : position + 8 * n_blocks])
+        if (self._order == "<") != (sys.byteorder == "little"):
+            starts.byteswap()
+            sizes.byteswap()
+        return starts, sizes, position + 8 * n_blocks
+
+    def _get_record(self, reference):
+        """Get the N and mask blocks, packed bases offset and length of a contig."""
+        if reference not in self._records:
+            length = self.get_reference_length(reference)
+            n_blocks = self._read_blocks(self._offsets[reference] + 4)
+            mask_blocks = self._read_blocks(n_blocks[2])
+            # Skip the reserved word before the packed bases
+            self._records[reference] = (
+                n_blocks[:2], mask_blocks[:2], mask_blocks[2] + 4, length
+            )
+        return self._records[reference]
+
+    def fetch(self, reference=None, start=None, end=None, region=None):
+        """
+        Fetch the bases of a contig between 0-based `start` and `end`, or of
+        a 1-based `region` such as `9:10000-20000`.
+
+        Returns:
+            str: bases, uppercase or lowercase as in the fasta.
+        """
+        if region is not None:
+            reference, _, span = region.partition(":")
+            if span:
+                first, _, last = span.replace(",", "").partition("-")
+                start, end = int(first) - 1, int(last) if last else None
+        record = self._records.get(reference) or self._get_record(reference)
+        (n_starts, n_sizes), (mask_starts, mask_sizes), dna_offset, length = record
+        start = 0 if start is None else int(start)
+        end = length if end is None else min(int(end), length)
+        if start < 0:
+            raise ValueError(f"start out of range ({start})")
+        if start > end:
+            if start >= length:
+                return ""
+            raise ValueError(f"invalid coordinates: start ({start}) > stop ({end})")
+        if start == end:
+            return ""
+
+        packed = self._mmap[dna_offset + start // 4 : dna_offset + (end + 3) // 4]
+        offset = start % 4
+        bases = "".join(map(BYTE_BASES.__getitem__, packed))[offset : offset + end - start]
+
+        n_blocks = get_overlaps(n_starts, n_sizes, start, end)
+        mask_blocks = get_overlaps(mask_starts, mask_sizes, start, end)
+        if not n_blocks and not mask_blocks:
+            return bases
+
+        bases = list(bases)
+        for block_start, block_end in n_blocks:
+            bases[block_start - start : block_end - start] = "N" * (block_end - block_start)
+        for block_start, block_end in mask_blocks:
+            masked = "".join(bases[block_start - start : block_end - start]).lower()
+            bases[block_start - start : block_end - start] = masked
+        return "".join(bases)
+
+
+def get_overlaps(starts, sizes, start, end):
+    """Get the parts of the blocks within [start, end), clipped to it."""
+    overlaps = []
+    ix = max(bisect_right(starts, start) - 1, 0)
+    while ix < len(starts) and starts[ix] < end:
+        block_start, block_end = starts[ix], starts[ix] + sizes[ix]
+        if block_end > start:
+            overlaps.append((max(block_start, start), min(block_end, end)))
+        ix += 1
+    return overlaps
+
+
+def open_reference(reference):
+    """
+    Open a reference for fetching: a .2bit file memory-mapped, or a fasta
+    with pysam. Objects with a `fetch` method are returned as they are.
+    """
+    if hasattr(reference, "fetch"):
+        return reference
+    if str(reference).endswith(".2bit"):
+        return TwoBitFile(reference)
+
+    from pysam import FastaFile
+
+    return FastaFile(str(reference))
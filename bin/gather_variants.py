@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+gather_variants.py
+
+Gather the partitions of a scattered variants tsv in coordinate order, see
+`ffperase.scatter`.
+
+Example usage:
+    gather_variants.py --outfile features.tsv partition*/features.tsv
+"""
+import argparse
+
+from ffperase.scatter import gather_variants
+from ffperase.table import compress_variant_table, try_index_variant_table
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gather the partitions of a variants tsv in coordinate order."
+    )
+    parser.add_argument(
+        "partitions", nargs="+", help="Tsvs of each partition, in any order."
+    )
+    parser.add_argument(
+        "--outfile", required=True, help="Path to the gathered tsv."
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help="Index the gathered tsv when it is sorted by (CHR, START, REF, ALT).",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Compress the gathered tsv with bgzip, and index it with tabix when sorted.",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="Number of compression threads."
+    )
+    args = parser.parse_args()
+
+    n_tables = gather_variants(args.partitions, args.outfile)
+    print(f"[INFO] Done! {n_tables} partitions gathered into {args.outfile}")
+    if args.compress:
+        compress_variant_table(args.outfile, threads=args.threads)
+    elif args.index:
+        try_index_variant_table(args.outfile)
+
+
+if __name__ == "__main__":
+    main()
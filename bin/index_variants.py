@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+index_variants.py
+
+Index a variants tsv (pileup, features or classified outputs) sorted by
+(CHR, START, REF, ALT), sorting it first with `--sort`, or print the variants
+of a region using its index, see `ffperase.table`. With `--compress`, the
+tsv is compressed with bgzip and indexed with tabix instead.
+
+Example usage:
+    index_variants.py --tsv pileup.txt --sort
+    index_variants.py --tsv pileup.txt --sort --compress --threads 4
+    index_variants.py --tsv features.tsv --region 9:10000-20000 > region.tsv
+"""
+import argparse
+import sys
+
+from ffperase.table import (
+    BLOCK_ROWS,
+    compress_variant_table,
+    index_variant_table,
+    read_region,
+    sort_variant_table,
+)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Index a sorted variants tsv, or print the variants of a region."
+    )
+    parser.add_argument(
+        "--tsv", required=True, help="Variants tsv with CHR, START, REF and ALT columns."
+    )
+    parser.add_argument(
+        "--sort", action="store_true", help="Sort the tsv in place before indexing it."
+    )
+    parser.add_argument(
+        "--block-rows", type=int, default=BLOCK_ROWS, help="Maximum number of variants per block."
+    )
+    parser.add_argument(
+        "--region",
+        default=None,
+        help="Print the variants within a CHR, CHR:POS or CHR:START-END region instead.",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        help="Compress the tsv with bgzip, and index it with tabix when sorted.",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="Number of compression threads."
+    )
+    args = parser.parse_args()
+
+    if args.region:
+        sys.stdout.write(read_region(args.tsv, args.region))
+        return
+
+    if args.sort:
+        index_path = sort_variant_table(args.tsv, block_rows=args.block_rows)
+    elif not args.compress:
+        index_path = index_variant_table(args.tsv, block_rows=args.block_rows)
+    if args.compress:
+        compressed_path = compress_variant_table(
+            args.tsv, threads=args.threads, strict=True
+        )
+        print(f"[INFO] Done! Compressed tsv written to {compressed_path}")
+        return
+    print(f"[INFO] Done! Index written to {index_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+prepare_reference.py
+
+Pack a reference fasta into a memory-mapped .2bit file, that the python tasks
+can slice contexts from instead of the fasta, see `ffperase.twobit`.
+
+Example usage:
+    prepare_reference.py --fasta reference.fasta --outfile reference.2bit
+"""
+from pathlib import Path
+import argparse
+
+from ffperase.twobit import write_twobit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack a reference fasta into a .2bit file.")
+    parser.add_argument(
+        "--fasta", required=True, help="Reference fasta, optionally gzipped."
+    )
+    parser.add_argument(
+        "--outfile",
+        default=None,
+        help="Path to the .2bit file. [default: <fasta basename>.2bit]",
+    )
+    args = parser.parse_args()
+
+    outfile = args.outfile
+    if outfile is None:
+        name = Path(args.fasta).name
+        name = name[: -len(".gz")] if name.endswith(".gz") else name
+        outfile = f"{Path(name).stem}.2bit"
+
+    lengths = write_twobit(args.fasta, outfile)
+    print(f"[INFO] Packed {len(lengths)} contigs, {sum(lengths.values())} bases.")
+    print(f"[INFO] Done! Reference written to {outfile}")
+
+
+if __name__ == "__main__":
+    main()
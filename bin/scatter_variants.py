@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+scatter_variants.py
+
+Scatter a variants tsv (e.g. the merged pileup) into partitions in coordinate
+order, by chromosome or in balanced chunks, see `ffperase.scatter`.
+
+Example usage:
+    scatter_variants.py --tsv pileup.txt --by chunks --chunks 20 --outdir partitions
+"""
+import argparse
+
+from ffperase.scatter import scatter_variants
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Scatter a variants tsv into partitions in coordinate order."
+    )
+    parser.add_argument(
+        "--tsv", required=True, help="Variants tsv with CHR and START columns."
+    )
+    parser.add_argument(
+        "--by",
+        default="chromosome",
+        choices=["chromosome", "chunks"],
+        help="Partition by chromosome, or in balanced chunks of variants.",
+    )
+    parser.add_argument(
+        "--chunks", type=int, default=20, help="Number of partitions with --by chunks."
+    )
+    parser.add_argument(
+        "--outdir", default="partitions", help="Directory for the partitions."
+    )
+    args = parser.parse_args()
+
+    paths = scatter_variants(args.tsv, args.outdir, by=args.by, chunks=args.chunks)
+    print(f"[INFO] Done! {len(paths)} partitions written to {args.outdir}")
+
+
+if __name__ == "__main__":
+    main()
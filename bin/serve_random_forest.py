@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+serve_random_forest.py
+
+Serve Random Forest classifications from resident models, see
+`ffperase.serve`.
+
+Example usage:
+    serve_random_forest.py --server /tmp/ffperase.sock \\
+        --model model.snvs.joblib --model model.indels.joblib
+    classify_w_random_forest.py --server /tmp/ffperase.sock ...
+"""
+import argparse
+
+from ffperase.serve import serve_random_forest
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve FFPE Random Forest classifications from resident models."
+    )
+    parser.add_argument(
+        "--server",
+        required=True,
+        help="Unix socket path or localhost port to listen on.",
+    )
+    parser.add_argument(
+        "--model",
+        action="append",
+        required=True,
+        help="Path to a trained model (joblib file) to serve. Can be repeated.",
+    )
+    args = parser.parse_args()
+
+    serve_random_forest(args.server, args.model)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+slim_random_forest.py
+
+Produce slimmer variants of a trained Random Forest model and measure their
+accuracy vs. inference cost trade-off:
+
+1) Rank the model inputs by the forest feature importances, summing the
+   one-hot encoded columns of each categorical input.
+2) Refit the model configuration on a stratified train split, keeping only
+   the most important inputs and capping the tree depth.
+3) Cut the tree count of each refitted forest without refitting.
+4) Evaluate every variant on the held-out split against a baseline of the
+   original configuration (all inputs, its own tree count and depth) refitted
+   on the same split: AUC difference, inference throughput and model size.
+
+Example usage:
+    slim_random_forest.py \\
+        --model model.snvs.joblib --features labelled.tsv --label-col LABEL \\
+        --model-name snvs --mutation-type snvs --keep-features 1,0.75,0.5 \\
+        --n-estimators 100,50,25 --max-depth None,20,10
+"""
+from copy import deepcopy
+from math import ceil
+from pathlib import Path
+import argparse
+import pickle
+import time
+
+from ffperase.train import get_brfc, get_feature_columns, prune_oldest_trees, save_model
+
+
+def get_input_importances(model):
+    """
+    Get the feature importance of each model input.
+
+    Arguments:
+        model (Pipeline): Trained model.
+
+    Returns:
+        pd.Series: importances indexed by input column, sorted descending.
+    """
+    import pandas as pd
+
+    importances = model.named_steps["classifier"].feature_importances_
+    columns = []
+    for name, transformer, transformer_columns in model.named_steps["preprocess"].transformers_:
+        if name == "cat":
+            for col, categories in zip(transformer_columns, transformer.categories_):
+                columns += [col] * len(categories)
+        elif name == "num":
+            statistics = transformer.named_steps["imputer"].statistics_
+            # Columns without any value at fit time are dropped by the imputer
+            columns += [
+                col for col, stat in zip(transformer_columns, statistics) if stat == stat
+            ]
+    return (
+        pd.Series(importances, index=columns)
+        .groupby(level=0)
+        .sum()
+        .sort_values(ascending=False)
+    )
+
+
+def fit_configuration(
+    categorical_columns, numerical_columns, classifier_params, train_x, train_y, threads=1
+):
+    """
+    Fit a model configuration on a subset of the model inputs.
+
+    Arguments:
+        categorical_columns (list): Categorical model inputs to keep.
+        numerical_columns (list): Numerical model inputs to keep.
+        classifier_params (dict): BalancedRandomForestClassifier parameters.
+        train_x (pd.DataFrame): Training features.
+        train_y (pd.Series): Training labels.
+        threads (int): Number of trees to train in parallel.
+
+    Returns:
+        Pipeline: fitted model, set to predict with a single thread.
+    """
+    brfc = get_brfc(categorical_columns, numerical_columns)
+    brfc.named_steps["classifier"].set_params(
+        **dict(classifier_params, n_jobs=threads, warm_start=False)
+    )
+    brfc.fit(train_x, train_y)
+    brfc.named_steps["classifier"].set_params(n_jobs=1)
+    return brfc
+
+
+def evaluate_model(model, features, targets, repeats=3):
+    """
+    Get the AUC, throughput and size of a model on held-out features.
+
+    Arguments:
+        model (Pipeline): Trained model.
+        features (pd.DataFrame): Held-out features.
+        targets (pd.Series): Held-out labels.
+        repeats (int): Number of timed predictions, the fastest one is kept.
+
+    Returns:
+        dict: AUC, variants classified per second and model size.
+    """
+    from sklearn.metrics import roc_auc_score
+
+    seconds = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        raw_scores = model.predict_proba(features)[:, 1]
+        seconds = min(seconds, time.perf_counter() - start)
+    return {
+        "auc": roc_auc_score(targets, raw_scores),
+        "variants_per_second": len(features) / seconds,
+        "model_mb": len(pickle.dumps(model)) / 1e6,
+    }
+
+
+def slim_random_forest(
+    model_path,
+    features_path,
+    label_col,
+    model_name,
+    mutation_type,
+    outdir,
+    keep_features=(1.0, 0.75, 0.5),
+    n_estimators=(100, 50, 25),
+    max_depths=(None, 20, 10),
+    test_size=0.3,
+    threads=1,
+    save_variants=False,
+):
+    """
+    Evaluate feature-, depth- and tree-pruned variants of a trained model.
+
+    Arguments:
+        model_path (str): Path to the trained model (joblib file).
+        features_path (str): Path to tsv with preprocessed features and labels.
+        label_col (str): Name of column with artifact labels.
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        outdir (str): Directory to save the output files.
+        keep_features (list): Fractions of the most important inputs to keep.
+        n_estimators (list): Tree counts to cut each variant to.
+        max_depths (list): Maximum tree depths, None for unbounded.
+        test_size (float): Fraction of labelled variants held out.
+        threads (int): Number of trees to train in parallel.
+        save_variants (bool): Save every variant model.
+
+    Returns:
+        pd.DataFrame: report of the variants.
+    """
+    import joblib
+    import pandas as pd
+    from sklearn.model_selection import train_test_split
+
+    slim_dir = Path(outdir) / "slim"
+    slim_dir.mkdir(parents=True, exist_ok=True)
+
+    model = joblib.load(open(model_path, "rb"))
+    classifier_params = model.named_steps["classifier"].get_params()
+    importances = get_input_importances(model)
+    importances.rename("importance").to_frame().to_csv(
+        slim_dir / f"importances_{model_name}.tsv", sep="\t", index_label="feature"
+    )
+
+    categorical_columns, numerical_columns = get_feature_columns(mutation_type)
+    features = pd.read_csv(features_path, sep="\t", low_memory=False)
+    targets = features[label_col].astype(int)
+    train_x, test_x, train_y, test_y = train_test_split(
+        features[numerical_columns + categorical_columns],
+        targets,
+        test_size=test_size,
+        stratify=targets,
+        random_state=42,
+    )
+
+    ranked = [col for col in importances.index if col in train_x.columns]
+    ranked += [col for col in train_x.columns if col not in ranked]
+
+    # The original configuration refitted on the train split is the baseline
+    baseline = fit_configuration(
+        categorical_columns, numerical_columns, classifier_params, train_x, train_y, threads
+    )
+    rows = [
+        dict(
+            variant="baseline",
+            n_features=len(ranked),
+            dropped_features="-",
+            n_estimators=classifier_params["n_estimators"],
+            max_depth=str(classifier_params["max_depth"]),
+            **evaluate_model(baseline, test_x, test_y),
+        )
+    ]
+    print(f"[INFO] Evaluated baseline: AUC {rows[-1]['auc']:.4f}")
+    for keep in sorted(keep_features, reverse=True):
+        kept = ranked[: max(1, ceil(keep * len(ranked)))]
+        for max_depth in max_depths:
+            brfc = fit_configuration(
+                [col for col in categorical_columns if col in kept],
+                [col for col in numerical_columns if col in kept],
+                dict(classifier_params, n_estimators=max(n_estimators), max_depth=max_depth),
+                train_x,
+                train_y,
+                threads,
+            )
+
+            for n_trees in sorted(n_estimators, reverse=True):
+                variant = deepcopy(brfc)
+                classifier = variant.named_steps["classifier"]
+                prune_oldest_trees(classifier, len(classifier.estimators_) - n_trees)
+                name = f"features{len(kept)}_trees{n_trees}_depth{max_depth}"
+                rows.append(
+                    dict(
+                        variant=name,
+                        n_features=len(kept),
+                        dropped_features=",".join(ranked[len(kept):]) or "-",
+                        n_estimators=n_trees,
+                        max_depth=str(max_depth),
+                        **evaluate_model(variant, test_x, test_y),
+                    )
+                )
+                print(f"[INFO] Evaluated {name}: AUC {rows[-1]['auc']:.4f}")
+                if save_variants:
+                    save_model(variant, slim_dir / f"model_{model_name}_{name}.joblib")
+
+    report = pd.DataFrame(rows)
+    baseline = report.iloc[0]
+    report["auc_delta"] = report["auc"] - baseline["auc"]
+    report["speedup"] = report["variants_per_second"] / baseline["variants_per_second"]
+    report["size_ratio"] = report["model_mb"] / baseline["model_mb"]
+    report = report[
+        [
+            "variant", "n_features", "n_estimators", "max_depth", "auc", "auc_delta",
+            "variants_per_second", "speedup", "model_mb", "size_ratio",
+            "dropped_features",
+        ]
+    ]
+
+    shipped = evaluate_model(model, test_x, test_y)
+    print(
+        f"[INFO] {model_path} on the held-out split: AUC {shipped['auc']:.4f}, "
+        f"{shipped['variants_per_second']:.0f} variants/s, {shipped['model_mb']:.1f} MB "
+        "(it may have been trained on these variants)."
+    )
+
+    outpath = slim_dir / f"slim_{model_name}.tsv"
+    report.to_csv(outpath, sep="\t", index=False, float_format="%.6f")
+    print(f"[INFO] Done! Slimming report written to {outpath}")
+    return report
+
+
+def parse_list(value, cast):
+    """Parse a comma separated list of values, `None` included."""
+    return [None if item == "None" else cast(item) for item in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Evaluate slimmer, faster variants of a trained Random Forest model."
+    )
+    parser.add_argument(
+        "--model", required=True, help="Path to the trained model (joblib file)."
+    )
+    parser.add_argument(
+        "--features", required=True, help="Path to tsv with preprocessed features and labels."
+    )
+    parser.add_argument(
+        "--label-col",
+        required=True,
+        help="Column in feature tsv with artifact labels (1 = artifact, 0 = real mutation).",
+    )
+    parser.add_argument("--model-name", required=True, help="Name of model for output.")
+    parser.add_argument(
+        "--mutation-type", required=True, help="Type of mutation ('snvs' or 'indels')."
+    )
+    parser.add_argument(
+        "--keep-features",
+        default="1,0.75,0.5",
+        help="Comma separated fractions of the most important features to keep.",
+    )
+    parser.add_argument(
+        "--n-estimators",
+        default="100,50,25",
+        help="Comma separated number of trees to keep.",
+    )
+    parser.add_argument(
+        "--max-depth",
+        default="None,20,10",
+        help="Comma separated maximum tree depths, None for unbounded.",
+    )
+    parser.add_argument(
+        "--test-size", type=float, default=0.3, help="Fraction of variants held out."
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="Number of trees to train in parallel."
+    )
+    parser.add_argument(
+        "--save-variants", action="store_true", help="Save every variant model."
+    )
+    parser.add_argument("--outdir", default=".", help="Directory to save the output files.")
+    args = parser.parse_args()
+
+    slim_random_forest(
+        model_path=args.model,
+        features_path=args.features,
+        label_col=args.label_col,
+        model_name=args.model_name,
+        mutation_type=args.mutation_type,
+        outdir=args.outdir,
+        keep_features=parse_list(args.keep_features, float),
+        n_estimators=parse_list(args.n_estimators, int),
+        max_depths=parse_list(args.max_depth, int),
+        test_size=args.test_size,
+        threads=args.threads,
+        save_variants=args.save_variants,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+summarize_profiles.py
+
+Summarize the hot spots of a run from the `profile_<script>.json` sidecars
+written by its tasks with FFPERASE_PROFILE set:
+
+1) Search the run directory (e.g. the nextflow `work` dir) for sidecars.
+2) Sum the wall time, CPU time and rows of each script stage across tasks.
+3) Rank the stages by their total wall time, with their share of the script
+   time, CPU utilization, throughput and peak RSS.
+
+Example usage:
+    summarize_profiles.py --dir work --outfile profile_summary.tsv
+"""
+from pathlib import Path
+import argparse
+import json
+
+import pandas as pd
+
+
+def read_profiles(run_dir):
+    """
+    Read the stages of every profile sidecar in a run directory.
+
+    Arguments:
+        run_dir (str): Directory to search for `profile_*.json` files.
+
+    Returns:
+        tuple: stages dataframe, and tasks dataframe with their totals.
+    """
+    stages, tasks = [], []
+    for path in sorted(Path(run_dir).rglob("profile_*.json")):
+        with open(path, "r", encoding="utf-8") as profile_file:
+            profile = json.load(profile_file)
+        task = str(path.parent)
+        tasks.append(
+            dict(
+                task=task,
+                script=profile["script"],
+                wall=profile["wall"],
+                cpu=profile["cpu"],
+                peak_rss_mb=profile["peak_rss_mb"],
+            )
+        )
+        stages += [dict(stage, task=task, script=profile["script"]) for stage in profile["stages"]]
+    return pd.DataFrame(stages), pd.DataFrame(tasks)
+
+
+def summarize_profiles(stages, tasks):
+    """
+    Aggregate the stages of each script across tasks.
+
+    Arguments:
+        stages (pd.DataFrame): Stages of every task.
+        tasks (pd.DataFrame): Totals of every task.
+
+    Returns:
+        pd.DataFrame: one row per script stage, slowest first.
+    """
+    grouped = stages.groupby(["script", "stage"])
+    summary = pd.DataFrame(
+        {
+            "tasks": grouped["task"].nunique(),
+            "wall": grouped["wall"].sum(),
+            "wall_max": grouped["wall"].max(),
+            "cpu": grouped["cpu"].sum(),
+            "rows": grouped["rows"].sum(),
+            "peak_rss_mb": grouped["peak_rss_mb"].max(),
+        }
+    )
+    script_wall = tasks.groupby("script")["wall"].sum()
+    summary["wall_mean"] = summary["wall"] / summary["tasks"]
+    summary["share"] = summary["wall"] / script_wall.reindex(
+        summary.index.get_level_values("script")
+    ).to_numpy()
+    summary["cpu_utilization"] = summary["cpu"] / summary["wall"]
+    summary["rows_per_second"] = summary["rows"].where(summary["rows"] > 0) / summary["wall"]
+    summary = summary.reset_index().sort_values("wall", ascending=False)
+    return summary[
+        [
+            "script", "stage", "tasks", "wall", "wall_mean", "wall_max", "share",
+            "cpu", "cpu_utilization", "rows", "rows_per_second", "peak_rss_mb",
+        ]
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Summarize the stage profiles of the tasks in a run directory."
+    )
+    parser.add_argument(
+        "--dir", required=True, help="Run directory to search for profile_*.json files."
+    )
+    parser.add_argument(
+        "--outfile", default="profile_summary.tsv", help="Path to the summary tsv."
+    )
+    parser.add_argument(
+        "--top", type=int, default=15, help="Number of slowest stages to print."
+    )
+    args = parser.parse_args()
+
+    stages, tasks = read_profiles(args.dir)
+    if stages.empty:
+        raise FileNotFoundError(
+            f"No profile_*.json files found in {args.dir}, run with FFPERASE_PROFILE=1"
+        )
+    summary = summarize_profiles(stages, tasks)
+    summary.to_csv(args.outfile, sep="\t", index=False, float_format="%.6f")
+    print(f"[INFO] {len(tasks)} task profiles, slowest stages:")
+    print(summary.head(args.top).to_string(index=False, float_format="{:.2f}".format))
+    print(f"[INFO] Done! Profile summary written to {args.outfile}")
+
+
+if __name__ == "__main__":
+    main()
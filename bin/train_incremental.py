@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+train_incremental.py
+
+Train a Random Forest model incrementally over a sequence of labelled
+features files, e.g. one per cohort or batch:
+
+1) The first batch fits the preprocessing, which stays frozen afterwards.
+2) Each batch adds `--trees-per-batch` trees with `warm_start`, so only that
+   batch is in memory.
+3) The model is checkpointed after every batch, and a rerun with the same
+   arguments resumes after the last completed batch.
+4) Batches with categories unseen by the frozen OneHotEncoder are refused.
+5) The forest is bounded by `--max-trees`, optionally pruning the oldest
+   trees to make room for new ones.
+
+Example usage:
+    train_incremental.py \\
+        --features cohort1.tsv cohort2.tsv cohort3.tsv \\
+        --label-col LABEL --model-name ffpe --mutation-type snvs \\
+        --trees-per-batch 50 --max-trees 300 --prune-oldest
+"""
+from os.path import abspath, exists
+from pathlib import Path
+import argparse
+import json
+import os
+
+from ffperase.train import (
+    check_categories,
+    get_brfc,
+    get_feature_columns,
+    prune_oldest_trees,
+    save_model,
+)
+
+
+def save_checkpoint(model, completed, checkpoint_dir):
+    """Atomically save the model and the completed batches."""
+    tmp_model = Path(checkpoint_dir) / "model.joblib.tmp"
+    tmp_state = Path(checkpoint_dir) / "state.json.tmp"
+    save_model(model, tmp_model, compress=False)
+    with open(tmp_state, "w", encoding="utf-8") as state_file:
+        json.dump({"completed": completed}, state_file, indent=2)
+        state_file.flush()
+        os.fsync(state_file.fileno())
+    os.replace(tmp_model, Path(checkpoint_dir) / "model.joblib")
+    os.replace(tmp_state, Path(checkpoint_dir) / "state.json")
+
+
+def load_checkpoint(checkpoint_dir, features_paths):
+    """
+    Load the model and completed batches of a previous run.
+
+    Arguments:
+        checkpoint_dir (str): Directory with the checkpoint.
+        features_paths (list): Batches of this run, in order.
+
+    Returns:
+        tuple: model and list of completed batches, (None, []) if no checkpoint.
+    """
+    import joblib
+
+    state_path = Path(checkpoint_dir) / "state.json"
+    if not exists(state_path):
+        return None, []
+    with open(state_path, "r", encoding="utf-8") as state_file:
+        completed = json.load(state_file)["completed"]
+    if completed != features_paths[: len(completed)]:
+        raise ValueError(
+            f"Checkpoint at {checkpoint_dir} was made for different batches: {completed}"
+        )
+    print(f"[INFO] Resuming after {len(completed)} completed batch(es).")
+    return joblib.load(Path(checkpoint_dir) / "model.joblib"), completed
+
+
+def make_room(classifier, n_trees, max_trees=None, prune_oldest=False):
+    """
+    Make room for `n_trees` new trees in a forest bounded by `max_trees`.
+
+    Arguments:
+        classifier (BalancedRandomForestClassifier): Fitted forest.
+        n_trees (int): Number of trees to add.
+        max_trees (int, optional): Maximum number of trees in the forest.
+        prune_oldest (bool): Remove the oldest trees to make room, instead
+            of failing.
+
+    Returns:
+        int: number of trees in the forest once the new trees are added.
+
+    Raises:
+        ValueError: if the forest would exceed `max_trees` without pruning.
+    """
+    n_estimators = len(classifier.estimators_) + n_trees
+    if max_trees and n_estimators > max_trees:
+        if not prune_oldest:
+            raise ValueError(
+                f"A forest of {n_estimators} trees exceeds --max-trees {max_trees}, "
+                "use --prune-oldest to replace the oldest trees."
+            )
+        prune_oldest_trees(classifier, n_estimators - max_trees)
+        n_estimators = max_trees
+    return n_estimators
+
+
+def train_incremental(
+    features_paths,
+    label_col,
+    model_name,
+    mutation_type,
+    outdir,
+    trees_per_batch=50,
+    max_trees=None,
+    prune_oldest=False,
+    pretrained_model=None,
+    checkpoint_dir=None,
+    threads=1,
+    compress=True,
+):
+    """
+    Train a Random Forest model adding trees batch by batch.
+
+    Arguments:
+        features_paths (list): Tsvs with labelled features, in training order.
+        label_col (str): Name of column with artifact labels.
+        model_name (str): Name of the model for labeling outputs.
+        mutation_type (str): Type of mutation ("snvs" or "indels").
+        outdir (str): Directory to save the output files.
+        trees_per_batch (int): Number of trees added by each batch.
+        max_trees (int, optional): Maximum number of trees in the forest.
+        prune_oldest (bool): Remove the oldest trees when reaching max_trees,
+            instead of failing.
+        pretrained_model (str, optional): Model to start from, its
+            preprocessing is kept frozen.
+        checkpoint_dir (str, optional): Directory to checkpoint the model,
+            defaults to `<outdir>/train/checkpoint_<model_name>`.
+        threads (int): Number of trees to train in parallel.
+        compress (bool): Gzip the final model.
+    """
+    import joblib
+    import pandas as pd
+
+    if max_trees and trees_per_batch > max_trees:
+        raise ValueError(
+            f"--trees-per-batch {trees_per_batch} exceeds --max-trees {max_trees}."
+        )
+
+    train_dir = Path(outdir) / "train"
+    train_dir.mkdir(parents=True, exist_ok=True)
+    checkpoint_dir = Path(checkpoint_dir or train_dir / f"checkpoint_{model_name}")
+    checkpoint_dir.mkdir(parents=True, exist_ok=True)
+
+    features_paths = [abspath(path) for path in features_paths]
+    categorical_columns, numerical_columns = get_feature_columns(mutation_type)
+    columns = numerical_columns + categorical_columns
+
+    model, completed = load_checkpoint(checkpoint_dir, features_paths)
+    if model is None and pretrained_model:
+        model = joblib.load(open(pretrained_model, "rb"))
+        make_room(model.named_steps["classifier"], 0, max_trees, prune_oldest)
+
+    for ix, features_path in enumerate(features_paths):
+        if ix < len(completed):
+            continue
+        features = pd.read_csv(features_path, sep="\t", low_memory=False)
+        targets = features[label_col].astype(int)
+
+        if model is None:
+            model = get_brfc(categorical_columns, numerical_columns, n_jobs=threads)
+            model.named_steps["classifier"].set_params(n_estimators=trees_per_batch)
+            model.fit(features[columns], targets)
+        else:
+            check_categories(model, features, categorical_columns)
+            classifier = model.named_steps["classifier"]
+            n_estimators = make_room(classifier, trees_per_batch, max_trees, prune_oldest)
+            # A different seed per batch avoids repeating the pruned trees seeds
+            classifier.set_params(
+                warm_start=True,
+                n_estimators=n_estimators,
+                n_jobs=threads,
+                random_state=42 + ix,
+            )
+            classifier.fit(model.named_steps["preprocess"].transform(features[columns]), targets)
+
+        completed.append(features_path)
+        save_checkpoint(model, completed, checkpoint_dir)
+        print(
+            f"[INFO] Batch {ix + 1}/{len(features_paths)}: {features_path} "
+            f"({len(features)} variants, "
+            f"{len(model.named_steps['classifier'].estimators_)} trees)"
+        )
+
+    outpath = train_dir / f"model_{model_name}.joblib"
+    save_model(model, outpath, compress=compress)
+    print(f"[INFO] Done! Model saved at {outpath}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Train the Random Forest model incrementally over batches of FFPE mutations."
+    )
+    parser.add_argument(
+        "--features",
+        required=True,
+        nargs="+",
+        help="Tsvs with preprocessed features and labels, in training order.",
+    )
+    parser.add_argument(
+        "--label-col",
+        required=True,
+        help="Column in feature tsv with artifact labels (1 = artifact, 0 = real mutation).",
+    )
+    parser.add_argument("--model-name", required=True, help="Name of model for output.")
+    parser.add_argument(
+        "--mutation-type", required=True, help="Type of mutation ('snvs' or 'indels')."
+    )
+    parser.add_argument(
+        "--trees-per-batch", type=int, default=50, help="Number of trees added per batch."
+    )
+    parser.add_argument(
+        "--max-trees", type=int, default=None, help="Maximum number of trees in the model."
+    )
+    parser.add_argument(
+        "--prune-oldest",
+        action="store_true",
+        help="Remove the oldest trees to stay within --max-trees.",
+    )
+    parser.add_argument(
+        "--pretrained-model",
+        default=None,
+        help="Path to pretrained model to continue training (optional).",
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        default=None,
+        help="Directory to checkpoint the model after each batch.",
+    )
+    parser.add_argument(
+        "--threads", type=int, default=1, help="Number of trees to train in parallel."
+    )
+    parser.add_argument(
+        "--no-compress",
+        action="store_true",
+        help="Save an uncompressed model that can be memory-mapped by classification.",
+    )
+    parser.add_argument(
+        "--outdir", default=".", help="Directory to save the output files."
+    )
+    args = parser.parse_args()
+
+    train_incremental(
+        features_paths=args.features,
+        label_col=args.label_col,
+        model_name=args.model_name,
+        mutation_type=args.mutation_type,
+        outdir=args.outdir,
+        trees_per_batch=args.trees_per_batch,
+        max_trees=args.max_trees,
+        prune_oldest=args.prune_oldest,
+        pretrained_model=args.pretrained_model,
+        checkpoint_dir=args.checkpoint_dir,
+        threads=args.threads,
+        compress=not args.no_compress,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,127 +1,19 @@
 #!/usr/bin/env python3
+"""
+train_random_forest.py
 
-from pathlib import Path
-import joblib
-import pandas as pd
-from imblearn.ensemble import BalancedRandomForestClassifier
-# from sklearn.model_selection import train_test_split
-from sklearn.impute import SimpleImputer
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder
-
-pd.options.display.float_format = "{:.2f}".format
-
-NUMERICAL_COL = [
-    "VAF",
-    "DEPTH",
-    "LOG_DEPTH_RATIO",
-    "AVG_MQ",
-    "AVG_ALT_MQ",
-    "AVG_ALT_MATE_MQ",
-    "LOG_IS_RATIO",
-    "LOG_ALT_IS_RATIO",
-    "AVG_EDIT_DIST",
-    "AVG_READ_BAL",
-    "VARIANT_READS",
-    "STRAND_BIAS",
-]
-SNV_NUMERICAL_COL = [
-    "VARIANT_ALLELES",
-    "PA_BASE_CHANGE_ERROR",
-    "PA_TRINUCLEO_ERROR",
-    "BB_BASE_CHANGE_ERROR",
-    "BB_TRINUCLEO_ERROR",
-]
-INDEL_NUMERICAL_COL = [
-    "INDEL_LENGTH",
-    "MHCOUNT",
-    "REPCOUNT",
-    "INDEL_COUNT",
-]
-CATEGORICAL_COL = [
-    "5_BASE",
-    "3_BASE",
-]
-SNV_CATEGORICAL_COL = [
-    "REF",
-    "ALT",
-]
-INDEL_CATEGORICAL_COL = [
-    "INDEL_TYPE",
-    "CLASSIFICATION",
-]
-
-def get_brfc(categorical_columns, numerical_columns):
-    categorical_encoder = OneHotEncoder(handle_unknown="ignore")
-    numerical_pipe = Pipeline([
-        ("imputer", SimpleImputer(strategy="mean"))
-    ])
-    
-    preprocessing = ColumnTransformer(
-        [("cat", categorical_encoder, categorical_columns),
-         ("num", numerical_pipe, numerical_columns)])
-    
-    brfc = Pipeline([
-        ("preprocess", preprocessing),
-        ("classifier", BalancedRandomForestClassifier(random_state=42, n_estimators=100))
-    ])
-    
-    return brfc
-
-def train_random_forest(
-    features_path, label_col, model_name, pretrained_model, mutation_type, outdir
-):
-    """
-    Trains a Random Forest model.
+Train the Random Forest model with labelled features, or cross-validate a
+grid of its parameters, see `ffperase.train`.
 
-    Args:
-        features_path (str): Path to tsv with preprocessed features.
-        label_col (str): Name of column with artifact labels.
-        model_name (str): Name of the model for labeling outputs.
-        model_path (str): Path to the trained model (joblib file).
-        outdir (str): Directory to save the output files.
-
-    Returns:
-        None
-    """
-    # Ensure output directory exists
-    train_dir = Path(outdir) / "train"
-    train_dir.mkdir(parents=True, exist_ok=True)
-
-    features = pd.read_csv(features_path, sep="\t", low_memory=False)
-    targets = features[label_col].astype(int)
-
-    numerical_columns = NUMERICAL_COL
-    categorical_columns = CATEGORICAL_COL
-    if mutation_type == "snvs":
-        numerical_columns += SNV_NUMERICAL_COL
-        categorical_columns += SNV_CATEGORICAL_COL
-    else:
-        numerical_columns += INDEL_NUMERICAL_COL
-        categorical_columns += INDEL_CATEGORICAL_COL
-    
-    brfc = None
-    if pretrained_model:
-        # load pretrained model and train with double the estimators
-        brfc = joblib.load(open(pretrained_model, 'rb'))
-        n_estimators = brfc.named_steps['classifier'].n_estimators
-        brfc.named_steps['classifier'].set_params(warm_start=True, n_estimators=n_estimators*2)
-        brfc.fit(features[numerical_columns+categorical_columns], targets)
-    else:
-        brfc = get_brfc(categorical_columns, numerical_columns)
-        brfc.fit(features[numerical_columns+categorical_columns], targets)
-    
-    print(
-        "Train accuracy: %0.3f" % brfc.score(
-            features[numerical_columns+categorical_columns],
-            targets
-        )
-    )
-    print("n_estimators: %i" % brfc.named_steps["classifier"].n_estimators)
+Example usage:
+    train_random_forest.py --features labelled.tsv --label-col LABEL \\
+        --model-name ARTIFACT --mutation-type snvs --outdir .
+"""
+from pathlib import Path
+import json
 
-    outpath = Path(train_dir) / f"model_{model_name}.joblib"
-    joblib.dump(brfc, open(outpath, "wb"), compress=("gzip", 3))
+from ffperase.stage_profiler import profiler
+from ffperase.train import search_random_forest, train_random_forest
 
 
 if __name__ == "__main__":
@@ -133,7 +25,8 @@ if __name__ == "__main__":
     parser.add_argument(
         "--features",
         required=True,
-        help="Path to tsv with preprocessed features.",
+        nargs="+",
+        help="Path to tsv with preprocessed features. Several tsvs are combined.",
     )
     parser.add_argument(
         "--label-col",
@@ -156,14 +49,79 @@ if __name__ == "__main__":
         default=".",
         help="Directory to save the output files.",
     )
+    parser.add_argument(
+        "--no-compress",
+        action="store_true",
+        help="Save an uncompressed model that can be memory-mapped by classification.",
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=1,
+        help="Number of trees to train in parallel.",
+    )
+    parser.add_argument(
+        "--out-of-core",
+        action="store_true",
+        help="Stream the features into an on-disk float32 design matrix before fitting.",
+    )
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=100000,
+        help="Number of features rows to read at a time when training out of core.",
+    )
+    parser.add_argument(
+        "--search",
+        action="store_true",
+        help="Cross-validate a grid of parameters instead of training a model.",
+    )
+    parser.add_argument(
+        "--grid",
+        default=None,
+        help="Json file with lists of parameters to search (optional).",
+    )
+    parser.add_argument(
+        "--folds",
+        type=int,
+        default=5,
+        help="Number of stratified cross-validation folds for --search.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Write a stage profile next to the outputs (or set FFPERASE_PROFILE).",
+    )
 
     args = parser.parse_args()
+    profiler.enable(args.profile)
 
-    train_random_forest(
-        features_path=args.features,
-        label_col = args.label_col,
-        model_name = args.model_name,
-        mutation_type = args.mutation_type,
-        pretrained_model=args.pretrained_model,
-        outdir=args.outdir,
-    )
+    if args.search:
+        grid = None
+        if args.grid:
+            with open(args.grid, "r", encoding="utf-8") as grid_file:
+                grid = json.load(grid_file)
+        search_random_forest(
+            features_path=args.features,
+            label_col=args.label_col,
+            model_name=args.model_name,
+            mutation_type=args.mutation_type,
+            outdir=args.outdir,
+            grid=grid,
+            folds=args.folds,
+            threads=args.threads,
+        )
+    else:
+        train_random_forest(
+            features_path=args.features,
+            label_col = args.label_col,
+            model_name = args.model_name,
+            mutation_type = args.mutation_type,
+            pretrained_model=args.pretrained_model,
+            outdir=args.outdir,
+            compress=not args.no_compress,
+            threads=args.threads,
+            out_of_core=args.out_of_core,
+            chunksize=args.chunksize,
+        )
+    profiler.write(Path(args.outdir) / "train")
@@ -6,6 +6,7 @@ include { logSuccess
     coloredTitle
     getAbsolute
     logDirTree
+    getTypeOutdir
 } from './utils.nf'
 
 include {
@@ -25,9 +26,14 @@ include {
     ANNOTATE_VARIANTS
 } from './modules/annotate.nf'
 
+include {
+    PREPARE_REFERENCE
+} from './modules/reference.nf'
+
 include {
     DOWNLOAD_MODEL
     CLASSIFY_RANDOM_FOREST
+    ANNOTATE_PREDICTIONS
 } from './modules/classify.nf'
 
 include {
@@ -38,6 +44,13 @@ include {
     PLOT_REPORT
 } from './modules/report.nf'
 
+include {
+    SCATTER_VARIANTS as SCATTER_PILEUP
+    SCATTER_VARIANTS as SCATTER_FEATURES
+    GATHER_VARIANTS as GATHER_FEATURES
+    GATHER_VARIANTS as GATHER_CLASSIFIED
+} from './modules/scatter.nf'
+
 def showVersion() {
     version = "v0.1.0"
     
@@ -68,7 +81,9 @@ def showHelp() {
             --outdir            Output location for results [required].
             --coverage          Calculated median coverage [required].
             --medianInsert      Calculated median insert size [required].
-            --mutationType      Mutation type, valid choices: "snvs", "indels". [Default: "snvs"]
+            --mutationType      Mutation type, valid choices: "snvs", "indels", "both". With "both",
+                                SNVs and indels share the pileup and Picard tasks, and are annotated
+                                and classified separately. [Default: "snvs"]
             --bed               Bedfile path for the regions covered by the bam.
                                 [default: assets/gr37.no_mt_unmapped.bed.gz]
             --minBaseq          Minimum BaseQ to assess reads with pileup. [0-60] [default: 0]
@@ -77,21 +92,56 @@ def showHelp() {
             --splitPileup       Number of variants per file for pileup jobs. [default: 1000]
             --splitReads        Number of reads to split into picard jobs. [default: 7,500,000]
             --picardMetrics     Output to pre-computed Picard's CollectSequencingArtifactMetrics.
+            --checkpointDir     Durable directory shared by task attempts (e.g. on a shared filesystem),
+                                where the annotation is checkpointed in blocks of variants, so a
+                                retried task resumes from the last completed block. [default: off]
+            --twoBit            Annotate from a memory-mapped .2bit of the reference, shared by the
+                                tasks of a host. Pass a .2bit path to reuse one, or no value to pack
+                                it once into <outdir>/reference. [default: off]
 
         Classify Options:
             --features          Tsv with preprocessed features. [default: <outdir>/preprocess/features.tsv]
             --model             Path to trained model [required].
             --modelName         Name of the trained model [required].
+            --snvsModel         With --mutationType both, path to the trained SNVs model.
+                                [default: downloaded from Hugging Face Hub]
+            --indelsModel       With --mutationType both, path to the trained indels model.
+                                [default: downloaded from Hugging Face Hub]
             --outdir            Output location for results [required].
             --tsv               Tsv that will be used to add annotated columns to the classified output.
+            --modelServer       Unix socket or localhost port of a running serve_random_forest.py.
+                                Falls back to in-process classification if not running.
+            --mmapModel         Keep the downloaded model uncompressed, so classify tasks load it
+                                faster, without inflating it. [default: false]
+            --cascade           Evaluate trees in blocks, and stop scoring a variant once the
+                                remaining trees can not change its label. [default: false]
+            --cascadeBand       With --cascade, also stop once the running probability is further
+                                than this from 0.5. Faster, but labels may differ from the full forest.
+            --region            Only classify the variants within a region, e.g. "9", "9:10000" or
+                                "9:10000-20000", reading the features.tsv.idx index when present.
+            --reportDensity     Number of variants above which the report circos plots binned
+                                densities instead of every variant. [default: 100000]
 
         Train Options:
             --features          Tsv with preprocessed features, and labels [required].
             --labelCol          Column name of feature tsv with artifact labels [required].
             --modelName         Name of the trained model [required].
             --modelPath         Path to trained base model to add more estimators if desired.
+            --mmapModel         Save an uncompressed model that can be memory-mapped. [default: false]
             --outdir            Output location for results [required].
 
+        Other Options:
+            --scatter           Annotate and classify partitions of the variants as separate tasks,
+                                by "chromosome" or in balanced "chunks", and gather their outputs
+                                in coordinate order. [default: off]
+            --scatterChunks     Number of partitions with --scatter chunks. [default: 20]
+            --compress          Write the pileup, features and classified tsvs compressed with bgzip,
+                                using the task cpus as compression threads, and index them with tabix.
+                                [default: false]
+            --profileStages     Write the wall time, cpu time, peak memory and rows of each stage
+                                of the python scripts to profile_<script>.json in their task
+                                directories, see bin/summarize_profiles.py. [default: false]
+
     """.stripIndent()
     exit 0
 }
@@ -119,6 +169,8 @@ def showInfo() {
         ----------------------------------------------------------------
         step          : ${params.step}
         outdir        : ${params.outdir}
+        scatter       : ${params.scatter ? params.scatter : "''"}${params.scatter == "chunks" ? " (${params.scatterChunks})" : ""}
+        compress      : ${params.compress}
     """
 
     logMessage += ["preprocess", "full"].contains(params.step) ? (
@@ -139,6 +191,8 @@ def showInfo() {
         minDepth      : ${params.minDepth}
         splitReads    : ${params.splitReads}
         splitPileup   : ${params.splitPileup}
+        checkpointDir : ${params.checkpointDir ? params.checkpointDir : "''"}
+        twoBit        : ${params.twoBit}
     """) : ""
     
     logMessage += ["classify", "full"].contains(params.step) ? (
@@ -146,9 +200,12 @@ def showInfo() {
         ** To Classify: **
 
         features      : ${params.features ? params.features : "''"}
-        model         : ${params.model}
+        model         : ${params.mutationType == "both" ? "snvs: ${params.snvsModel ?: "''"}, indels: ${params.indelsModel ?: "''"}" : params.model}
         modelName     : ${params.modelName}
-        tsv           : ${new File(params.tsv).name != 'NO_FILE' ? params.tsv : "''"}\
+        tsv           : ${new File(params.tsv).name != 'NO_FILE' ? params.tsv : "''"}
+        modelServer   : ${params.modelServer ? params.modelServer : "''"}
+        cascade       : ${params.cascade}
+        region        : ${params.region ? params.region : "''"}\
     """) : ""
 
     logMessage += ["train"].contains(params.step) ? (
@@ -230,6 +287,21 @@ def validateSteps() {
     }
 }
 
+def validateScatter() {
+    def validScatter = ['chromosome', 'chunks']
+    if (params.scatter && !validScatter.contains(params.scatter)) {
+        logError """\
+            Error: Invalid scatter '${params.scatter}'
+            Valid choices are: ${validScatter.join(', ')}.
+        """.stripIndent()
+        exit 1
+    }
+    if (params.scatter == "chunks" && params.scatterChunks < 1) {
+        logError "Error: --scatterChunks must be at least 1."
+        exit 1
+    }
+}
+
 workflow preprocessWorkflow {
     main:
     // Check Inputs
@@ -241,7 +313,7 @@ workflow preprocessWorkflow {
         logError "Error: --medianInsert is required."
         exit 1
     }
-    def validMutationTypes = ["snvs", "indels"]
+    def validMutationTypes = ["snvs", "indels", "both"]
     if (!validMutationTypes.contains(params.mutationType)) {
         logError """\
             Error: Invalid Mutation Type: '${params.mutationType}.'
@@ -252,17 +324,23 @@ workflow preprocessWorkflow {
 
     inputs = validateInputs()
 
-    // 1. Pileup Mutations
-    pileupOutput = inputs.vcf
+    // 1. Pileup Mutations, merged into a sorted and indexed pileup per type.
+    // With "both", splits are named split_<type>_<index>.vcf
+    inputs.vcf
         | SPLIT_PILEUP
         | flatten
+        | map { splitVcf ->
+            def mutationType = params.mutationType == "both" ? splitVcf.name.tokenize("_")[1] : params.mutationType
+            [mutationType, splitVcf]
+        }
         | combine(inputs.bam)
         | combine(inputs.bai)
         | combine(inputs.reference)
         | map { nested -> nested.flatten() }
         | PILEUP
-        | collect
+        | groupTuple
         | MERGE_PILEUP
+    pileupOutput = MERGE_PILEUP.out.pileupOutput
 
     // 2. Get Metrics from Picard
     if (inputs.picardMetrics) {
@@ -283,15 +361,46 @@ workflow preprocessWorkflow {
             | MERGE_PICARD
     }
 
-    // 3. Annotate with Pileup and Picard results
-    featuresTsv = ANNOTATE_VARIANTS(
-        pileupOutput,
-        picardOutput,
-        inputs.reference,
-    )
+    // 3. Annotate with Pileup and Picard results, from the .2bit reference if requested.
+    // Picard metrics and the reference are shared by the pileup of each type
+    picardPreAdapter = picardOutput[0].first()
+    picardBaitBias = picardOutput[1].first()
+    annotateReference = inputs.reference
+    if (params.twoBit instanceof String) {
+        annotateReference = channel.fromPath(params.twoBit)
+            .ifEmpty("Error: No valid file found for twoBit at ${params.twoBit}")
+    } else if (params.twoBit) {
+        annotateReference = PREPARE_REFERENCE(inputs.reference).twoBit
+    }
+
+    if (params.scatter) {
+        // Annotate each partition of the pileup as a separate task
+        featurePartitions = ANNOTATE_VARIANTS(
+            SCATTER_PILEUP(pileupOutput) | transpose,
+            picardPreAdapter,
+            picardBaitBias,
+            annotateReference.first(),
+        ).featuresTsv
+        featuresTsv = GATHER_FEATURES(
+            featurePartitions
+                | groupTuple
+                | map { mutationType, partitions ->
+                    [mutationType, partitions, getTypeOutdir(params.outdirPreprocess, mutationType), "features.tsv"]
+                }
+        ).gatheredTsv
+    } else {
+        featuresTsv = ANNOTATE_VARIANTS(
+            pileupOutput,
+            picardPreAdapter,
+            picardBaitBias,
+            annotateReference.first(),
+        ).featuresTsv
+        featurePartitions = featuresTsv
+    }
 
     emit:
     featuresTsv
+    featurePartitions
 }
 
 workflow classifyWorkflow {
@@ -301,20 +410,47 @@ workflow classifyWorkflow {
     main:
     inputs = validateInputs()
 
-    inputs.model = inputs.model ?: DOWNLOAD_MODEL(params.mutationType)
+    // Model of each type, provided or downloaded from Hugging Face Hub
+    if (params.mutationType == "both") {
+        if (params.step == "classify") {
+            logError "Error: --mutationType both needs --step full, classify each features tsv by type."
+            exit 1
+        }
+        def typeModels = [snvs: params.snvsModel, indels: params.indelsModel]
+        models = channel.fromList(
+            typeModels.findAll { it.value }.collect { mutationType, model ->
+                [mutationType, file(model, checkIfExists: true)]
+            }
+        ).mix(DOWNLOAD_MODEL(channel.fromList(typeModels.findAll { !it.value }.keySet().toList())))
+    } else {
+        models = inputs.model
+            ? inputs.model.map { model -> [params.mutationType, model] }
+            : DOWNLOAD_MODEL(params.mutationType)
+    }
 
+    // Features (or their partitions) are classified with the model of their type
+    // Scattered partitions are annotated once with --tsv, after they are gathered
     classification = CLASSIFY_RANDOM_FOREST(
-        featuresTsv,
-        inputs.model,
+        featuresTsv.combine(models, by: 0),
         params.modelName,
-        params.mutationType,
-        inputs.tsv
+        params.scatter ? file("${projectDir}/assets/NO_FILE") : inputs.tsv.first()
     )
+    classifiedTsv = classification.classifiedTsv
+
+    if (params.scatter) {
+        classifiedTsv = GATHER_CLASSIFIED(
+            classification.classifiedTsv
+                | groupTuple
+                | map { mutationType, partitions ->
+                    [mutationType, partitions, params.outdir, "classify/classified_df_${mutationType}.tsv"]
+                }
+        ).gatheredTsv
+        if (new File(params.tsv).name != 'NO_FILE') {
+            ANNOTATE_PREDICTIONS(classifiedTsv, params.modelName, inputs.tsv.first())
+        }
+    }
 
-    plots = PLOT_REPORT(
-        classification.classifiedTsv,
-        params.mutationType
-    )
+    plots = PLOT_REPORT(classifiedTsv)
 }
 
 workflow trainWorkflow {
@@ -349,6 +485,7 @@ workflow {
     if (params.version) { showVersion() }
 
     validateSteps()
+    validateScatter()
     showInfo()
     
     def featuresTsv
@@ -359,7 +496,10 @@ workflow {
     }
 
     if (params.step == "classify") {
-        featuresTsv = inputs.features
+        featuresTsv = inputs.features.map { features -> [params.mutationType, features] }
+        if (params.scatter) {
+            featuresTsv = SCATTER_FEATURES(featuresTsv) | transpose
+        }
         classifyWorkflow(featuresTsv)
     }
 
@@ -369,8 +509,8 @@ workflow {
     }
 
     if (params.step == "full") {
-        featuresTsv = preprocessWorkflow()
-        classifyWorkflow(featuresTsv)
+        preprocessWorkflow()
+        classifyWorkflow(preprocessWorkflow.out.featurePartitions)
     }
 }
 
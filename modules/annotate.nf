@@ -1,30 +1,36 @@
+include { getTypeOutdir } from '../utils.nf'
+
 process ANNOTATE_VARIANTS {
-    publishDir "${params.outdirPreprocess}", mode: "copy"
+    publishDir "${getTypeOutdir(params.outdirPreprocess, mutationType)}", mode: "copy", enabled: !params.scatter
 
     input:
-    path pileupOutput
+    tuple val(mutationType), path(pileupOutput)
     path picardPreAdapter
     path picardBaitBias
     path reference
 
     output:
-    path "features.tsv", emit: featuresTsv
+    tuple val(mutationType), path("features.tsv${params.compress && !params.scatter ? '.gz' : ''}"), emit: featuresTsv
+    path "features.tsv.{idx,gz.tbi}", emit: featuresIndex
 
 
     script:
+    def checkpointOption = params.checkpointDir ? "--checkpoint_dir ${params.checkpointDir}" : ""
+    // Partitions are gathered before they are compressed
+    def compressOption = params.compress && !params.scatter ? "--compress --threads ${task.cpus}" : ""
     """
-    annotate_variants.py \\
+    annotate_variants.py ${checkpointOption} ${compressOption} \\
         --pileup ${pileupOutput} \\
         --picard_preadapter ${picardPreAdapter} \\
         --picard_baitbias ${picardBaitBias} \\
         --reference ${reference} \\
         --coverage ${params.coverage} \\
         --median_insert ${params.medianInsert} \\
-        --mutation_type ${params.mutationType} \\
+        --mutation_type ${mutationType} \\
         --outdir \$PWD
 
     rm -rf \\
         ${params.outdirPreprocess}/splits \\
-        ${params.outdirPreprocess}/pileup
+        ${getTypeOutdir(params.outdirPreprocess, mutationType)}/pileup
     """.stripIndent()
 }
@@ -1,11 +1,14 @@
+include { getTypeOutdir } from '../utils.nf'
+
 process DOWNLOAD_MODEL {
     input:
     val mutationType
 
     output:
-    path "model.${mutationType}.joblib", emit: model
+    tuple val(mutationType), path("model.${mutationType}.joblib"), emit: model
 
     script:
+    def uncompress = params.mmapModel ? "True" : "False"
     """
     #!/usr/bin/env python3
 
@@ -20,32 +23,71 @@ process DOWNLOAD_MODEL {
         repo_id="papaemmelab/ffperase",
         filename=f"model.${mutationType}.joblib",
     )
-    shutil.copy(downloaded_file, f"model.${mutationType}.joblib")
+    if ${uncompress}:
+        # Uncompressed models load faster, without gzip inflation
+        import joblib
+
+        model = joblib.load(downloaded_file)
+        joblib.dump(model, f"model.${mutationType}.joblib")
+    else:
+        shutil.copy(downloaded_file, f"model.${mutationType}.joblib")
     """.stripIndent()
 }
 
 
 process CLASSIFY_RANDOM_FOREST {
-    publishDir "${params.outdir}", mode: "copy"
+    publishDir "${params.outdir}", mode: "copy", enabled: !params.scatter, saveAs: { name ->
+        name.startsWith("classify/annotated.tsv") ? getTypeOutdir("classify", mutationType) + "/" + file(name).name : name
+    }
     
     input:
-    path features
-    path model
+    tuple val(mutationType), path(features), path(model)
     val modelName
-    val mutationType
     path tsv
     
     output:
-    path "classify/classified_df_${mutationType}.tsv", emit: classifiedTsv
-    path "classify/annotated.tsv", optional: true, emit: annotatedTsv
+    tuple val(mutationType), path("classify/classified_df_${mutationType}.tsv${params.compress && !params.scatter ? '.gz' : ''}"), emit: classifiedTsv
+    path "classify/classified_df_${mutationType}.tsv.{idx,gz.tbi}", optional: true, emit: classifiedIndex
+    tuple val(mutationType), path("classify/annotated.tsv${params.compress && !params.scatter ? '.gz' : ''}"), optional: true, emit: annotatedTsv
     
     script:
     def tsvOption = tsv.name != 'NO_FILE' ? "--annotated-tsv ${tsv}" : ""
+    def serverOption = params.modelServer ? "--server ${params.modelServer}" : ""
+    def cascadeOption = params.cascade ? "--cascade" : ""
+    def regionOption = params.region ? "--region ${params.region}" : ""
+    def compressOption = params.compress && !params.scatter ? "--compress --threads ${task.cpus}" : ""
+    if (params.cascade && params.cascadeBand != null) {
+        cascadeOption += " --cascade-band ${params.cascadeBand}"
+    }
     """
-    classify_w_random_forest.py ${tsvOption} \\
+    classify_w_random_forest.py ${tsvOption} ${serverOption} ${cascadeOption} ${regionOption} ${compressOption} \\
         --features ${features} \\
         --model ${model} \\
         --model-name ${modelName} \\
         --mutation-type ${mutationType}
     """.stripIndent()
 }
+
+process ANNOTATE_PREDICTIONS {
+    publishDir "${params.outdir}", mode: "copy", saveAs: { name ->
+        getTypeOutdir("classify", mutationType) + "/" + file(name).name
+    }
+
+    input:
+    tuple val(mutationType), path(classified)
+    val modelName
+    path tsv
+
+    output:
+    tuple val(mutationType), path("classify/annotated.tsv${params.compress ? '.gz' : ''}"), emit: annotatedTsv
+
+    script:
+    def compressOption = params.compress ? "--compress --threads ${task.cpus}" : ""
+    """
+    annotate_w_predictions.py ${compressOption} \\
+        --classified ${classified} \\
+        --annotated-tsv ${tsv} \\
+        --model-name ${modelName} \\
+        --outfile classify/annotated.tsv
+    """.stripIndent()
+}
@@ -1,3 +1,4 @@
+include { getTypeOutdir } from '../utils.nf'
 
 process SPLIT_PILEUP {
     input:
@@ -13,6 +14,7 @@ process SPLIT_PILEUP {
     import gzip
     
     ANNOT_LIMIT = ${params.splitPileup}
+    MUTATION_TYPE = '${params.mutationType}'
 
     def open_vcf(filename):
         if filename.endswith('.gz'):
@@ -24,24 +26,34 @@ process SPLIT_PILEUP {
     header = [l for l in lines if l.startswith('#')]
     records = [l for l in lines if not l.startswith('#')]
 
-    for ix, region in enumerate(range(0, len(records), ANNOT_LIMIT)):
-        end = min(len(records), region + ANNOT_LIMIT)
-        output_vcf_path = f'split_{ix}.vcf'
-        with open(output_vcf_path, 'w', encoding='utf-8') as f_out:
-            f_out.write(''.join(header))
-            f_out.write(''.join(records[region:end]))
+    splits = {'split': records}
+    if MUTATION_TYPE == 'both':
+        # Route SNVs and indels to their own splits, piled up in the same pass
+        splits = {'split_snvs': [], 'split_indels': []}
+        for record in records:
+            ref, alt = record.split('\\t')[3:5]
+            is_snv = len(ref) == 1 and all(len(allele) == 1 for allele in alt.split(','))
+            splits['split_snvs' if is_snv else 'split_indels'].append(record)
+
+    for prefix, split_records in splits.items():
+        for ix, region in enumerate(range(0, len(split_records), ANNOT_LIMIT)):
+            end = min(len(split_records), region + ANNOT_LIMIT)
+            output_vcf_path = f'{prefix}_{ix}.vcf'
+            with open(output_vcf_path, 'w', encoding='utf-8') as f_out:
+                f_out.write(''.join(header))
+                f_out.write(''.join(split_records[region:end]))
     """.stripIndent()
 }
 
 process PILEUP {
     input:
-    tuple path(splitVcf), path(bam), path(bai), path(reference)
+    tuple val(mutationType), path(splitVcf), path(bam), path(bai), path(reference)
 
     output:
-    path "pileup_*.txt", emit: pileupVcfs
+    tuple val(mutationType), path("pileup_*.txt"), emit: pileupVcfs
 
     script:
-    def snvsOption = params.mutationType == 'snvs' ? 'true' : 'false'
+    def snvsOption = mutationType == 'snvs' ? 'true' : 'false'
     """
     BASENAME_VCF=\$(basename ${splitVcf} .vcf)
 
@@ -58,15 +70,17 @@ process PILEUP {
 }
 
 process MERGE_PILEUP {
-    publishDir "${params.outdirPreprocess}/pileup", mode: "copy"
+    publishDir "${getTypeOutdir(params.outdirPreprocess, mutationType)}/pileup", mode: "copy"
 
     input:
-    path pileupVcfs
+    tuple val(mutationType), path(pileupVcfs)
 
     output:
-    path "pileup.txt", emit: pileupOutput
+    tuple val(mutationType), path("pileup.txt${params.compress ? '.gz' : ''}"), emit: pileupOutput
+    path "pileup.txt.{idx,gz.tbi}", emit: pileupIndex
 
     script:
+    def compressOption = params.compress ? "--compress --threads ${task.cpus}" : ""
     """
     pileup_files=( ${pileupVcfs} )
     
@@ -77,5 +91,8 @@ process MERGE_PILEUP {
     for f in "\${pileup_files[@]}"; do
         tail -n +2 "\$f" >> pileup.txt
     done
+
+    # Sort by coordinates and index the merged pileup
+    index_variants.py --tsv pileup.txt --sort ${compressOption}
     """.stripIndent()
 }
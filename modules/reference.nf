@@ -0,0 +1,16 @@
+process PREPARE_REFERENCE {
+    storeDir "${params.outdir}/reference"
+
+    input:
+    path reference
+
+    output:
+    path "${reference.baseName}.2bit", emit: twoBit
+
+    script:
+    """
+    prepare_reference.py \\
+        --fasta ${reference} \\
+        --outfile ${reference.baseName}.2bit
+    """.stripIndent()
+}
@@ -1,15 +1,18 @@
+include { getTypeOutdir } from '../utils.nf'
+
 process PLOT_REPORT {
-    publishDir "${params.outdir}/plots", mode: "copy"
+    publishDir "${getTypeOutdir("${params.outdir}/plots", mutationType)}", mode: "copy"
 
     container "papaemmelab/pycirclize:1.9.1"
     
     input:
-    path classifiedTsv
-    val mutationType
+    tuple val(mutationType), path(classifiedTsv)
     
     output:
     path "distributions.png", emit: distributionPlot
     path "circos.png", emit: circosPlot
+    path "summary.json", emit: summary
+    path "summary.tsv", emit: summaryTsv
     
     script:
     template 'plot_report.py'
@@ -0,0 +1,33 @@
+process SCATTER_VARIANTS {
+    input:
+    tuple val(mutationType), path(variantsTsv)
+
+    output:
+    tuple val(mutationType), path("partitions/partition_*.tsv"), emit: partitions
+
+    script:
+    """
+    scatter_variants.py \\
+        --tsv ${variantsTsv} \\
+        --by ${params.scatter} \\
+        --chunks ${params.scatterChunks} \\
+        --outdir partitions
+    """.stripIndent()
+}
+
+process GATHER_VARIANTS {
+    publishDir "${outdir}", mode: "copy"
+
+    input:
+    tuple val(mutationType), path(partitions, stageAs: "partition*/variants.tsv"), val(outdir), val(outfile)
+
+    output:
+    tuple val(mutationType), path("${outfile}${params.compress ? '.gz' : ''}"), emit: gatheredTsv
+    path "${outfile}.{idx,gz.tbi}", optional: true, emit: gatheredIndex
+
+    script:
+    def compressOption = params.compress ? "--compress --threads ${task.cpus}" : ""
+    """
+    gather_variants.py --index ${compressOption} --outfile ${outfile} ${partitions}
+    """.stripIndent()
+}
@@ -1,18 +1,25 @@
 #!/usr/bin/env python3
 
+from concurrent.futures import ProcessPoolExecutor
+import json
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
+from matplotlib.collections import PolyCollection
+from matplotlib.colors import to_rgba
 from matplotlib.gridspec import GridSpec
 from matplotlib.ticker import StrMethodFormatter
-from pycirclize import Circos
+from pycirclize import Circos, config
 
 # Inputs
 TSV = "${classifiedTsv}"
 MUTATION_TYPE = "${mutationType}"
 CHROM_BED = "${workflow.projectDir}/assets/hg19.chrom.bed"
 CYTOBAND = "${workflow.projectDir}/assets/cytoBand.txt"
+DENSITY_THRESHOLD = int("${params.reportDensity}")
+WORKERS = int("${task.cpus}")
 
 # Constants
 COLUMNS = [
@@ -26,17 +33,277 @@ COLUMNS = [
     "ARTIFACT_predicts",
 ]
 LABEL_MAP = {False: "Real", True: "Artifact"}
+LABELS = ["Real", "Artifact"]
+CHROM_ORDER = [str(i) for i in range(1, 23)] + ['X', 'Y']
+OTHER_CHROM = "Other"
+COMPLEMENT = {"A": "T", "C": "G", "G": "C", "T": "A"}
+CIRCOS_COLORS = {
+    "snvs": {
+        "mutation": {
+            "C>T": "#ff0000",
+            "T>C": "#07ee00",
+            "C>A": "#4169e1",
+            "C>G": "#000000",
+            "T>A": "#bebebe",
+            "T>G": "#ff68b4",
+            # reverse strand
+            "G>A": "#ff0000",
+            "A>G": "#07ee00",
+            "G>T": "#4169e1",
+            "G>C": "#000000",
+            "A>T": "#bebebe",
+            "A>C": "#ff68b4",
+        },
+        "label": {
+            "Real": "#000099", 
+            "Artifact": "orange",
+        }
+    },
+    "indels": {
+        "indel": {
+            "del": "#cd5b45",
+            "ins": "#caf374",
+        },
+        "label": {
+            "Real": "#000099", 
+            "Artifact": "orange",
+        }
+    },
+}
+DENSITY_BIN_SIZE = 2000000
+DENSITY_VAF_BINS = 20
+# Circos panels are rendered at the size and dpi they are composed at
+CIRCOS_PANEL_INCHES = 6
+CIRCOS_LEGEND_INCHES = 1
+CIRCOS_DPI = 200
+
+
+def load_layout(chrom_bed=CHROM_BED, cytoband=CYTOBAND):
+    """Parse chromosome sizes and cytobands once for all circos subplots."""
+    bed = pd.read_csv(
+        chrom_bed, sep="\t", header=None, usecols=[0, 1, 2], dtype={0: str}
+    )
+    sectors = {chrom: (start, end) for chrom, start, end in bed.itertuples(index=False)}
+
+    bands = pd.read_csv(
+        cytoband, sep="\t", header=None, usecols=[0, 1, 2, 4],
+        names=["chrom", "start", "end", "stain"], dtype={"chrom": str, "stain": str},
+    )
+    bands["color"] = bands["stain"].map(config.CYTOBAND_COLORMAP).fillna("white")
+    cytobands = {
+        chrom: list(zip(bands_chr["start"], bands_chr["end"], bands_chr["color"]))
+        for chrom, bands_chr in bands.groupby("chrom", sort=False)
+    }
+    return sectors, cytobands
+
+
+def init_circos(layout, title):
+    """Initialize a circos with cytoband tracks from a parsed layout."""
+    sectors, cytobands = layout
+    circos = Circos(sectors, space=2)
+    for sector in circos.sectors:
+        track = sector.add_track((95, 100), name="cytoband")
+        track.axis()
+        for start, end, color in cytobands.get(sector.name, []):
+            track.rect(start, end, fc=color)
+    circos.text(title, size=15)
+    return circos
+
+
+def add_scatter(draws, track, x, y, vmin=0.0, vmax=1.0, **kwargs):
+    """Like track.scatter, with coordinates converted as arrays instead of per point.
+
+    The scatter is appended to `draws`, to plot on the axis after circos.plotfig.
+    """
+    sector = track.parent_sector
+    rad = sector.x_to_rad(np.asarray(x, dtype=float), ignore_range_error=True)
+    r = min(track.r_plot_lim) + track.r_plot_size * (np.asarray(y, dtype=float) - vmin) / (vmax - vmin)
+    draws.append(lambda ax: ax.scatter(rad, r, **kwargs))
+
+
+def add_rects(draws, track, start, end, r_lim, **kwargs):
+    """Like track.rect for many variants or bins, drawn as a single collection.
+
+    Rectangles are at most as wide as the circos arc resolution, so each one is
+    drawn as a plain quadrilateral between its (start, end) and r_lim arrays.
+    """
+    sector = track.parent_sector
+    rad1 = sector.x_to_rad(np.asarray(start, dtype=float), ignore_range_error=True)
+    rad2 = sector.x_to_rad(np.asarray(end, dtype=float), ignore_range_error=True)
+    rad_min, rad_max = np.minimum(rad1, rad2), np.maximum(rad1, rad2)
+    r_min, r_max = r_lim
+    verts = np.stack(
+        [
+            np.column_stack([rad_min, r_min]),
+            np.column_stack([rad_max, r_min]),
+            np.column_stack([rad_max, r_max]),
+            np.column_stack([rad_min, r_max]),
+        ],
+        axis=1,
+    )
+    draws.append(lambda ax: add_polygons(ax, verts, **kwargs))
 
-def plot_bars(df, mutation_type, outfile="distributions.png"):
+
+def add_polygons(ax, verts, **kwargs):
+    """Add (radian, radius) polygons to a polar axis as one collection.
+
+    The polar projection is applied to all the vertices at once, instead of
+    path by path every time the collection is drawn.
+    """
+    projection = ax.transScale + ax.transShift + ax.transProjection
+    xy = projection.transform(verts.reshape(-1, 2)).reshape(verts.shape)
+    collection = PolyCollection(
+        xy,
+        transform=ax.transProjectionAffine + ax.transWedge + ax.transAxes,
+        clip_on=False,
+        **kwargs,
+    )
+    ax.add_collection(collection, autolim=False)
+
+
+def bin_density(sector, df_chr, column, colors):
+    """Count the variants of a sector per color x genomic bin x VAF bin."""
+    color = df_chr[column].map(colors).to_numpy()
+    keep = pd.notnull(color) & df_chr["VAF"].notnull().to_numpy()
+    palette, color_ix = np.unique(color[keep].astype(str), return_inverse=True)
+    n_bins = int(np.ceil(sector.size / DENSITY_BIN_SIZE))
+    genomic_bin = (df_chr["START"].to_numpy()[keep] - sector.start) // DENSITY_BIN_SIZE
+    vaf_bin = (df_chr["VAF"].to_numpy()[keep] * DENSITY_VAF_BINS).astype(int)
+    cell = (
+        color_ix * n_bins + np.clip(genomic_bin, 0, n_bins - 1)
+    ) * DENSITY_VAF_BINS + np.clip(vaf_bin, 0, DENSITY_VAF_BINS - 1)
+    counts = np.bincount(cell, minlength=len(palette) * n_bins * DENSITY_VAF_BINS)
+    return palette, counts.reshape(len(palette), n_bins, DENSITY_VAF_BINS)
+
+
+def add_density(draws, track, palette, counts, vmax):
+    """Draw binned counts as cells of their most frequent color, shaded by count."""
+    total = counts.sum(axis=0)
+    genomic_bin, vaf_bin = np.nonzero(total)
+    if not len(genomic_bin):
+        return
+    rgba = np.array([to_rgba(color) for color in palette])
+    rgba = rgba[counts[:, genomic_bin, vaf_bin].argmax(axis=0)]
+    rgba[:, 3] = 0.15 + 0.85 * np.log1p(total[genomic_bin, vaf_bin]) / np.log1p(vmax)
+
+    sector = track.parent_sector
+    start = sector.start + genomic_bin * DENSITY_BIN_SIZE
+    end = np.minimum(start + DENSITY_BIN_SIZE, sector.end)
+    r_min, r_step = min(track.r_plot_lim), track.r_plot_size / DENSITY_VAF_BINS
+    add_rects(
+        draws, track, start, end,
+        r_lim=(r_min + vaf_bin * r_step, r_min + (vaf_bin + 1) * r_step),
+        facecolors=rgba, edgecolors="none",
+    )
+
+
+def plot_density(draws, densities):
+    """Draw the binned sectors of a circos, shaded relative to its densest cell."""
+    vmax = max([counts.sum(axis=0).max() for _, _, counts in densities] + [1])
+    for track, palette, counts in densities:
+        add_density(draws, track, palette, counts, vmax)
+
+
+def group_subsets(df):
+    """Group the variants of each circos subset by chromosome, once."""
+    by_chrom = dict(tuple(df.groupby("CHR", observed=True, sort=False)))
+    by_label = dict(tuple(df.groupby(["label", "CHR"], observed=True, sort=False)))
+    return [
+        (by_chrom, "FFPE Raw"),
+        ({chrom: d for (lbl, chrom), d in by_label.items() if lbl == "Artifact"}, "FFPE Artifacts"),
+        ({chrom: d for (lbl, chrom), d in by_label.items() if lbl == "Real"}, "FFPE Filtered"),
+    ]
+
+
+def prepare_variants(df, mutation_type):
+    """Add the label, mutation type and ordered chromosome columns to plot."""
+    df["label"] = df["ARTIFACT_predicts"].map(LABEL_MAP)
+    # Chromosomes outside the circos layout (e.g. MT, contigs) are counted as Other
+    chrom = df["CHR"].str.replace("^chr", "", regex=True)
+    other = ~chrom.isin(CHROM_ORDER)
+    df["CHR"] = pd.Categorical(
+        chrom.where(~other, OTHER_CHROM),
+        categories=CHROM_ORDER + ([OTHER_CHROM] if other.any() else []),
+        ordered=True,
+    )
+    if mutation_type == "snvs":
+        df["mutation"] = df["REF"] + ">" + df["ALT"]
+        # Spectrum by pyrimidine reference, as colored in the circos
+        flip = df["REF"].isin(["G", "A"])
+        df["spectrum"] = df["mutation"].where(
+            ~flip, df["REF"].map(COMPLEMENT) + ">" + df["ALT"].map(COMPLEMENT)
+        )
+    else:
+        ref_len, alt_len = df["REF"].str.len(), df["ALT"].str.len()
+        df['indel'] = np.where(ref_len > alt_len, "del", np.where(ref_len < alt_len, "ins", None))
+        df["spectrum"] = df["indel"]
+    return df
+
+
+def get_aggregates(df, mutation_type, threshold=0.5, bins=20):
+    """Aggregate the variants into the counts and histograms the report plots."""
+    prob_col = "ARTIFACT_raw_predicts"
+    labels = df["label"].value_counts().reindex(LABELS, fill_value=0)
+    chromosomes = (
+        pd.crosstab(df["CHR"], df["label"], dropna=False)
+          .reindex(index=df["CHR"].cat.categories, columns=LABELS, fill_value=0)
+    )
+    spectrum = (
+        pd.crosstab(df["spectrum"], df["label"])
+          .reindex(columns=LABELS, fill_value=0)
+    )
+    below, below_edges = np.histogram(df[df[prob_col] < threshold][prob_col], bins=bins)
+    above, above_edges = np.histogram(df[df[prob_col] >= threshold][prob_col], bins=bins)
+    # Fixed bins, to combine the probabilities of several samples
+    edges = np.linspace(0, 1, bins + 1)
+    probability = {
+        lbl: np.histogram(df[df["label"] == lbl][prob_col], bins=edges)[0].tolist()
+        for lbl in LABELS
+    }
+    return {
+        "mutation_type": mutation_type,
+        "variants": int(len(df)),
+        "labels": {lbl: int(count) for lbl, count in labels.items()},
+        "chromosomes": {
+            chrom: {lbl: int(row[lbl]) for lbl in LABELS}
+            for chrom, row in chromosomes.iterrows()
+        },
+        "threshold": threshold,
+        "histograms": {
+            "Real": {"counts": below.tolist(), "edges": below_edges.tolist()},
+            "Artifact": {"counts": above.tolist(), "edges": above_edges.tolist()},
+        },
+        "probability": dict(edges=edges.tolist(), **probability),
+        "spectrum": {
+            str(key): {lbl: int(row[lbl]) for lbl in LABELS}
+            for key, row in spectrum.iterrows()
+        },
+    }
+
+
+def write_summary(aggregates, outfile="summary.json", tsv="summary.tsv"):
+    """Write the report aggregates as json, and as a long tsv to combine samples."""
+    with open(outfile, "w") as summary:
+        json.dump(aggregates, summary, indent=2)
+
+    edges = aggregates["probability"]["edges"]
+    rows = [("labels", "all", *aggregates["labels"].values())]
+    rows += [("chromosome", chrom, *counts.values()) for chrom, counts in aggregates["chromosomes"].items()]
+    rows += [
+        ("probability", f"{edges[i]:.2f}-{edges[i + 1]:.2f}", *[aggregates["probability"][lbl][i] for lbl in LABELS])
+        for i in range(len(edges) - 1)
+    ]
+    rows += [("spectrum", key, *counts.values()) for key, counts in aggregates["spectrum"].items()]
+    pd.DataFrame(rows, columns=["aggregate", "key"] + LABELS).to_csv(tsv, sep="\t", index=False)
+
+
+def plot_bars(aggregates, mutation_type, outfile="distributions.png"):
     """Plot numbers of real vs artifacts."""
     main_color = "#000099" # blue
     colors = [main_color, f"{main_color}22"]
-    threshold = 0.5
-    bins      = 20
+    threshold = aggregates["threshold"]
     bar_width = 0.9
 
-    df["label"] = df["ARTIFACT_predicts"].map(LABEL_MAP)
-
     # Figure 1
     fig = plt.figure(figsize=(12, 8))
     gs  = GridSpec(2, 2, figure=fig,
@@ -50,7 +317,7 @@ def plot_bars(df, mutation_type, outfile="distributions.png"):
     ]
 
     # 1A: Stacked bar 
-    counts = df['label'].value_counts()
+    counts = aggregates["labels"]
     axes[0].bar("Variants", counts["Real"], 
                 color=colors[0], label="Real", 
                 width=bar_width)
@@ -68,14 +335,13 @@ def plot_bars(df, mutation_type, outfile="distributions.png"):
     axes[0].text(0, real_count + art_count/2, f"{art_count:,}", ha='center', va='center', color='black')
     axes[0].set_title(f"Real ({real_pct}) vs Artifact ({art_pct})")
     
-    # 1B: Probability Histogram Split 
-    prob_col = "ARTIFACT_raw_predicts"
-    below = df[df[prob_col] < threshold][prob_col]
-    above = df[df[prob_col] >= threshold][prob_col]
-    axes[1].hist(below, bins=bins,
+    # 1B: Probability Histogram Split, drawn from the binned counts
+    below = aggregates["histograms"]["Real"]
+    above = aggregates["histograms"]["Artifact"]
+    axes[1].hist(below["edges"][:-1], bins=below["edges"], weights=below["counts"],
                  label=f"Real:      Prob < {threshold}",
                  color=colors[0], alpha=1)
-    axes[1].hist(above, bins=bins,
+    axes[1].hist(above["edges"][:-1], bins=above["edges"], weights=above["counts"],
                  label=f"Artifact: Prob ≥ {threshold}",
                  color=colors[0], alpha=0.2)
     axes[1].axvline(threshold, color='gray', linestyle='--', linewidth=1)
@@ -85,16 +351,7 @@ def plot_bars(df, mutation_type, outfile="distributions.png"):
     axes[1].legend(loc='upper center')
     
     # 1C: Per‐Chromosome Stacked Bar
-    chrom_order = [str(i) for i in range(1, 23)] + ['X', 'Y']
-    df['CHR'] = pd.Categorical(df['CHR'], categories=chrom_order, ordered=True)
-    
-    pct_chr = (
-        df.groupby('CHR', observed=False)['label']
-          .value_counts()
-          .unstack(fill_value=0)
-          .reindex(chrom_order)
-          .loc[:, ["Real", "Artifact"]]
-    )
+    pct_chr = pd.DataFrame.from_dict(aggregates["chromosomes"], orient="index")
     
     axes[2].bar(pct_chr.index, pct_chr["Real"],      color=colors[0], label="Real", width=bar_width)
     axes[2].bar(pct_chr.index, pct_chr["Artifact"],  bottom=pct_chr["Real"],
@@ -121,168 +378,99 @@ def plot_bars(df, mutation_type, outfile="distributions.png"):
     fig.savefig(outfile, dpi=100, format="png", bbox_inches="tight")
 
 
-def plot_circos_snvs(df, outfile="circos.png"):
-    """Create circos of pre and post filtering with snvs track."""
-    colors = {
-        "mutation": {
-            "C>T": "#ff0000",
-            "T>C": "#07ee00",
-            "C>A": "#4169e1",
-            "C>G": "#000000",
-            "T>A": "#bebebe",
-            "T>G": "#ff68b4",
-            # reverse strand
-            "G>A": "#ff0000",
-            "A>G": "#07ee00",
-            "G>T": "#4169e1",
-            "G>C": "#000000",
-            "A>T": "#bebebe",
-            "A>C": "#ff68b4",
-        },
-        "label": {
-            "Real": "#000099", 
-            "Artifact": "orange",
-        }
-    }
-    df["mutation"] = df.apply(lambda x: x["REF"] + ">" + x["ALT"], axis=1)
-    
-    # Datasets for each circos
-    subsets = [
-        (df, "FFPE Raw"),
-        (df[df["label"]=="Artifact"], "FFPE Artifacts"),
-        (df[df["label"]=="Real"], "FFPE Filtered"),
-    ]
-    
-    # Create one Matplotlib figure with 3 polar subplots
-    fig = plt.figure(figsize=(6*len(subsets), 12), dpi=150)
-    
-    for i, label in enumerate(colors.keys()):
-        for j, (sub_df, title) in enumerate(subsets):
-            ax = fig.add_subplot(2, 3, 3*i+j+1, polar=True)
-            
-            # 1) Initialize Circos
-            circos = Circos.initialize_from_bed(CHROM_BED, space=2)
-            circos.add_cytoband_tracks((95, 100), CYTOBAND)
-            circos.text(title, size=15)
-            
-            # 2) Scatter track (40–90 radius)
-            for sector in circos.sectors:
-                sector.text(sector.name.replace("chr", ""), size=10)
-                track = sector.add_track((40, 90), r_pad_ratio=0.1)
-                track.axis(alpha=0.4)
-                chrom = sector.name.replace("chr", "")
-                df_chr = sub_df[sub_df["CHR"] == chrom]
-                if df_chr.empty:
-                    continue
-                track.scatter(
-                    df_chr["START"].tolist(),
-                    df_chr["VAF"].tolist(),
-                    s=4, vmin=0.0, vmax=1.0,
-                    color=df_chr[label].map(colors[label]).tolist(),
-                )
-            # 3) Render onto our existing polar axis
-            circos.plotfig(ax=ax)
-    
-    # Create handles for mutation legend
-    mutation_handles = [
-        mpatches.Patch(color=color, label=mut)
-        for mut, color in colors["mutation"].items()
-    ]
-    
-    # Create handles for label legend
-    label_handles = [
-        mpatches.Patch(color=color, label=lbl)
-        for lbl, color in colors["label"].items()
-    ]
-    
-    # Top legend: mutations
-    fig.legend(
-        handles=mutation_handles[:6],
-        title="Mutation Types",
-        loc="upper center",
-        ncol=6,
-        bbox_to_anchor=(0.5, 1.05)
+def add_snvs(draws, track, df_chr, colors):
+    """Scatter snvs by VAF in a sector track."""
+    add_scatter(
+        draws, track,
+        df_chr["START"],
+        df_chr["VAF"],
+        s=4, vmin=0.0, vmax=1.0,
+        color=df_chr["color"].tolist(),
     )
-    
-    # Bottom legend: Real vs Artifact
-    fig.legend(
-        handles=label_handles,
-        title="Classification Type",
-        loc="lower center",
-        ncol=2,
-        bbox_to_anchor=(0.5, -0.05)
+
+
+def add_indels(draws, track, df_chr, colors):
+    """Draw indels by VAF as rectangles in a sector track."""
+    ymin, ymax, offset = 40, 90, 1
+    y = (ymax - ymin) * df_chr['VAF'].to_numpy()
+    y1, y2 = np.maximum(ymin, (y-offset) + ymin), np.minimum(ymax, (y+offset) + ymin)
+    # One collection per sector, colored in rows order as overlaps are drawn
+    color = df_chr["color"].tolist()
+    add_rects(
+        draws, track,
+        df_chr["START"],
+        df_chr["END"],
+        r_lim=(y1, y2),
+        facecolors=color, edgecolors=color, linewidths=1,
     )
-    
-    plt.tight_layout()
-    fig.savefig(outfile, dpi=200, format="png", bbox_inches="tight")
 
-def plot_circos_indels(df, outfile="circos.png"):
-    """Create circos of pre and post filtering with indels track."""
-    colors = {
-        "indel": {
-            "del": "#cd5b45",
-            "ins": "#caf374",
-        },
-        "label": {
-            "Real": "#000099", 
-            "Artifact": "orange",
-        }
-    }
-    def classify_indel(ref, alt):
-        if len(ref) > len(alt):
-            return "del"
-        elif len(ref) < len(alt):
-            return "ins"
-        else:
-            return np.nan
-    
-    df['indel'] = df.apply(lambda x: classify_indel(x["REF"], x["ALT"]), axis=1)
-    
-    # Datasets for each circos
-    subsets = [
-        (df, "FFPE Raw"),
-        (df[df["label"]=="Artifact"], "FFPE Artifacts"),
-        (df[df["label"]=="Real"], "FFPE Filtered"),
-    ]
-    
-    # Create one Matplotlib figure with 3 polar subplots
-    fig = plt.figure(figsize=(6*len(subsets), 12), dpi=150)
-    
-    for i, label in enumerate(colors.keys()):
-        for j, (sub_df, title) in enumerate(subsets):
-            ax = fig.add_subplot(2, 3, 3*i+j+1, polar=True)
-            
-            # 1) Initialize Circos
-            circos = Circos.initialize_from_bed(CHROM_BED, space=2)
-            circos.add_cytoband_tracks((95, 100), CYTOBAND)
-            circos.text(title, size=15)
-            
-            # 2) Scatter track (40–90 radius)
-            for sector in circos.sectors:
-                sector.text(sector.name.replace("chr", ""), size=10)
-                track = sector.add_track((40, 90), r_pad_ratio=0.1)
-                track.axis(alpha=0.4)
-                chrom = sector.name.replace("chr", "")
-                df_chr = sub_df[(sub_df['CHR'] == chrom) & (sub_df['indel'].notnull())]
-                if df_chr.empty:
-                    continue
-                for _, row in df_chr.iterrows():
-                    ymin, ymax, offset = 40, 90, 1
-                    y =  (ymax - ymin) * row['VAF']
-                    y1, y2 = max(ymin, (y-offset) + ymin), min(ymax, (y+offset) + ymin)   
-                    x1, x2 = row["START"], row["END"]
-                    color = colors[label][row[label]]
-                    track.rect(x1, x2, r_lim=(y1, y2), 
-                               fc=color, ec=color, lw=1)
-    
-            # 3) Render onto our existing polar axis
-            circos.plotfig(ax=ax)
-    
+
+TRACKS = {"snvs": add_snvs, "indels": add_indels}
+
+
+def plot_circos_panel(mutation_type, chrom_dfs, title, label, layout, density=False):
+    """Render one circos of pre or post filtering variants, as an RGBA image.
+
+    Variants are colored by the `label` column. With `density`, they are drawn
+    as genomic x VAF bins instead of one mark per variant.
+    """
+    colors = CIRCOS_COLORS[mutation_type][label]
+    fig = plt.figure(figsize=(CIRCOS_PANEL_INCHES, CIRCOS_PANEL_INCHES), dpi=CIRCOS_DPI)
+    ax = fig.add_axes([0.05, 0.05, 0.9, 0.9], polar=True)
+
+    # 1) Initialize Circos
+    circos = init_circos(layout, f"{title} (binned)" if density else title)
+    draws, densities = [], []
+
+    # 2) Variants track (40–90 radius)
+    for sector in circos.sectors:
+        sector.text(sector.name.replace("chr", ""), size=10)
+        track = sector.add_track((40, 90), r_pad_ratio=0.1)
+        track.axis(alpha=0.4)
+        chrom = sector.name.replace("chr", "")
+        df_chr = chrom_dfs.get(chrom)
+        if df_chr is None:
+            continue
+        if density:
+            densities.append((track, *bin_density(sector, df_chr, label, colors)))
+            continue
+        df_chr = df_chr.assign(color=df_chr[label].map(colors))
+        TRACKS[mutation_type](draws, track, df_chr, colors)
+    plot_density(draws, densities)
+
+    # 3) Render onto the panel polar axis
+    circos.plotfig(ax=ax)
+    for draw in draws:
+        draw(ax)
+    fig.canvas.draw()
+    image = np.asarray(fig.canvas.buffer_rgba()).copy()
+    plt.close(fig)
+    return image
+
+
+def compose_circos(panels, mutation_type, outfile="circos.png"):
+    """Compose the rendered circos panels in a 2 x 3 figure with legends.
+
+    Panels are placed pixel for pixel, without resampling, between a band
+    for each legend.
+    """
+    colors = CIRCOS_COLORS[mutation_type]
+    type_colors = colors["mutation" if mutation_type == "snvs" else "indel"]
+
+    panel_px = CIRCOS_PANEL_INCHES * CIRCOS_DPI
+    legend_px = CIRCOS_LEGEND_INCHES * CIRCOS_DPI
+    fig = plt.figure(
+        figsize=(3 * CIRCOS_PANEL_INCHES, 2 * CIRCOS_PANEL_INCHES + 2 * CIRCOS_LEGEND_INCHES),
+        dpi=CIRCOS_DPI,
+    )
+    for i, panel in enumerate(panels):
+        row, col = divmod(i, 3)
+        fig.figimage(panel, xo=col * panel_px, yo=legend_px + (1 - row) * panel_px, origin="upper")
     
     # Create handles for mutation legend
     mutation_handles = [
         mpatches.Patch(color=color, label=mut)
-        for mut, color in colors["indel"].items()
+        for mut, color in type_colors.items()
     ]
     
     # Create handles for label legend
@@ -297,7 +485,7 @@ def plot_circos_indels(df, outfile="circos.png"):
         title="Mutation Types",
         loc="upper center",
         ncol=6,
-        bbox_to_anchor=(0.5, 1.05)
+        bbox_to_anchor=(0.5, 1.0)
     )
     
     # Bottom legend: Real vs Artifact
@@ -306,21 +494,42 @@ def plot_circos_indels(df, outfile="circos.png"):
         title="Classification Type",
         loc="lower center",
         ncol=2,
-        bbox_to_anchor=(0.5, -0.05)
+        bbox_to_anchor=(0.5, 0.0)
     )
-    
-    plt.tight_layout()
-    fig.savefig(outfile, dpi=200, format="png", bbox_inches="tight")
 
-def plot_circos(df, mutation_type, outfile="circos.png"):
-    """Select proper tracks to plot in circos."""
-    if mutation_type == "snvs":
-        plot_circos_snvs(df, outfile)
-    elif mutation_type == "indels":
-        plot_circos_indels(df, outfile)
+    # The whole figure, as pycirclize sets savefig.bbox to tight
+    fig.savefig(outfile, dpi=CIRCOS_DPI, format="png", bbox_inches=fig.bbox_inches)
+    plt.close(fig)
+
+
+def run_tasks(tasks, workers=1):
+    """Run (function, args) tasks in a process pool, returning results in order."""
+    if workers <= 1:
+        return [function(*args) for function, args in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(function, *args) for function, args in tasks]
+        return [future.result() for future in futures]
+
+
+def main():
+    df = pd.read_csv(TSV, sep="\t", usecols=COLUMNS, dtype={"CHR": str})[COLUMNS]
+    df = prepare_variants(df, MUTATION_TYPE)
+    aggregates = get_aggregates(df, MUTATION_TYPE)
+    write_summary(aggregates)
+
+    # Circos of all, artifact and real variants, colored by type and by label
+    type_col = "mutation" if MUTATION_TYPE == "snvs" else "indel"
+    variants = df[df[type_col].notnull()][["CHR", "START", "END", "VAF", "label", type_col]]
+    layout = load_layout()
+    density = len(df) > DENSITY_THRESHOLD
+    panels = [
+        (plot_circos_panel, (MUTATION_TYPE, chrom_dfs, title, label, layout, density))
+        for label in [type_col, "label"]
+        for chrom_dfs, title in group_subsets(variants)
+    ]
+    results = run_tasks([(plot_bars, (aggregates, MUTATION_TYPE))] + panels, WORKERS)
+    compose_circos(results[1:], MUTATION_TYPE)
 
 
-df = pd.read_csv(TSV, sep="\t")[COLUMNS]
-df['CHR'] = df['CHR'].astype(str)
-plot_bars(df, MUTATION_TYPE)
-plot_circos(df, MUTATION_TYPE)
+if __name__ == "__main__":
+    main()
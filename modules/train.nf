@@ -13,12 +13,14 @@ process TRAIN_RANDOM_FOREST {
     
     script:
     def modelOption = modelPath != '' ? "--pretrained-model ${modelPath}" : ""
+    def compressOption = params.mmapModel ? "--no-compress" : ""
     
     """
-    train_random_forest.py ${modelOption} \\
+    train_random_forest.py ${modelOption} ${compressOption} \\
         --features ${features} \\
         --label-col ${labelCol} \\
         --model-name ${modelName} \\
-        --mutation-type ${mutationType}
+        --mutation-type ${mutationType} \\
+        --threads ${task.cpus}
     """.stripIndent()
 }
\ No newline at end of file
@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+generate_synthetic.py
+
+Generate a synthetic FFPE sample to benchmark the pipeline at a chosen size,
+offline and deterministically:
+
+1) A random reference fasta, with its .fai and .dict, and a bed of its contigs.
+2) A coordinate-sorted and indexed paired-end bam with `--reads` reads, with
+   real SNVs at clonal/subclonal VAFs on both read orientations, and C>T
+   deamination-style artifacts at low VAF on a single read orientation
+   (G>A on the reverse strand), plus random sequencing errors.
+3) A vcf with the `--variants` SNVs, and a truth tsv with their labels.
+4) A `params.yaml` to run the pipeline on them with `-params-file`, and a
+   `synthetic.json` with the sample size.
+
+Example usage:
+    generate_synthetic.py --outdir data/v1000 --variants 1000 --reads 200000
+"""
+from hashlib import md5
+from pathlib import Path
+import argparse
+import array
+import json
+
+import numpy as np
+import pysam
+
+BASES = np.frombuffer(b"ACGT", dtype=np.uint8)
+COMPLEMENT = {"A": "T", "C": "G", "G": "C", "T": "A"}
+READ_GROUP = "synthetic"
+
+
+def write_reference(outdir, chrom_lengths, rng):
+    """
+    Write a random reference fasta with its .fai and .dict indexes.
+
+    Arguments:
+        outdir (Path): Output directory.
+        chrom_lengths (dict): Length of each contig.
+        rng (np.random.Generator): Random generator.
+
+    Returns:
+        tuple: path to the fasta, and dict with the sequence of each contig.
+    """
+    fasta_path = outdir / "reference.fasta"
+    sequences = {}
+    with open(fasta_path, "w") as fasta, open(outdir / "reference.dict", "w") as seq_dict:
+        seq_dict.write("@HD\tVN:1.6\n")
+        for chrom, length in chrom_lengths.items():
+            seq = BASES[rng.choice(4, size=length, p=[0.295, 0.205, 0.205, 0.295])].tobytes()
+            sequences[chrom] = seq
+            fasta.write(f">{chrom}\n")
+            for start in range(0, length, 60):
+                fasta.write(seq[start : start + 60].decode() + "\n")
+            seq_dict.write(
+                f"@SQ\tSN:{chrom}\tLN:{length}\tM5:{md5(seq).hexdigest()}\t"
+                f"UR:file:{fasta_path.resolve()}\n"
+            )
+    pysam.faidx(str(fasta_path))
+    with open(outdir / "reference.bed", "w") as bed:
+        for chrom, length in chrom_lengths.items():
+            bed.write(f"{chrom}\t0\t{length}\n")
+    return fasta_path, sequences
+
+
+def get_variants(sequences, n_variants, artifact_fraction, read_length, rng):
+    """
+    Pick the positions, alleles and VAFs of real variants and artifacts.
+
+    Artifacts are C>T (or G>A) changes at low VAF, carried only by fragments
+    of one read orientation, as deamination during FFPE fixation.
+
+    Returns:
+        dict: per contig, sorted positions, ref, alt, vaf and artifact arrays.
+    """
+    genome_length = sum(len(seq) for seq in sequences.values())
+    variants = {}
+    for chrom, seq in sequences.items():
+        n_chrom = int(round(n_variants * len(seq) / genome_length))
+        # Keep variants away from the contig ends and from each other
+        candidates = np.arange(read_length, len(seq) - read_length, 3)
+        n_chrom = min(n_chrom, len(candidates))
+        # Artifacts only at C/G references
+        is_cg = np.isin(np.frombuffer(seq, dtype=np.uint8)[candidates], [ord("C"), ord("G")])
+        n_artifacts = min(int(round(n_chrom * artifact_fraction)), is_cg.sum())
+        artifact_positions = rng.choice(candidates[is_cg], size=n_artifacts, replace=False)
+        real_positions = rng.choice(
+            np.setdiff1d(candidates, artifact_positions), size=n_chrom - n_artifacts, replace=False
+        )
+        positions = np.concatenate([artifact_positions, real_positions])
+        artifact = np.arange(n_chrom) < n_artifacts
+        order = np.argsort(positions)
+        positions, artifact = positions[order], artifact[order]
+        refs = np.frombuffer(seq, dtype=np.uint8)[positions]
+        alts = BASES[(np.searchsorted(BASES, refs) + rng.integers(1, 4, len(positions))) % 4]
+        alts[artifact & (refs == ord("C"))] = ord("T")
+        alts[artifact & (refs == ord("G"))] = ord("A")
+        vafs = np.where(
+            artifact,
+            rng.uniform(0.02, 0.12, len(positions)),
+            np.clip(rng.beta(2, 3, len(positions)), 0.05, 0.95),
+        )
+        variants[chrom] = dict(
+            positions=positions, refs=refs, alts=alts, vafs=vafs, artifact=artifact
+        )
+    return variants
+
+
+def write_variants(outdir, chrom_lengths, variants):
+    """Write the variants vcf and the truth tsv with their labels."""
+    with open(outdir / "variants.vcf", "w") as vcf, open(outdir / "truth.tsv", "w") as truth:
+        vcf.write("##fileformat=VCFv4.1\n")
+        vcf.write('##FILTER=<ID=PASS,Description="All filters passed">\n')
+        vcf.write('##INFO=<ID=VAF,Number=1,Type=Float,Description="Simulated VAF">\n')
+        vcf.write('##INFO=<ID=ARTIFACT,Number=0,Type=Flag,Description="Simulated artifact">\n')
+        for chrom, length in chrom_lengths.items():
+            vcf.write(f"##contig=<ID={chrom},length={length}>\n")
+        vcf.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        truth.write("CHR\tSTART\tREF\tALT\tVAF\tLABEL\n")
+        for chrom, chrom_variants in variants.items():
+            for pos, ref, alt, vaf, artifact in zip(*chrom_variants.values()):
+                ref, alt = chr(ref), chr(alt)
+                info = f"VAF={vaf:.4f}" + (";ARTIFACT" if artifact else "")
+                vcf.write(f"{chrom}\t{pos + 1}\t.\t{ref}\t{alt}\t.\tPASS\t{info}\n")
+                truth.write(f"{chrom}\t{pos + 1}\t{ref}\t{alt}\t{vaf:.4f}\t{int(artifact)}\n")
+
+
+def write_reads(
+    outdir, sequences, variants, n_reads, read_length, insert_size, insert_sd, error_rate, rng
+):
+    """
+    Write a sorted and indexed paired-end bam with the simulated fragments.
+
+    Returns:
+        Path: path to the bam.
+    """
+    header = {
+        "HD": {"VN": "1.6", "SO": "unsorted"},
+        "SQ": [{"SN": chrom, "LN": len(seq)} for chrom, seq in sequences.items()],
+        "RG": [{"ID": READ_GROUP, "SM": READ_GROUP, "LB": READ_GROUP, "PL": "ILLUMINA"}],
+    }
+    genome_length = sum(len(seq) for seq in sequences.values())
+    qualities = array.array("B", [35] * read_length)
+    unsorted_path = outdir / "unsorted.bam"
+    n_fragment = 0
+    with pysam.AlignmentFile(str(unsorted_path), "wb", header=header) as bam:
+        for tid, (chrom, seq) in enumerate(sequences.items()):
+            chrom_variants = variants[chrom]
+            positions = chrom_variants["positions"]
+            n_fragments = int(n_reads * len(seq) / genome_length) // 2
+            inserts = np.clip(
+                rng.normal(insert_size, insert_sd, n_fragments).astype(int),
+                read_length,
+                3 * insert_size,
+            )
+            starts = np.sort(rng.integers(0, len(seq) - inserts.max(), n_fragments))
+            read1_forward = rng.random(n_fragments) < 0.5
+            for start, insert, forward in zip(starts, inserts, read1_forward):
+                fragment = bytearray(seq[start : start + insert])
+                # Alleles carried by the fragment, artifacts on one orientation
+                lo, hi = np.searchsorted(positions, [start, start + insert])
+                for ix in range(lo, hi):
+                    if chrom_variants["artifact"][ix]:
+                        on_strand = forward == (chrom_variants["refs"][ix] == ord("C"))
+                        carried = on_strand and rng.random() < 2 * chrom_variants["vafs"][ix]
+                    else:
+                        carried = rng.random() < chrom_variants["vafs"][ix]
+                    if carried:
+                        fragment[positions[ix] - start] = chrom_variants["alts"][ix]
+
+                mates = [(start, 0), (start + insert - read_length, insert - read_length)]
+                for mate, (mate_start, offset) in enumerate(mates):
+                    read_seq = bytearray(fragment[offset : offset + read_length])
+                    for error in np.flatnonzero(rng.random(read_length) < error_rate):
+                        read_seq[error] = BASES[(np.searchsorted(BASES, read_seq[error]) + rng.integers(1, 4)) % 4]
+                    reference = seq[mate_start : mate_start + read_length]
+                    is_read1 = (mate == 0) == forward
+                    reverse = mate == 1
+                    read = pysam.AlignedSegment()
+                    read.query_name = f"frag{n_fragment}"
+                    read.flag = (
+                        0x1 | 0x2
+                        | (0x10 if reverse else 0x20)
+                        | (0x40 if is_read1 else 0x80)
+                    )
+                    read.reference_id = tid
+                    read.reference_start = int(mate_start)
+                    read.mapping_quality = 60
+                    read.cigartuples = [(0, read_length)]
+                    read.next_reference_id = tid
+                    read.next_reference_start = int(mates[1 - mate][0])
+                    read.template_length = int(insert) if mate == 0 else -int(insert)
+                    read.query_sequence = read_seq.decode()
+                    read.query_qualities = qualities
+                    read.set_tag("NM", sum(a != b for a, b in zip(read_seq, reference)))
+                    read.set_tag("RG", READ_GROUP)
+                    bam.write(read)
+                n_fragment += 1
+
+    bam_path = outdir / "tumor.bam"
+    pysam.sort("-o", str(bam_path), str(unsorted_path))
+    pysam.index(str(bam_path))
+    unsorted_path.unlink()
+    return bam_path, 2 * n_fragment
+
+
+def generate_synthetic(
+    outdir,
+    n_variants,
+    n_reads,
+    n_chroms=4,
+    genome_length=None,
+    artifact_fraction=0.5,
+    read_length=100,
+    insert_size=250,
+    insert_sd=30,
+    error_rate=0.001,
+    seed=42,
+):
+    """
+    Generate a synthetic FFPE sample and the params to run the pipeline on it.
+
+    Arguments:
+        outdir (str): Output directory.
+        n_variants (int): Number of SNVs in the vcf.
+        n_reads (int): Number of reads in the bam.
+        n_chroms (int): Number of contigs, named 1, 2, ...
+        genome_length (int, optional): Reference length, defaults to 1kb per
+            variant (min 1Mb), so variants are as sparse at every size.
+        artifact_fraction (float): Fraction of variants simulated as artifacts.
+        read_length (int): Length of the reads.
+        insert_size (int): Mean fragment length.
+        insert_sd (int): Standard deviation of the fragment length.
+        error_rate (float): Per base sequencing error rate.
+        seed (int): Random seed.
+
+    Returns:
+        dict: size of the sample.
+    """
+    outdir = Path(outdir)
+    outdir.mkdir(parents=True, exist_ok=True)
+    rng = np.random.default_rng(seed)
+
+    genome_length = genome_length or max(1000000, 1000 * n_variants)
+    chrom_lengths = {str(i + 1): genome_length // n_chroms for i in range(n_chroms)}
+    fasta_path, sequences = write_reference(outdir, chrom_lengths, rng)
+    variants = get_variants(sequences, n_variants, artifact_fraction, read_length, rng)
+    write_variants(outdir, chrom_lengths, variants)
+    print(f"[INFO] Simulating {n_reads} reads...")
+    bam_path, n_reads = write_reads(
+        outdir, sequences, variants, n_reads, read_length, insert_size, insert_sd, error_rate, rng
+    )
+
+    coverage = n_reads * read_length / sum(chrom_lengths.values())
+    size = {
+        "variants": int(sum(len(v["positions"]) for v in variants.values())),
+        "artifacts": int(sum(v["artifact"].sum() for v in variants.values())),
+        "reads": n_reads,
+        "genome_length": sum(chrom_lengths.values()),
+        "coverage": round(coverage, 2),
+    }
+    with open(outdir / "synthetic.json", "w") as synthetic:
+        json.dump(size, synthetic, indent=2)
+    with open(outdir / "params.yaml", "w") as params:
+        params.write(f"vcf: {(outdir / 'variants.vcf').resolve()}\n")
+        params.write(f"bam: {bam_path.resolve()}\n")
+        params.write(f"reference: {fasta_path.resolve()}\n")
+        params.write(f"bed: {(outdir / 'reference.bed').resolve()}\n")
+        params.write(f"coverage: {max(1, int(round(coverage)))}\n")
+        params.write(f"medianInsert: {insert_size}\n")
+    print(f"[INFO] Done! Synthetic sample written to {outdir}: {size}")
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Generate a synthetic FFPE bam, vcf and reference to benchmark the pipeline."
+    )
+    parser.add_argument("--outdir", required=True, help="Directory to write the sample.")
+    parser.add_argument("--variants", type=int, required=True, help="Number of SNVs.")
+    parser.add_argument("--reads", type=int, required=True, help="Number of reads.")
+    parser.add_argument("--chroms", type=int, default=4, help="Number of contigs.")
+    parser.add_argument(
+        "--genome-length",
+        type=int,
+        default=None,
+        help="Reference length. [default: 1kb per variant, min 1Mb]",
+    )
+    parser.add_argument(
+        "--artifact-fraction",
+        type=float,
+        default=0.5,
+        help="Fraction of variants simulated as C>T artifacts.",
+    )
+    parser.add_argument("--read-length", type=int, default=100, help="Read length.")
+    parser.add_argument("--insert-size", type=int, default=250, help="Mean insert size.")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed.")
+    args = parser.parse_args()
+
+    generate_synthetic(
+        outdir=args.outdir,
+        n_variants=args.variants,
+        n_reads=args.reads,
+        n_chroms=args.chroms,
+        genome_length=args.genome_length,
+        artifact_fraction=args.artifact_fraction,
+        read_length=args.read_length,
+        insert_size=args.insert_size,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
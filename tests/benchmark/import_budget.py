@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+import_budget.py
+
+Check the start-up cost of the bin/ entry points. Every scattered task starts
+a new interpreter, so heavy modules should only be imported on the code paths
+that need them:
+
+1) Import each script with `python -X importtime` (Python >= 3.7).
+2) Fail if a module that should be deferred was imported at start-up.
+3) Fail if the cumulative import time is over the script budget, scaled with
+   `--scale` for slower machines.
+
+Example usage:
+    import_budget.py --scale 2 --top 5
+"""
+from pathlib import Path
+import argparse
+import subprocess
+import sys
+
+BIN_DIR = Path(__file__).resolve().parents[2] / "bin"
+
+# Script: (import budget in ms, modules that must not be imported at start-up)
+BUDGETS = {
+    "annotate_variants": (400, ["scipy", "pysam", "ffperase.microrep"]),
+    "annotate_w_predictions": (100, ["numpy", "pandas", "joblib", "scipy", "sklearn"]),
+    "classify_w_random_forest": (100, ["numpy", "pandas", "joblib", "scipy", "sklearn"]),
+    "collect_picard": (400, ["scipy", "sklearn"]),
+    "convert_model": (500, ["sklearn", "imblearn"]),
+    "ffperase": (20, ["numpy", "pandas"]),
+    "ffperase.stage_profiler": (50, ["numpy", "pandas"]),
+    "gather_variants": (50, ["numpy", "pandas"]),
+    "scatter_variants": (50, ["numpy", "pandas"]),
+    "index_variants": (50, ["numpy", "pandas"]),
+    "prepare_reference": (50, ["numpy", "pandas", "pysam"]),
+    "serve_random_forest": (100, ["numpy", "pandas", "joblib", "sklearn"]),
+    "slim_random_forest": (400, ["joblib", "scipy", "sklearn", "imblearn"]),
+    "summarize_profiles": (400, ["scipy", "sklearn"]),
+    "train_incremental": (400, ["joblib", "scipy", "sklearn", "imblearn"]),
+    "train_random_forest": (400, ["joblib", "scipy", "sklearn", "imblearn"]),
+}
+
+
+def get_import_times(script, python=sys.executable):
+    """
+    Import a bin/ script in a new interpreter with `-X importtime`.
+
+    Arguments:
+        script (str): Module name of the script.
+        python (str): Python interpreter to use.
+
+    Returns:
+        dict: cumulative import time in ms per imported module.
+    """
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {script}"],
+        cwd=str(BIN_DIR),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Failed to import {script}:\n{result.stderr}")
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative) / 1000
+    return times
+
+
+def check_budget(script, budget_ms, deferred, scale=1.0, top=3):
+    """
+    Check the start-up imports of a script against its budget.
+
+    Returns:
+        list: budget violations, empty if the script is within budget.
+    """
+    times = get_import_times(script)
+    total = times[script]
+    errors = []
+    imported = [
+        name for name in deferred
+        if any(module == name or module.startswith(f"{name}.") for module in times)
+    ]
+    if imported:
+        errors.append(f"{script} imports {', '.join(imported)} at start-up")
+    if total > budget_ms * scale:
+        errors.append(f"{script} imports in {total:.0f} ms, over its {budget_ms * scale:.0f} ms budget")
+
+    # Heaviest modules imported directly by the script
+    direct = {
+        module: ms for module, ms in times.items()
+        if module != script and "." not in module
+    }
+    heaviest = sorted(direct.items(), key=lambda item: -item[1])[:top]
+    status = "FAIL" if errors else "ok"
+    print(
+        f"[{status}] {script}: {total:.0f} ms / {budget_ms * scale:.0f} ms "
+        f"({', '.join(f'{module} {ms:.0f} ms' for module, ms in heaviest)})"
+    )
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Check the import time budget of the bin/ entry points."
+    )
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Scale the budgets for slower machines."
+    )
+    parser.add_argument(
+        "--top", type=int, default=3, help="Number of heaviest imports to show per script."
+    )
+    parser.add_argument(
+        "scripts", nargs="*", default=sorted(BUDGETS), help="Scripts to check. [default: all]"
+    )
+    args = parser.parse_args()
+
+    if sys.version_info < (3, 7):
+        parser.error("-X importtime needs Python >= 3.7")
+
+    errors = []
+    for script in args.scripts:
+        budget_ms, deferred = BUDGETS[script]
+        errors += check_budget(script, budget_ms, deferred, args.scale, args.top)
+    for error in errors:
+        print(f"[ERROR] {error}")
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == "__main__":
+    main()
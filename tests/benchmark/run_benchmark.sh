@@ -0,0 +1,46 @@
+#!/bin/bash
+# Run the pipeline on synthetic samples of increasing size, and report how
+# each stage scales with the number of variants and reads.
+#
+# usage: tests/benchmark/run_benchmark.sh [variants:reads ...]
+#   e.g. tests/benchmark/run_benchmark.sh 1000:200000 10000:2000000 100000:20000000
+#
+# Extra nextflow profiles go in BENCHMARK_PROFILES, e.g. BENCHMARK_PROFILES=cloud
+# to run the tasks in the pipeline container.
+set -euo pipefail
+
+cd "$(dirname "$0")/../.."
+BENCHMARK_DIR=tests/benchmark
+SIZES=${*:-"1000:200000 10000:2000000"}
+PROFILES=benchmark${BENCHMARK_PROFILES:+,${BENCHMARK_PROFILES}}
+
+for size in ${SIZES}; do
+    variants=${size%%:*}
+    reads=${size##*:}
+    label=v${variants}_r${reads}
+    data=${BENCHMARK_DIR}/data/${label}
+    results=${BENCHMARK_DIR}/results/${label}
+
+    if [ ! -f "${data}/params.yaml" ]; then
+        python ${BENCHMARK_DIR}/generate_synthetic.py \
+            --outdir "${data}" \
+            --variants "${variants}" \
+            --reads "${reads}"
+    fi
+
+    nextflow run main.nf \
+        -profile "${PROFILES}" \
+        -params-file "${data}/params.yaml" \
+        -work-dir "${results}/work" \
+        -with-trace "${results}/trace.txt" \
+        --outdir "${results}"
+
+    python bin/summarize_profiles.py \
+        --dir "${results}/work" \
+        --outfile "${results}/profile_summary.tsv"
+done
+
+python ${BENCHMARK_DIR}/scaling_report.py \
+    --data ${BENCHMARK_DIR}/data \
+    --results ${BENCHMARK_DIR}/results \
+    --outfile ${BENCHMARK_DIR}/results/scaling_report.tsv
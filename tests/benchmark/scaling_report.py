@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+scaling_report.py
+
+Report how each stage of the pipeline scales with the sample size, from the
+raw nextflow traces of the benchmark runs:
+
+1) Read the size of each synthetic sample (`<data>/<label>/synthetic.json`)
+   and the trace of its run (`<results>/<label>/trace.txt`).
+2) Per process: tasks, wall time from the first start to the last completion,
+   CPU-hours (realtime x %cpu) and peak RSS.
+3) Fit the log-log slope of wall time and CPU-hours vs. variants and reads,
+   ~1 for linear stages, ~0 for fixed costs.
+
+Example usage:
+    scaling_report.py --data data --results results --outfile scaling_report.tsv
+"""
+from pathlib import Path
+import argparse
+import json
+
+import numpy as np
+import pandas as pd
+
+
+def read_trace(trace_path):
+    """
+    Aggregate a raw nextflow trace by process.
+
+    Arguments:
+        trace_path (str): Trace written with `trace.raw = true`.
+
+    Returns:
+        pd.DataFrame: tasks, wall seconds, cpu hours and peak RSS per process.
+    """
+    trace = pd.read_csv(trace_path, sep="\t", na_values=["-"])
+    trace = trace[trace["status"].isin(["COMPLETED", "CACHED"])].copy()
+    trace["process"] = trace["process"].str.split(":").str[-1]
+    trace["cpu_hours"] = trace["realtime"] / 1000 * trace["%cpu"].fillna(100) / 100 / 3600
+    grouped = trace.groupby("process")
+    stages = pd.DataFrame(
+        {
+            "tasks": grouped.size(),
+            "wall_seconds": (grouped["complete"].max() - grouped["start"].min()) / 1000,
+            "cpu_hours": grouped["cpu_hours"].sum(),
+            "peak_rss_mb": grouped["peak_rss"].max() / 1024 ** 2,
+        }
+    )
+    stages.loc["TOTAL"] = [
+        len(trace),
+        (trace["complete"].max() - trace["start"].min()) / 1000,
+        trace["cpu_hours"].sum(),
+        trace["peak_rss"].max() / 1024 ** 2,
+    ]
+    stages["tasks"] = stages["tasks"].astype(int)
+    return stages.reset_index().rename(columns={"index": "process"})
+
+
+def get_scaling(report):
+    """
+    Fit the log-log slope of each process cost vs. the sample size.
+
+    Arguments:
+        report (pd.DataFrame): Stages of every benchmark run.
+
+    Returns:
+        pd.DataFrame: slopes per process, NaN with fewer than 2 sizes.
+    """
+    rows = []
+    for process, stages in report.groupby("process", sort=False):
+        row = {"process": process}
+        for size in ["variants", "reads"]:
+            for cost in ["wall_seconds", "cpu_hours"]:
+                valid = stages[(stages[size] > 0) & (stages[cost] > 0)]
+                slope = np.nan
+                if valid[size].nunique() > 1:
+                    slope = np.polyfit(np.log(valid[size]), np.log(valid[cost]), 1)[0]
+                row[f"{cost}_vs_{size}"] = slope
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def scaling_report(data_dir, results_dir, outfile):
+    """
+    Write the per-stage costs of every benchmark run and their scaling.
+
+    Arguments:
+        data_dir (str): Directory with a synthetic sample per size.
+        results_dir (str): Directory with a run per size.
+        outfile (str): Path to the report tsv, slopes are written next to it.
+
+    Returns:
+        tuple: report and scaling dataframes.
+    """
+    runs = []
+    for trace_path in sorted(Path(results_dir).glob("*/trace.txt")):
+        label = trace_path.parent.name
+        with open(Path(data_dir) / label / "synthetic.json", "r", encoding="utf-8") as size_file:
+            size = json.load(size_file)
+        stages = read_trace(trace_path)
+        stages.insert(0, "run", label)
+        stages.insert(1, "variants", size["variants"])
+        stages.insert(2, "reads", size["reads"])
+        runs.append(stages)
+    if not runs:
+        raise FileNotFoundError(f"No */trace.txt runs found in {results_dir}")
+
+    report = pd.concat(runs, ignore_index=True).sort_values(["variants", "reads"], kind="mergesort")
+    scaling = get_scaling(report)
+    report.to_csv(outfile, sep="\t", index=False, float_format="%.6f")
+    scaling_path = Path(outfile).with_name(f"{Path(outfile).stem}.slopes.tsv")
+    scaling.to_csv(scaling_path, sep="\t", index=False, float_format="%.3f")
+
+    pd.options.display.float_format = "{:.2f}".format
+    print(report.pivot_table(index="process", columns="variants", values="wall_seconds").to_string())
+    print(scaling.to_string(index=False))
+    print(f"[INFO] Done! Scaling report written to {outfile} and {scaling_path}")
+    return report, scaling
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Report how the pipeline stages scale with variants and reads."
+    )
+    parser.add_argument(
+        "--data", required=True, help="Directory with the synthetic samples."
+    )
+    parser.add_argument(
+        "--results", required=True, help="Directory with the benchmark runs."
+    )
+    parser.add_argument(
+        "--outfile", default="scaling_report.tsv", help="Path to the report tsv."
+    )
+    args = parser.parse_args()
+    scaling_report(args.data, args.results, args.outfile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+conftest.py
+
+Synthetic snvs features and a small Random Forest trained on them, shared by
+the classification and training tests.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "bin"))
+
+from ffperase.train import get_feature_columns  # noqa: E402
+
+BASES = ["A", "C", "G", "T"]
+
+
+def make_features(n_rows=400, seed=0, missing=0.05):
+    """
+    Make labelled snvs features, with missing numerical values.
+
+    Args:
+        n_rows (int): Number of variants.
+        seed (int): Random seed.
+        missing (float): Fraction of numerical values set to NaN.
+
+    Returns:
+        pd.DataFrame: features with an ARTIFACT label.
+    """
+    rng = np.random.RandomState(seed)
+    categorical_columns, numerical_columns = get_feature_columns("snvs")
+    artifact = rng.randint(0, 2, n_rows)
+    starts = np.sort(rng.choice(np.arange(1000, 1000 + 50 * n_rows), n_rows, replace=False))
+    features = pd.DataFrame({
+        "CHR": rng.choice(["1", "2", "X"], n_rows),
+        "START": starts,
+        "END": starts,
+    })
+    for col in categorical_columns:
+        features[col] = rng.choice(BASES, n_rows)
+    for col in numerical_columns:
+        values = rng.normal(loc=artifact, scale=1.5, size=n_rows)
+        values[rng.rand(n_rows) < missing] = np.nan
+        features[col] = values
+    features["ARTIFACT"] = artifact
+    return features
+
+
+@pytest.fixture(scope="session")
+def features():
+    """Labelled snvs features."""
+    return make_features()
+
+
+@pytest.fixture(scope="session")
+def model(features):
+    """Small Random Forest trained on the snvs features."""
+    pytest.importorskip("imblearn")
+    from ffperase.train import fit_random_forest, get_brfc
+
+    categorical_columns, numerical_columns = get_feature_columns("snvs")
+    brfc = get_brfc(categorical_columns, numerical_columns)
+    brfc.named_steps["classifier"].set_params(n_estimators=20, max_depth=6)
+    brfc, _ = fit_random_forest(features, "ARTIFACT", "snvs", brfc=brfc)
+    return brfc
+
+
+@pytest.fixture
+def model_path(model, tmp_path):
+    """The trained model, saved uncompressed."""
+    from ffperase.train import save_model
+
+    path = tmp_path / "model.joblib"
+    save_model(model, path, compress=False)
+    return path
@@ -0,0 +1,71 @@
+"""
+test_annotate.py
+
+Check the vectorized indel CHANGE, INDEL_LENGTH and INDEL_TYPE against their
+per-variant definitions, on the REF/ALT of the tests/data fixtures.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import sys
+
+import pandas as pd
+import pytest
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+sys.path.insert(0, str(DATA_DIR.parents[1] / "bin"))
+
+from ffperase.annotate import get_indel_changes, get_indel_lengths_types  # noqa: E402
+
+
+def read_vcf_alleles(vcf_path):
+    """Read the REF and ALT columns of a vcf."""
+    return pd.read_csv(vcf_path, sep="\t", comment="#", header=None, usecols=[3, 4], names=["REF", "ALT"])
+
+
+@pytest.fixture
+def alleles():
+    """Fixture alleles, plus both orientations and multi-base substitutions."""
+    df = pd.concat(
+        [
+            read_vcf_alleles(DATA_DIR / "vcf" / "test_indel.vcf"),
+            read_vcf_alleles(DATA_DIR / "vcf" / "test_snv.vcf"),
+            pd.read_csv(DATA_DIR / "features.tsv", sep="\t", usecols=["REF", "ALT"]),
+        ],
+        ignore_index=True,
+    )
+    swapped = df.rename(columns={"REF": "ALT", "ALT": "REF"})
+    joined = pd.DataFrame({"REF": df["REF"] + df["ALT"], "ALT": df["ALT"] + df["REF"]})
+    return pd.concat([df, swapped, joined], ignore_index=True)
+
+
+def test_indel_changes(alleles):
+    expected = [max(ref, alt)[1:] for ref, alt in zip(alleles["REF"], alleles["ALT"])]
+    assert get_indel_changes(alleles).tolist() == expected
+
+
+def test_indel_lengths_types(alleles):
+    expected_lengths, expected_types = [], []
+    for ref, alt in zip(alleles["REF"], alleles["ALT"]):
+        expected_lengths.append(abs(len(alt) - len(ref)))
+        if len(ref) > 1 and len(alt) == 1:
+            expected_types.append("D")
+        elif len(ref) == 1 and len(alt) > 1:
+            expected_types.append("I")
+        else:
+            expected_types.append("DI")
+
+    lengths, types = get_indel_lengths_types(alleles)
+    assert lengths.tolist() == expected_lengths
+    assert types.tolist() == expected_types
+    assert set(types) == {"D", "I", "DI"}
+
+
+def test_indel_fixture():
+    # GA>G is a 1 base deletion of A
+    indels = read_vcf_alleles(DATA_DIR / "vcf" / "test_indel.vcf")
+    lengths, types = get_indel_lengths_types(indels)
+    assert get_indel_changes(indels).tolist() == ["A"]
+    assert lengths.tolist() == [1]
+    assert types.tolist() == ["D"]
@@ -0,0 +1,116 @@
+"""
+test_annotate_predictions.py
+
+Check that streaming the predictions into an annotated tsv gives the same
+output as merging the whole annotated tsv with pandas, for unique and
+duplicated variant keys, and that scattered runs annotate the same rows.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+sys.path.insert(0, str(DATA_DIR.parents[1] / "bin"))
+
+from conftest import make_features  # noqa: E402
+from ffperase.classify import (  # noqa: E402
+    annotate_with_predictions,
+    classify_with_random_forest,
+    read_classified,
+)
+from ffperase.scatter import gather_variants, scatter_variants  # noqa: E402
+
+KEYS = ["CHR", "START", "REF", "ALT"]
+
+
+def merge_predictions(annotated_tsv_path, features_df, model_name):
+    """Baseline annotation, merging the whole annotated tsv."""
+    annotated = pd.read_csv(annotated_tsv_path, sep="\t", comment="#", low_memory=False)
+    annotated["CHR"] = annotated["CHR"].astype(str)
+    cols = KEYS + [f"{model_name}_raw_predicts", f"{model_name}_predicts"]
+    return annotated.merge(features_df[cols], how="inner", on=KEYS)
+
+
+@pytest.fixture
+def features_df():
+    """Features with predictions."""
+    rng = np.random.RandomState(1)
+    features_df = make_features(60, seed=1)
+    features_df["ART_raw_predicts"] = rng.rand(len(features_df))
+    features_df["ART_predicts"] = (features_df["ART_raw_predicts"] > 0.5).astype(int)
+    return features_df
+
+
+def write_annotated(path, features_df, duplicated=False):
+    """Write an annotated tsv with comment lines, shuffled and missing rows."""
+    annotated = features_df[KEYS + ["END"]].sample(frac=1, random_state=2).iloc[5:]
+    annotated = pd.concat([annotated, make_features(10, seed=3)[KEYS + ["END"]]])
+    annotated["GENE"] = [f"GENE{ix % 7}" for ix in range(len(annotated))]
+    annotated["SCORE"] = np.linspace(0, 1, len(annotated)).round(3)
+    if duplicated:
+        annotated = pd.concat([annotated, annotated.iloc[::4]]).sort_values("GENE", kind="mergesort")
+    with open(path, "w") as out_file:
+        out_file.write("##fileformat=annotated\n##source=test\n")
+        annotated.iloc[:20].to_csv(out_file, sep="\t", index=False)
+        out_file.write("# comment between rows\n")
+        annotated.iloc[20:].to_csv(out_file, sep="\t", index=False, header=False)
+
+
+@pytest.mark.parametrize("duplicated_features", [False, True])
+@pytest.mark.parametrize("duplicated_annotated", [False, True])
+def test_annotate_with_predictions(features_df, tmp_path, duplicated_features, duplicated_annotated):
+    if duplicated_features:
+        # Duplicated prediction keys take the merge fallback
+        features_df = pd.concat([features_df, features_df.iloc[::3]], ignore_index=True)
+    annotated_path = tmp_path / "annotated.tsv"
+    write_annotated(annotated_path, features_df, duplicated_annotated)
+
+    out_path = tmp_path / "out.tsv"
+    annotate_with_predictions(annotated_path, features_df, "ART", out_path, chunksize=16)
+
+    expected = merge_predictions(annotated_path, features_df, "ART")
+    annotated = pd.read_csv(out_path, sep="\t")
+    annotated["CHR"] = annotated["CHR"].astype(str)
+    assert len(expected) > 0
+    pd.testing.assert_frame_equal(annotated, expected)
+
+
+def test_annotate_without_matches(features_df, tmp_path):
+    annotated_path = tmp_path / "annotated.tsv"
+    make_features(5, seed=4)[KEYS].assign(START=1).to_csv(annotated_path, sep="\t", index=False)
+
+    out_path = tmp_path / "out.tsv"
+    annotate_with_predictions(annotated_path, features_df, "ART", out_path)
+
+    assert pd.read_csv(out_path, sep="\t").columns.tolist() == (
+        KEYS + ["ART_raw_predicts", "ART_predicts"]
+    )
+    assert merge_predictions(annotated_path, features_df, "ART").empty
+
+
+def test_annotate_gathered(model_path, tmp_path):
+    # Annotating the gathered partitions gives the output of an unscattered run
+    features_path = DATA_DIR / "features_scatter.tsv"
+    annotated_path = DATA_DIR / "annotated_unsorted.tsv"
+    classify_with_random_forest(
+        str(features_path), str(model_path), "ART", "snvs", str(annotated_path), tmp_path
+    )
+
+    partitions = scatter_variants(features_path, tmp_path / "partitions", by="chromosome")
+    classified = []
+    for partition in partitions:
+        outdir = tmp_path / partition.stem
+        classify_with_random_forest(str(partition), str(model_path), "ART", "snvs", None, outdir)
+        classified.append(outdir / "classify" / "classified_df_snvs.tsv")
+    gathered_path = tmp_path / "gathered.tsv"
+    gather_variants(classified[::-1], gathered_path)
+
+    out_path = tmp_path / "out.tsv"
+    annotate_with_predictions(annotated_path, read_classified(gathered_path), "ART", out_path)
+    assert out_path.read_text() == (tmp_path / "classify" / "annotated.tsv").read_text()
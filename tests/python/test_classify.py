@@ -0,0 +1,190 @@
+"""
+test_classify.py
+
+Check the classification of features tsvs against the predictions of the
+trained model, for single samples, batched cohorts, the compiled
+preprocessing and cascaded early exit.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import gzip
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+sys.path.insert(0, str(DATA_DIR.parents[1] / "bin"))
+
+from conftest import make_features  # noqa: E402
+from ffperase.classify import (  # noqa: E402
+    classify_samples_with_random_forest,
+    classify_with_random_forest,
+    compile_preprocessing,
+    get_model_inputs,
+    get_predictions,
+    get_samples,
+    predict_cascade,
+)
+
+pytest.importorskip("sklearn")
+
+
+@pytest.fixture
+def samples(tmp_path):
+    """Features tsvs of samples of different sizes."""
+    samples = []
+    for ix, n_rows in enumerate([50, 7, 120, 1]):
+        path = tmp_path / f"sample{ix}.tsv"
+        make_features(n_rows, seed=ix + 1).drop(columns="ARTIFACT").to_csv(
+            path, sep="\t", index=False
+        )
+        samples.append((f"sample{ix}", path))
+    return samples
+
+
+@pytest.mark.parametrize("batch_rows", [None, 60, 1000])
+def test_batched_matches_per_sample(samples, model_path, tmp_path, batch_rows):
+    classify_samples_with_random_forest(
+        samples, str(model_path), "ART", "snvs", tmp_path / "batched", batch_rows=batch_rows
+    )
+    for sample, features_path in samples:
+        outdir = tmp_path / sample
+        classify_with_random_forest(
+            str(features_path), str(model_path), "ART", "snvs", None, outdir
+        )
+        expected = pd.read_csv(outdir / "classify" / "classified_df_snvs.tsv", sep="\t")
+        batched = pd.read_csv(
+            tmp_path / "batched" / "classify" / f"classified_df_{sample}_snvs.tsv", sep="\t"
+        )
+        pd.testing.assert_frame_equal(batched, expected)
+
+
+def test_gzipped_samples(samples, model_path, tmp_path):
+    gzipped = []
+    for sample, features_path in samples[:2]:
+        gzipped_path = tmp_path / sample / "features.tsv.gz"
+        gzipped_path.parent.mkdir()
+        with gzip.open(gzipped_path, "wb") as gzipped_file:
+            gzipped_file.write(features_path.read_bytes())
+        gzipped.append(str(gzipped_path))
+
+    gzipped_samples = get_samples([str(tmp_path / "sample*" / "features.tsv.gz")])
+    assert gzipped_samples == [
+        ("sample0_features", gzipped[0]), ("sample1_features", gzipped[1]),
+    ]
+    assert [sample for sample, _ in get_samples([str(path) for _, path in samples])] == [
+        "sample0", "sample1", "sample2", "sample3",
+    ]
+
+    classify_samples_with_random_forest(
+        gzipped_samples, str(model_path), "ART", "snvs", tmp_path / "batched"
+    )
+    for (sample, features_path), (gzipped_sample, _) in zip(samples, gzipped_samples):
+        classify_with_random_forest(
+            str(features_path), str(model_path), "ART", "snvs", None, tmp_path / sample
+        )
+        expected = tmp_path / sample / "classify" / "classified_df_snvs.tsv"
+        classified = (
+            tmp_path / "batched" / "classify" / f"classified_df_{gzipped_sample}_snvs.tsv"
+        )
+        assert classified.read_bytes() == expected.read_bytes()
+
+
+def test_server_rejected_for_several_samples(samples, model_path, tmp_path):
+    command = [
+        sys.executable,
+        str(DATA_DIR.parents[1] / "bin" / "classify_w_random_forest.py"),
+        "--features", *[str(path) for _, path in samples[:2]],
+        "--model", str(model_path),
+        "--model-name", "ART",
+        "--mutation-type", "snvs",
+        "--outdir", str(tmp_path),
+        "--server", str(tmp_path / "server.sock"),
+    ]
+    result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    assert result.returncode == 2
+    assert b"--server is only supported for a single sample" in result.stderr
+
+
+@pytest.fixture
+def model_matrix(model):
+    """Model input matrix of unseen variants."""
+    from ffperase.classify import get_model_matrix
+
+    return get_model_matrix(model, [make_features(500, seed=7)], "snvs")
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 20])
+def test_predict_cascade(model, model_matrix, capsys, block_size):
+    classifier = model.named_steps["classifier"]
+    predicts, raw_scores = predict_cascade(classifier, model_matrix, block_size=block_size)
+
+    np.testing.assert_array_equal(predicts, classifier.predict(model_matrix))
+    assert "Labels match the full forest." in capsys.readouterr().out
+    if block_size >= len(classifier.estimators_):
+        np.testing.assert_allclose(raw_scores, classifier.predict_proba(model_matrix)[:, 1])
+
+
+def test_predict_cascade_band_audit(model, model_matrix, capsys):
+    classifier = model.named_steps["classifier"]
+    predicts, _ = predict_cascade(
+        classifier, model_matrix, block_size=2, band=0.4, min_trees=10, audit=1.0
+    )
+
+    output = capsys.readouterr().out
+    assert "exited early" in output and " 0.0% exited early" not in output
+    assert f"Audit: 0 of {len(predicts)} labels differ" in output
+    np.testing.assert_array_equal(predicts, classifier.predict(model_matrix))
+
+
+def test_predict_cascade_audit_counts(model, model_matrix, capsys):
+    classifier = model.named_steps["classifier"]
+    predicts, _ = predict_cascade(classifier, model_matrix, block_size=2, band=0.2, audit=1.0)
+
+    differ = (predicts != classifier.predict(model_matrix)).sum()
+    assert f"Audit: {differ} of {len(predicts)} labels differ" in capsys.readouterr().out
+
+
+@pytest.fixture
+def model_with_missing(features):
+    """Model trained with missing categories and an empty numerical column."""
+    from ffperase.train import fit_random_forest, get_brfc, get_feature_columns
+
+    features = features.copy()
+    features.loc[::9, "5_BASE"] = np.nan
+    features["STRAND_BIAS"] = np.nan
+    brfc = get_brfc(*get_feature_columns("snvs"))
+    brfc.named_steps["classifier"].set_params(n_estimators=10, max_depth=6)
+    return fit_random_forest(features, "ARTIFACT", "snvs", brfc=brfc)[0]
+
+
+@pytest.fixture
+def unseen_features():
+    """Features with missing values and categories unseen at training."""
+    features_df = make_features(300, seed=8, missing=0.1).drop(columns="ARTIFACT")
+    features_df.loc[::7, "REF"] = "N"
+    features_df.loc[::11, "3_BASE"] = np.nan
+    features_df.loc[::13, "5_BASE"] = np.nan
+    return features_df
+
+
+@pytest.mark.parametrize("model_fixture", ["model", "model_with_missing"])
+def test_compile_preprocessing(request, unseen_features, model_fixture):
+    model = request.getfixturevalue(model_fixture)
+    inputs = get_model_inputs(unseen_features, "snvs")
+
+    compiled = compile_preprocessing(model)
+    expected = model.named_steps["preprocess"].transform(inputs)
+    expected = expected.toarray() if hasattr(expected, "toarray") else expected
+    transformed = compiled.transform(unseen_features)
+    assert transformed.dtype == np.float32
+    np.testing.assert_allclose(transformed, expected.astype(np.float32), rtol=1e-6)
+
+    predicts, raw_scores = get_predictions(model, [unseen_features], "snvs")
+    np.testing.assert_array_equal(predicts, model.predict(inputs))
+    np.testing.assert_allclose(raw_scores, model.predict_proba(inputs)[:, 1], atol=1e-6)
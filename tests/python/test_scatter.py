@@ -0,0 +1,31 @@
+"""
+test_scatter.py
+
+Check that scattered variants tables are gathered back in coordinate order.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import sys
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+sys.path.insert(0, str(DATA_DIR.parents[1] / "bin"))
+
+from ffperase.scatter import gather_variants, scatter_variants  # noqa: E402
+
+
+def read_lines(path):
+    with open(path) as table:
+        return table.readlines()
+
+
+def test_gather_in_coordinate_order(tmp_path):
+    features_path = DATA_DIR / "features_scatter.tsv"
+    partitions = scatter_variants(features_path, tmp_path / "partitions", by="chromosome")
+    assert len(partitions) == 3
+
+    outfile = tmp_path / "gathered.tsv"
+    assert gather_variants(partitions[::-1], outfile) == 3
+    assert read_lines(outfile) == read_lines(features_path)
+
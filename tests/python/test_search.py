@@ -0,0 +1,74 @@
+"""
+test_search.py
+
+Check that the cross-validated parameter search reports each candidate with
+its own parameters and scores, ranked by AUC.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "bin"))
+
+from conftest import make_features  # noqa: E402
+
+pytest.importorskip("imblearn")
+
+from ffperase.train import get_feature_columns, get_preprocessing, search_random_forest  # noqa: E402
+
+GRID = {"n_estimators": [3, 15], "max_depth": [1, None], "sampling_strategy": ["all"]}
+FOLDS = 3
+
+
+def cross_validate(features, params):
+    """Mean AUC of a candidate, fitting the preprocessing in each fold."""
+    from imblearn.ensemble import BalancedRandomForestClassifier
+    from sklearn.metrics import roc_auc_score
+    from sklearn.model_selection import StratifiedKFold
+
+    categorical_columns, numerical_columns = get_feature_columns("snvs")
+    targets = features["ARTIFACT"].to_numpy()
+    inputs = features[numerical_columns + categorical_columns]
+    aucs = []
+    splitter = StratifiedKFold(n_splits=FOLDS, shuffle=True, random_state=42)
+    for train_ix, test_ix in splitter.split(inputs, targets):
+        preprocessing = get_preprocessing(categorical_columns, numerical_columns)
+        x_train = preprocessing.fit_transform(inputs.iloc[train_ix])
+        x_test = preprocessing.transform(inputs.iloc[test_ix])
+        classifier = BalancedRandomForestClassifier(random_state=42, n_jobs=1, **params)
+        classifier.fit(np.asarray(x_train, dtype=np.float32), targets[train_ix])
+        scores = classifier.predict_proba(np.asarray(x_test, dtype=np.float32))[:, 1]
+        aucs.append(roc_auc_score(targets[test_ix], scores))
+    return np.mean(aucs)
+
+
+def test_search_random_forest(tmp_path):
+    features = make_features(240, seed=6)
+    features_path = tmp_path / "features.tsv"
+    features.to_csv(features_path, sep="\t", index=False)
+
+    summary = search_random_forest(
+        str(features_path), "ARTIFACT", "test", "snvs", tmp_path,
+        grid=GRID, folds=FOLDS, threads=2,
+    )
+
+    assert len(summary) == 4
+    assert summary["auc"].is_monotonic_decreasing
+    assert sorted(zip(summary["n_estimators"], summary["max_depth"])) == [
+        ("15", "1"), ("15", "None"), ("3", "1"), ("3", "None"),
+    ]
+    for row in summary.itertuples():
+        params = {
+            "n_estimators": int(row.n_estimators),
+            "max_depth": None if row.max_depth == "None" else int(row.max_depth),
+            "sampling_strategy": row.sampling_strategy,
+        }
+        assert row.auc == pytest.approx(cross_validate(features, params))
+
+    assert (tmp_path / "train" / "search_test.tsv").exists()
+    assert not (tmp_path / "train" / "search_test_cache").exists()
@@ -0,0 +1,126 @@
+"""
+test_serve.py
+
+Check that a model server classifies features as in-process classification
+does, only with the models it preloaded, and that clients fall back to
+in-process classification when it can not classify.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from io import BytesIO
+from pathlib import Path
+import signal
+import stat
+import subprocess
+import sys
+import time
+
+import pytest
+
+BIN_DIR = Path(__file__).resolve().parents[2] / "bin"
+sys.path.insert(0, str(BIN_DIR))
+
+from conftest import make_features  # noqa: E402
+from ffperase.classify import classify_with_random_forest, classify_with_server  # noqa: E402
+from ffperase.serve import (  # noqa: E402
+    ServerUnavailable,
+    read_message,
+    request_classification,
+    write_message,
+)
+
+pytest.importorskip("sklearn")
+
+
+@pytest.fixture
+def server(model_path, tmp_path):
+    """Unix socket of a server with the session model preloaded."""
+    socket_path = tmp_path / "server.sock"
+    process = subprocess.Popen(
+        [
+            sys.executable, str(BIN_DIR / "serve_random_forest.py"),
+            "--server", str(socket_path), "--model", str(model_path),
+        ],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    deadline = time.time() + 60
+    while not socket_path.exists():
+        if process.poll() is not None or time.time() > deadline:
+            process.kill()
+            raise RuntimeError(f"Server did not start: {process.communicate()[1].decode()}")
+        time.sleep(0.1)
+    yield str(socket_path)
+    process.send_signal(signal.SIGINT)
+    process.wait(timeout=30)
+    assert not socket_path.exists()
+
+
+@pytest.fixture
+def features_path(tmp_path):
+    """Features tsv of unseen variants."""
+    path = tmp_path / "features.tsv"
+    make_features(200, seed=11).drop(columns="ARTIFACT").to_csv(path, sep="\t", index=False)
+    return path
+
+
+def classify(features_path, model_path, outdir, server=None):
+    """Classify the features and read the classified tsv."""
+    classify_with_random_forest(
+        str(features_path), str(model_path), "ART", "snvs", None, outdir, server=server
+    )
+    return (Path(outdir) / "classify" / "classified_df_snvs.tsv").read_bytes()
+
+
+def test_message_framing():
+    stream = BytesIO()
+    write_message(stream, {"model_name": "ART"}, b"CHR\tSTART\n9\t1\n")
+    write_message(stream, {"status": "ok"})
+    stream.seek(0)
+    assert read_message(stream) == (
+        {"model_name": "ART", "payload_bytes": 14}, b"CHR\tSTART\n9\t1\n"
+    )
+    assert read_message(stream) == ({"status": "ok", "payload_bytes": 0}, b"")
+    with pytest.raises(ConnectionError):
+        read_message(stream)
+
+
+def test_server_classifies_as_in_process(server, model_path, features_path, tmp_path, capsys):
+    assert stat.S_IMODE(Path(server).stat().st_mode) == 0o600
+
+    expected = classify(features_path, model_path, tmp_path / "local")
+    served = request_classification(
+        server, str(model_path), "ART", "snvs", features_path.read_bytes()
+    )
+    assert served == expected
+
+    assert classify(features_path, model_path, tmp_path / "served", server) == expected
+    assert "Falling back" not in capsys.readouterr().out
+
+
+def test_server_refuses_models_not_preloaded(server, model, features_path, tmp_path, capsys):
+    from ffperase.train import save_model
+
+    # Same model, saved compressed, is a different file
+    other_path = tmp_path / "other.joblib"
+    save_model(model, other_path, compress=True)
+    payload = features_path.read_bytes()
+
+    with pytest.raises(ServerUnavailable, match="is not loaded in this server"):
+        request_classification(server, str(other_path), "ART", "snvs", payload)
+
+    assert classify_with_server(server, str(features_path), str(other_path), "ART", "snvs") is None
+    assert "Falling back to in-process classification" in capsys.readouterr().out
+    expected = classify(features_path, other_path, tmp_path / "local")
+    assert classify(features_path, other_path, tmp_path / "fallback", server) == expected
+
+
+def test_server_unavailable(model_path, features_path, tmp_path, capsys):
+    server = str(tmp_path / "missing.sock")
+    with pytest.raises(ServerUnavailable, match="unavailable"):
+        request_classification(server, str(model_path), "ART", "snvs", b"")
+
+    expected = classify(features_path, model_path, tmp_path / "local")
+    assert classify(features_path, model_path, tmp_path / "fallback", server) == expected
+    assert "Falling back to in-process classification" in capsys.readouterr().out
@@ -0,0 +1,118 @@
+"""
+test_slim.py
+
+Check that the importances of the model inputs are aligned with the columns
+of the preprocessed matrix, and that the slimming report has the baseline and
+every requested variant.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from math import ceil
+from pathlib import Path
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "bin"))
+
+from conftest import make_features  # noqa: E402
+
+pytest.importorskip("imblearn")
+
+from ffperase.train import fit_random_forest, get_brfc, get_feature_columns  # noqa: E402
+from slim_random_forest import get_input_importances, slim_random_forest  # noqa: E402
+
+
+def map_inputs(model, features):
+    """Input column of each preprocessed column, found by changing each input."""
+    categorical_columns, numerical_columns = get_feature_columns("snvs")
+    preprocess = model.named_steps["preprocess"]
+    inputs = features[numerical_columns + categorical_columns]
+    base = np.asarray(preprocess.transform(inputs))
+    owners = np.full(base.shape[1], None, dtype=object)
+    for col in inputs.columns:
+        changed = inputs.copy()
+        if col in numerical_columns:
+            changed[col] = changed[col].fillna(0) + 1000
+        else:
+            # Every row takes another seen category
+            categories = sorted(changed[col].dropna().unique())
+            changed[col] = changed[col].map(
+                {cat: categories[(ix + 1) % len(categories)] for ix, cat in enumerate(categories)}
+            )
+        diff = (np.asarray(preprocess.transform(changed)) != base).any(axis=0)
+        assert (owners[diff] == None).all()  # noqa: E711
+        owners[diff] = col
+    return owners
+
+
+@pytest.fixture
+def model_with_empty_column(features):
+    """Model trained with an all missing numerical column."""
+    features = features.assign(STRAND_BIAS=np.nan)
+    brfc = get_brfc(*get_feature_columns("snvs"))
+    brfc.named_steps["classifier"].set_params(n_estimators=10, max_depth=6)
+    return fit_random_forest(features, "ARTIFACT", "snvs", brfc=brfc)[0]
+
+
+@pytest.mark.parametrize("model_fixture", ["model", "model_with_empty_column"])
+def test_get_input_importances(request, features, model_fixture):
+    model = request.getfixturevalue(model_fixture)
+    importances = get_input_importances(model)
+
+    owners = map_inputs(model, features)
+    assert not (owners == None).any()  # noqa: E711
+    expected = (
+        pd.Series(model.named_steps["classifier"].feature_importances_, index=owners)
+        .groupby(level=0)
+        .sum()
+    )
+    pd.testing.assert_series_equal(importances.sort_index(), expected.sort_index())
+    assert importances.sum() == pytest.approx(1)
+    assert importances.is_monotonic_decreasing
+    if model_fixture == "model_with_empty_column":
+        assert "STRAND_BIAS" not in importances.index
+
+
+def test_slim_random_forest(model, model_path, tmp_path):
+    features_path = tmp_path / "features.tsv"
+    make_features(300, seed=9).to_csv(features_path, sep="\t", index=False)
+
+    report = slim_random_forest(
+        str(model_path), str(features_path), "ARTIFACT", "test", "snvs", tmp_path,
+        keep_features=(1.0, 0.5), n_estimators=(20, 10), max_depths=(None, 3),
+        save_variants=True,
+    )
+
+    assert len(report) == 1 + 2 * 2 * 2
+    baseline = report.iloc[0]
+    assert baseline["variant"] == "baseline"
+    assert (baseline["n_estimators"], baseline["max_depth"]) == (20, "6")
+    assert (baseline["auc_delta"], baseline["speedup"], baseline["size_ratio"]) == (0, 1, 1)
+    assert report["auc_delta"].tolist() == pytest.approx((report["auc"] - baseline["auc"]).tolist())
+
+    ranked = get_input_importances(model).index.tolist()
+    n_inputs = len(ranked)
+    for row in report.iloc[1:].itertuples():
+        assert row.n_features in (n_inputs, ceil(n_inputs / 2))
+        dropped = ranked[row.n_features:]
+        assert row.dropped_features == (",".join(dropped) or "-")
+        variant = joblib.load(tmp_path / "slim" / f"model_test_{row.variant}.joblib")
+        classifier = variant.named_steps["classifier"]
+        assert classifier.n_estimators == len(classifier.estimators_) == row.n_estimators
+        assert str(classifier.max_depth) == row.max_depth
+        used = [
+            col
+            for name, _, columns in variant.named_steps["preprocess"].transformers_
+            if name != "remainder"
+            for col in columns
+        ]
+        assert sorted(used) == sorted(ranked[:row.n_features])
+    assert sorted(report.iloc[1:][["n_estimators", "max_depth"]].itertuples(index=False)) == [
+        (10, "3"), (10, "3"), (10, "None"), (10, "None"),
+        (20, "3"), (20, "3"), (20, "None"), (20, "None"),
+    ]
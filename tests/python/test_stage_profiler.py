@@ -0,0 +1,61 @@
+"""
+test_stage_profiler.py
+
+Check that the stage profiler records nothing and writes no sidecar unless
+profiling is enabled.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import json
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "bin"))
+
+from ffperase.stage_profiler import NULL_STAGE, PROFILE_ENV, StageProfiler  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "value", [None, "", "0", "false", "False", "FALSE", "no", "No", "off", "OFF", " 0 "]
+)
+def test_disabled_is_noop(monkeypatch, tmp_path, value):
+    if value is None:
+        monkeypatch.delenv(PROFILE_ENV, raising=False)
+    else:
+        monkeypatch.setenv(PROFILE_ENV, value)
+    profiler = StageProfiler()
+
+    with profiler.stage("read_csv", rows=3) as stage:
+        stage.rows = 10
+    assert stage is NULL_STAGE
+    assert NULL_STAGE.rows is None
+    assert profiler.stages == []
+    assert profiler.write(tmp_path, script="test") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+@pytest.mark.parametrize("value", ["1", "true", "True", "yes", "on"])
+def test_enabled_by_env(monkeypatch, value):
+    monkeypatch.setenv(PROFILE_ENV, value)
+    assert StageProfiler().enabled
+
+
+def test_enabled_records_stages(monkeypatch, tmp_path):
+    monkeypatch.setenv(PROFILE_ENV, "0")
+    profiler = StageProfiler()
+    profiler.enable()
+
+    with profiler.stage("read_csv") as stage:
+        stage.rows = 10
+    with profiler.stage("predict", rows=5):
+        pass
+
+    outpath = profiler.write(tmp_path, script="test")
+    profile = json.loads(outpath.read_text())
+    assert outpath == tmp_path / "profile_test.json"
+    assert [(s["stage"], s["rows"]) for s in profile["stages"]] == [
+        ("read_csv", 10), ("predict", 5),
+    ]
@@ -0,0 +1,181 @@
+"""
+test_table.py
+
+Check the block index lookups of sorted variant tables against filtering the
+whole table with pandas, and that bgzip compressed tables read the same
+regions as the plain tables, with their tabix index and by scanning them.
+Unsorted tables are compressed without an index, or fail when `strict`.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from io import StringIO
+from pathlib import Path
+import gzip
+import shutil
+import sys
+
+import pandas as pd
+import pytest
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+sys.path.insert(0, str(DATA_DIR.parents[1] / "bin"))
+
+from conftest import make_features  # noqa: E402
+from ffperase.scatter import read_variants  # noqa: E402
+from ffperase.table import (  # noqa: E402
+    VariantTable,
+    compress_variant_table,
+    index_variant_table,
+    read_region,
+    sort_variant_table,
+    write_variant_table,
+)
+
+REGIONS = ["9", "9:11576", "9:11000-11575", "9:11576-20000", "10"]
+BLOCK_ROWS = 7
+READ_OPTIONS = dict(dtype={"CHR": str})
+
+
+@pytest.fixture
+def variants_path(tmp_path):
+    """Sorted variants of several chromosomes, indexed in blocks of `BLOCK_ROWS`."""
+    variants = make_features(60, seed=5, missing=0)[["CHR", "START", "REF", "ALT", "VAF"]]
+    # Variants at the same START that span several blocks
+    repeated = variants.iloc[[10] * 9 + [30] * 3].assign(ALT=list("ACGTACGTAACG"))
+    path = tmp_path / "variants.tsv"
+    write_variant_table(pd.concat([variants, repeated]), path, block_rows=BLOCK_ROWS)
+    return path
+
+
+def filter_variants(variants, chrom=None, start=None, end=None):
+    """Brute force region lookup over the whole table."""
+    mask = pd.Series(True, index=variants.index)
+    if chrom is not None:
+        mask &= variants["CHR"] == chrom
+    if start is not None:
+        mask &= variants["START"] >= start
+    if end is not None:
+        mask &= variants["START"] <= end
+    return variants[mask].reset_index(drop=True)
+
+
+def get_regions(table):
+    """Regions around the block boundaries, and of missing chromosomes."""
+    regions = [(None, None, None), ("3", None, None), ("Y", 1, 10 ** 9)]
+    for block in table.blocks:
+        regions += [
+            (block.chrom, None, None),
+            (block.chrom, block.first_start, block.first_start),
+            (block.chrom, block.first_start, block.last_start),
+            (block.chrom, block.last_start, block.last_start + 1),
+            (block.chrom, block.first_start - 1, block.first_start - 1),
+            (block.chrom, block.last_start + 1, None),
+            (block.chrom, None, block.first_start),
+        ]
+    return regions
+
+
+def test_index_blocks(variants_path):
+    table = VariantTable(variants_path)
+    variants = pd.read_csv(variants_path, sep="\t", **READ_OPTIONS)
+
+    assert len(table) == len(variants) == 72
+    assert table.chromosomes == ["1", "2", "X"]
+    assert all(block.rows <= BLOCK_ROWS for block in table.blocks)
+    assert len(table.blocks) > len(table.chromosomes)
+    # Blocks are split within the variants at the same START
+    assert any(
+        previous.last_start == block.first_start
+        for previous, block in zip(table.blocks, table.blocks[1:])
+    )
+
+    for chrom, start, end in get_regions(table):
+        expected = filter_variants(variants, chrom, start, end)
+        fetched = table.fetch(chrom, start, end, **READ_OPTIONS)
+        pd.testing.assert_frame_equal(fetched, expected, check_dtype=False)
+        blocks = list(table.iter_blocks(chrom, start, end, **READ_OPTIONS))
+        assert all(len(block) > 0 for block in blocks)
+        if blocks:
+            iterated = pd.concat(blocks, ignore_index=True)
+            pd.testing.assert_frame_equal(iterated, expected, check_dtype=False)
+        else:
+            assert expected.empty
+        if start is not None and end is not None:
+            region = read_region(str(variants_path), f"{chrom}:{start}-{end}")
+            pd.testing.assert_frame_equal(
+                pd.read_csv(StringIO(region), sep="\t", **READ_OPTIONS), expected, check_dtype=False
+            )
+
+def test_get_variant(variants_path):
+    table = VariantTable(variants_path)
+    variants = pd.read_csv(variants_path, sep="\t", **READ_OPTIONS)
+
+    for row in variants.drop_duplicates(["CHR", "START", "REF", "ALT"]).itertuples(index=False):
+        variant = table.get(row.CHR, row.START, row.REF, row.ALT, **READ_OPTIONS)
+        assert variant is not None
+        assert variant.tolist() == list(row)
+
+    first = variants.iloc[0]
+    assert table.get(first.CHR, first.START, first.REF, "N") is None
+    assert table.get(first.CHR, first.START + 1, first.REF, first.ALT) is None
+    assert table.get("3", first.START, first.REF, first.ALT) is None
+
+
+def test_index_unsorted(variants_path, tmp_path):
+    lines = variants_path.read_text().splitlines(True)
+    unsorted_path = tmp_path / "unsorted.tsv"
+    unsorted_path.write_text(lines[0] + "".join(lines[:0:-1]))
+    with pytest.raises(ValueError, match="is not sorted at line 3"):
+        index_variant_table(str(unsorted_path), block_rows=BLOCK_ROWS)
+
+    sort_variant_table(str(unsorted_path), block_rows=BLOCK_ROWS)
+    assert unsorted_path.read_text() == variants_path.read_text()
+
+
+@pytest.fixture
+def table_path(tmp_path):
+    """Sorted and indexed copy of the features fixture."""
+    path = tmp_path / "features.tsv"
+    shutil.copy(str(DATA_DIR / "features.tsv"), str(path))
+    sort_variant_table(str(path))
+    return path
+
+
+def test_compress_variant_table(table_path, tmp_path):
+    pytest.importorskip("pysam")
+    plain_path = tmp_path / "plain.tsv"
+    shutil.copy(str(table_path), str(plain_path))
+    regions = {region: read_region(str(plain_path), region) for region in REGIONS}
+
+    compressed_path = compress_variant_table(table_path, threads=2)
+    assert compressed_path == f"{table_path}.gz"
+    assert not table_path.exists()
+    assert not Path(f"{table_path}.idx").exists()
+    assert Path(f"{compressed_path}.tbi").exists()
+
+    assert read_variants(compressed_path) == read_variants(str(plain_path))
+    for region, content in regions.items():
+        assert read_region(compressed_path, region) == content
+
+    # Without the tabix index, the compressed table is scanned
+    Path(f"{compressed_path}.tbi").unlink()
+    for region, content in regions.items():
+        assert read_region(compressed_path, region) == content
+
+
+def test_compress_unsorted_table(variants_path, tmp_path):
+    pytest.importorskip("pysam")
+    lines = variants_path.read_text().splitlines(True)
+    content = lines[0] + "".join(lines[:0:-1])
+    for strict in [False, True]:
+        unsorted_path = tmp_path / f"unsorted_{strict}.tsv"
+        unsorted_path.write_text(content)
+        if strict:
+            with pytest.raises(OSError):
+                compress_variant_table(unsorted_path, strict=strict)
+        else:
+            compressed_path = compress_variant_table(unsorted_path, strict=strict)
+            assert not Path(f"{compressed_path}.tbi").exists()
+            with gzip.open(compressed_path, "rt") as compressed:
+                assert compressed.read() == content
@@ -0,0 +1,86 @@
+"""
+test_train.py
+
+Check that training out of core gives the same design matrix and model as
+training in memory, for new and pretrained models.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from copy import deepcopy
+from pathlib import Path
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "bin"))
+
+from conftest import make_features  # noqa: E402
+from ffperase.train import get_feature_columns  # noqa: E402
+
+pytest.importorskip("imblearn")
+
+from ffperase.train import fit_out_of_core, fit_random_forest, get_brfc  # noqa: E402
+
+
+def get_small_brfc():
+    categorical_columns, numerical_columns = get_feature_columns("snvs")
+    brfc = get_brfc(categorical_columns, numerical_columns)
+    brfc.named_steps["classifier"].set_params(n_estimators=10, max_depth=6)
+    return brfc
+
+
+def warm_start(model):
+    """Copy of a pretrained model set to double its trees."""
+    brfc = deepcopy(model)
+    n_estimators = brfc.named_steps["classifier"].n_estimators
+    brfc.named_steps["classifier"].set_params(warm_start=True, n_estimators=n_estimators * 2)
+    return brfc
+
+
+def to_dense(matrix):
+    return matrix.toarray() if hasattr(matrix, "toarray") else np.asarray(matrix)
+
+
+@pytest.mark.parametrize("pretrained", [False, True])
+def test_out_of_core_matches_in_memory(model, tmp_path, pretrained):
+    categorical_columns, numerical_columns = get_feature_columns("snvs")
+    features = make_features(300, seed=5)
+    # Unseen categories are ignored by the frozen preprocessing of pretrained models
+    features.loc[::50, "REF"] = "N"
+    features_path = tmp_path / "features.tsv"
+    features.to_csv(features_path, sep="\t", index=False)
+
+    in_memory, _ = fit_random_forest(
+        features,
+        "ARTIFACT",
+        "snvs",
+        brfc=warm_start(model) if pretrained else get_small_brfc(),
+    )
+    out_of_core, design, targets = fit_out_of_core(
+        warm_start(model) if pretrained else get_small_brfc(),
+        [str(features_path)],
+        "ARTIFACT",
+        categorical_columns,
+        numerical_columns,
+        workdir=tmp_path,
+        chunksize=64,
+    )
+
+    inputs = features[numerical_columns + categorical_columns]
+    expected = to_dense(in_memory.named_steps["preprocess"].transform(inputs))
+    assert design.dtype == np.float32
+    np.testing.assert_allclose(design, expected, rtol=1e-6)
+    np.testing.assert_array_equal(targets, features["ARTIFACT"])
+    if pretrained:
+        frozen = to_dense(model.named_steps["preprocess"].transform(inputs))
+        np.testing.assert_allclose(expected, frozen)
+
+    assert (
+        len(in_memory.named_steps["classifier"].estimators_)
+        == len(out_of_core.named_steps["classifier"].estimators_)
+    )
+    np.testing.assert_allclose(
+        in_memory.predict_proba(inputs), out_of_core.predict_proba(inputs), atol=1e-6
+    )
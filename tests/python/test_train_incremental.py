@@ -0,0 +1,111 @@
+"""
+test_train_incremental.py
+
+Check that incremental training resumes from its checkpoint, refuses batches
+with unseen categories and keeps the forest, from the first batch or a
+pretrained model, within `--max-trees`.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import json
+import sys
+
+import joblib
+import numpy as np
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[2] / "bin"))
+
+from conftest import make_features  # noqa: E402
+
+pytest.importorskip("imblearn")
+
+from train_incremental import train_incremental  # noqa: E402
+
+
+@pytest.fixture
+def batches(tmp_path):
+    """Features tsvs of three batches."""
+    paths = []
+    for ix in range(3):
+        path = tmp_path / f"batch{ix}.tsv"
+        make_features(120, seed=10 + ix).to_csv(path, sep="\t", index=False)
+        paths.append(str(path))
+    return paths
+
+
+def train(batches, outdir, **kwargs):
+    """Train incrementally and load the final model."""
+    options = dict(trees_per_batch=5, compress=False)
+    options.update(kwargs)
+    train_incremental(batches, "ARTIFACT", "test", "snvs", outdir, **options)
+    return joblib.load(Path(outdir) / "train" / "model_test.joblib")
+
+
+def test_resume(batches, tmp_path):
+    expected = train(batches, tmp_path / "full")
+
+    # Interrupted after the first two batches, then rerun with all of them
+    checkpoint_dir = tmp_path / "checkpoint"
+    train(batches[:2], tmp_path / "resumed", checkpoint_dir=checkpoint_dir)
+    resumed = train(batches, tmp_path / "resumed", checkpoint_dir=checkpoint_dir)
+
+    state = json.loads((checkpoint_dir / "state.json").read_text())
+    assert state["completed"] == batches
+    assert len(resumed.named_steps["classifier"].estimators_) == 15
+    features = make_features(50, seed=20)
+    np.testing.assert_array_equal(resumed.predict_proba(features), expected.predict_proba(features))
+
+    with pytest.raises(ValueError, match="different batches"):
+        train(batches[::-1], tmp_path / "resumed", checkpoint_dir=checkpoint_dir)
+
+
+def test_unseen_categories(batches, tmp_path):
+    features = make_features(120, seed=13)
+    features.loc[3, "ALT"] = "N"
+    unseen_path = tmp_path / "unseen.tsv"
+    features.to_csv(unseen_path, sep="\t", index=False)
+
+    with pytest.raises(ValueError, match="unseen by the model: {'ALT': \\['N'\\]}"):
+        train([batches[0], str(unseen_path)], tmp_path)
+    state = json.loads((tmp_path / "train" / "checkpoint_test" / "state.json").read_text())
+    assert state["completed"] == batches[:1]
+
+
+def test_max_trees(batches, tmp_path):
+    with pytest.raises(ValueError, match="exceeds --max-trees 8"):
+        train(batches, tmp_path / "bounded", max_trees=8)
+
+    model = train(batches, tmp_path / "pruned", max_trees=8, prune_oldest=True)
+    classifier = model.named_steps["classifier"]
+    assert classifier.n_estimators == 8
+    assert len(classifier.estimators_) == len(classifier.samplers_) == 8
+    assert len(classifier.pipelines_) == 8
+    assert model.predict_proba(make_features(10, seed=21)).shape == (10, 2)
+
+
+def test_max_trees_first_batch(batches, tmp_path):
+    with pytest.raises(ValueError, match="--trees-per-batch 10 exceeds --max-trees 8"):
+        train(batches, tmp_path, trees_per_batch=10, max_trees=8, prune_oldest=True)
+    assert not (tmp_path / "train").exists()
+
+
+def test_max_trees_pretrained(batches, tmp_path):
+    pretrained = train(batches[:1], tmp_path / "pretrained", trees_per_batch=12)
+    pretrained_path = tmp_path / "pretrained" / "train" / "model_test.joblib"
+
+    with pytest.raises(ValueError, match="A forest of 12 trees exceeds --max-trees 8"):
+        train(batches[1:], tmp_path / "bounded", max_trees=8, pretrained_model=pretrained_path)
+
+    model = train(
+        batches[1:2], tmp_path / "pruned", max_trees=8, prune_oldest=True,
+        pretrained_model=pretrained_path,
+    )
+    classifier = model.named_steps["classifier"]
+    assert len(classifier.estimators_) == classifier.n_estimators == 8
+    # The 3 newest pretrained trees are kept, before the 5 trees of the batch
+    kept = pretrained.named_steps["classifier"].estimators_[-3:]
+    for tree, pretrained_tree in zip(classifier.estimators_[:3], kept):
+        np.testing.assert_array_equal(tree.tree_.threshold, pretrained_tree.tree_.threshold)
@@ -0,0 +1,68 @@
+"""
+test_twobit.py
+
+Check that a .2bit packed reference fetches the same bases as pysam from the
+fasta, including N runs and soft-masked bases.
+
+Example usage:
+    python -m pytest tests/python
+"""
+from pathlib import Path
+import random
+import sys
+
+import pytest
+
+DATA_DIR = Path(__file__).resolve().parents[1] / "data"
+sys.path.insert(0, str(DATA_DIR.parents[1] / "bin"))
+
+from ffperase.twobit import TwoBitFile, write_twobit  # noqa: E402
+
+pysam = pytest.importorskip("pysam")
+
+
+@pytest.fixture
+def fasta_path(tmp_path):
+    """Fixture contig, plus a contig with N runs and soft-masked bases."""
+    rng = random.Random(0)
+    sequence = "".join(rng.choice("ACGTacgtNN") for _ in range(1003))
+    lines = [sequence[start : start + 60] for start in range(0, len(sequence), 60)]
+    fasta = tmp_path / "reference.fasta"
+    fasta.write_text(
+        (DATA_DIR / "reference" / "reference.fasta").read_text()
+        + ">masked\n"
+        + "\n".join(lines)
+        + "\n"
+    )
+    return fasta
+
+
+def test_fetch_matches_pysam(fasta_path, tmp_path):
+    twobit_path = tmp_path / "reference.2bit"
+    lengths = write_twobit(fasta_path, twobit_path)
+    fasta = pysam.FastaFile(str(fasta_path))
+    rng = random.Random(1)
+
+    with TwoBitFile(twobit_path) as twobit:
+        assert twobit.references == tuple(fasta.references)
+        assert twobit.lengths == tuple(fasta.lengths) == tuple(lengths.values())
+        for reference, length in zip(fasta.references, fasta.lengths):
+            assert twobit.fetch(reference) == fasta.fetch(reference)
+            for _ in range(200):
+                start = rng.randrange(length + 5)
+                end = start + rng.randrange(12)
+                assert twobit.fetch(reference, start, end) == fasta.fetch(reference, start, end)
+            assert twobit.fetch(region=f"{reference}:3-9") == fasta.fetch(region=f"{reference}:3-9")
+
+
+def test_fetch_errors(fasta_path, tmp_path):
+    twobit_path = tmp_path / "reference.2bit"
+    write_twobit(fasta_path, twobit_path)
+
+    with TwoBitFile(twobit_path) as twobit:
+        with pytest.raises(KeyError):
+            twobit.fetch("missing", 0, 10)
+        with pytest.raises(ValueError):
+            twobit.fetch("masked", -1, 10)
+        with pytest.raises(ValueError):
+            twobit.fetch("masked", 10, 5)
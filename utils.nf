@@ -80,4 +80,11 @@ def createDirTree(File dir, String indent, StringBuilder tree) {
             createDirTree(file, newIndent, tree)
         }
     }
-}
\ No newline at end of file
+}
+
+// Output Utils
+
+def getTypeOutdir(outdir, mutationType) {
+    // With --mutationType both, outputs of each type go to their own subdirectory
+    return params.mutationType == "both" ? "${outdir}/${mutationType}" : outdir
+}